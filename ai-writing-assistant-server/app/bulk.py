@@ -0,0 +1,301 @@
+"""Rephrase a JSONL file offline, with checkpoint and resume.
+
+Usage (from ai-writing-assistant-server/):
+
+    python -m app.bulk input.jsonl output.jsonl --concurrency 16
+
+Each input line is a JSON object with the text to rephrase (`input_text` by
+default, see --text-field), optional `styles` and an optional id. Each output
+line is `{"line": n, "id": ..., "results": {...}, "errors": {...}}` and lines
+come out in completion order. Progress is checkpointed next to the output
+(`output.jsonl.ckpt`); running the same command again resumes where the last
+run stopped, without redoing or duplicating lines. The exception is a line
+whose every style failed (e.g. timeouts or 5xx): it is retried on the next
+run, and its new output line follows the failed one. The input is read as a
+stream with a bounded window of lines in flight, so memory use does not grow
+with the file.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import IO, List, Optional, Set
+
+from app.config import BATCH_CONCURRENCY
+from app.schemas import DEFAULT_STYLES
+from app.services.rephrase_service import RephraseService, error_messages
+from app.utils import codec
+from app.utils.deadline import start_deadline
+
+
+class Checkpoint:
+    """Which input lines are done, and how much output belongs to them.
+
+    `watermark` is the number of leading input lines that are all done;
+    `done` holds the finished lines past it (bounded by the in-flight
+    window). `output_bytes` is the size of the output at save time: a resume
+    truncates the output there, dropping lines whose completion never made it
+    into the checkpoint, so they are redone rather than duplicated.
+    `retry` holds finished lines that failed on every style; they count as
+    done for the current run but are redone by the next one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self.retry: Set[int] = set()
+        self.output_bytes = 0
+        self._saving = asyncio.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        ckpt = cls(path)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = codec.loads(f.read())
+            ckpt.watermark = data["watermark"]
+            ckpt.done = set(data["done"])
+            ckpt.output_bytes = data["output_bytes"]
+            ckpt.retry = set(data.get("retry", ()))
+        return ckpt
+
+    @property
+    def completed(self) -> int:
+        return self.watermark + len(self.done) - len(self.retry)
+
+    def is_done(self, line: int) -> bool:
+        done = line < self.watermark or line in self.done
+        return done and line not in self.retry
+
+    def mark(self, line: int, retry: bool = False) -> None:
+        if retry:
+            self.retry.add(line)
+        else:
+            self.retry.discard(line)
+        if line < self.watermark:
+            return  # a retried line
+        self.done.add(line)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    async def save(self, output: IO[bytes]) -> None:
+        async with self._saving:
+            # the state and the output size are taken together, on the loop;
+            # only the fsync and the file write run in a thread
+            output.flush()
+            self.output_bytes = output.tell()
+            data = {
+                "watermark": self.watermark,
+                "done": sorted(self.done),
+                "retry": sorted(self.retry),
+                "output_bytes": self.output_bytes,
+            }
+            await asyncio.to_thread(self._write, output.fileno(), data)
+
+    def _write(self, fileno: int, data: dict) -> None:
+        os.fsync(fileno)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(codec.dumps(data))
+        os.replace(tmp, self.path)  # atomic, a crash leaves the old one
+
+
+def count_lines(path: str) -> int:
+    # a quick pass in fixed-size blocks, for the ETA
+    n = 0
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            n += block.count(b"\n")
+    return n
+
+
+class Progress:
+    """Throughput and ETA, printed at most every `every` seconds."""
+
+    def __init__(self, total: Optional[int], skipped: int, every: float, out=None):
+        self.total = total
+        self.skipped = skipped
+        self.every = every
+        self.out = out or sys.stderr
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last = 0.0
+
+    def tick(self, failed: bool) -> None:
+        self.done += 1
+        self.failed += failed
+        now = time.monotonic()
+        if now - self._last >= self.every:
+            self._last = now
+            self.print()
+
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        finished = self.skipped + self.done
+        text = f"{finished}"
+        if self.total is not None:
+            text += f"/{self.total}"
+            left = max(0, self.total - finished)
+            eta = f"{left / rate:.0f}s" if rate else "?"
+            text += f" lines, {rate:.1f} lines/s, ETA {eta}"
+        else:
+            text += f" lines, {rate:.1f} lines/s"
+        if self.failed:
+            text += f", {self.failed} with errors"
+        return text
+
+    def print(self) -> None:
+        print(self.line(), file=self.out, flush=True)
+
+
+async def run(
+    svc: RephraseService,
+    input_path: str,
+    output_path: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    styles: Optional[List[str]] = None,
+    text_field: str = "input_text",
+    id_field: str = "id",
+    checkpoint_every: float = 5.0,
+    progress_every: float = 1.0,
+    progress_out=None,
+) -> Progress:
+    """Rephrase every not yet completed line of `input_path` into
+    `output_path`; see the module docstring for the formats.
+    """
+    ckpt = Checkpoint.load(output_path + ".ckpt")
+    if ckpt.output_bytes:
+        size = os.path.getsize(output_path) if os.path.exists(output_path) else -1
+        if size < ckpt.output_bytes:
+            raise ValueError(
+                f"{output_path} is missing or shorter than its checkpoint "
+                f"{ckpt.path}; delete the checkpoint to start over"
+            )
+    output = open(output_path, "r+b" if ckpt.output_bytes else "wb")
+    output.seek(ckpt.output_bytes)
+    output.truncate()
+    total = None if input_path == "-" else count_lines(input_path)
+    progress = Progress(total, ckpt.completed, progress_every, progress_out)
+    # lines are read at most `window` ahead of the oldest unfinished one, so
+    # both the queue and the checkpoint's done set stay bounded
+    window = concurrency * 4
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    moved = asyncio.Condition()
+    last_save = time.monotonic()
+
+    async def process(n: int, raw: bytes) -> dict:
+        out = {"line": n, "id": None, "results": {}, "errors": {}}
+        try:
+            item = codec.loads(raw)
+            text = item[text_field]
+            if not isinstance(text, str) or not text.strip():
+                raise ValueError(f"{text_field!r} is empty or not a string")
+        except (ValueError, KeyError, TypeError) as e:
+            # a malformed line is reported, not retried on resume
+            out["errors"]["*"] = f"invalid line: {e}"
+            return out
+        out["id"] = item.get(id_field)
+        start_deadline()
+        results, errors = await svc.rephrase_all(
+            styles or svc.validate_styles(item.get("styles") or []), text
+        )
+        out.update(results=results, errors=error_messages(errors))
+        return out
+
+    async def read(source: IO[bytes]):
+        n = -1
+        # readline blocks (stdin, slow disks), so it runs off the event loop
+        while raw := await asyncio.to_thread(source.readline):
+            n += 1
+            if not raw.strip() and not ckpt.is_done(n):
+                ckpt.mark(n)  # blank lines count as done
+            if ckpt.is_done(n):
+                continue
+            async with moved:
+                await moved.wait_for(lambda: n < ckpt.watermark + window)
+            await queue.put((n, raw))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        nonlocal last_save
+        while (job := await queue.get()) is not None:
+            n, raw = job
+            out = await process(n, raw)
+            output.write(codec.dumps(out) + b"\n")
+            # malformed lines are final; a line that failed on every style
+            # (timeouts, 5xx, ...) is redone by the next run
+            ckpt.mark(n, retry=not out["results"] and "*" not in out["errors"])
+            progress.tick(bool(out["errors"]))
+            async with moved:
+                moved.notify_all()
+            if time.monotonic() - last_save >= checkpoint_every:
+                last_save = time.monotonic()
+                await ckpt.save(output)
+
+    source = sys.stdin.buffer if input_path == "-" else open(input_path, "rb")
+    tasks = [asyncio.create_task(work()) for _ in range(concurrency)]
+    tasks.append(asyncio.create_task(read(source)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await ckpt.save(output)
+        output.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+        progress.print()
+    return progress
+
+
+async def main(args) -> None:
+    from app.providers.factory import build_provider
+    from app.providers.mock_provider import MockProvider
+    from app.utils.http import close_http_client, start_http_client
+
+    provider = MockProvider() if args.mock else build_provider()
+    await start_http_client()
+    try:
+        await run(
+            RephraseService(provider),
+            args.input,
+            args.output,
+            concurrency=args.concurrency,
+            styles=args.styles.split(",") if args.styles else None,
+            text_field=args.text_field,
+            id_field=args.id_field,
+            checkpoint_every=args.checkpoint_every,
+        )
+    finally:
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="input JSONL, or - for stdin")
+    parser.add_argument("output", help="output JSONL (appended to on resume)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument(
+        "--styles",
+        help="comma-separated styles for every line "
+        f"(default: the line's own, else {','.join(DEFAULT_STYLES)})",
+    )
+    parser.add_argument("--text-field", default="input_text")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--checkpoint-every", type=float, default=5.0)
+    parser.add_argument(
+        "--mock", action="store_true", help="use MockProvider (no upstream calls)"
+    )
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("interrupted; run the same command again to resume", file=sys.stderr)
+        sys.exit(130)
@@ -4,6 +4,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
 OPENAI_API_KEY = os.getenv(
     "OPENAI_API_KEY",
     "sk-proj-",
@@ -12,3 +17,130 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
 CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",")]
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+# Shared upstream HTTP client (one pooled client per process)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+HTTP2_ENABLED = _env_bool("HTTP2_ENABLED", "false")
+
+# Max styles rephrased concurrently within a single request
+STYLE_CONCURRENCY = max(1, int(os.getenv("STYLE_CONCURRENCY", "4")))
+
+# Response cache: in-memory LRU, plus an optional SQLite tier shared by the
+# workers on a host (set CACHE_SQLITE_PATH to enable it)
+CACHE_ENABLED = _env_bool("CACHE_ENABLED", "true")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "")
+
+# Coalesce identical concurrent upstream calls into one
+SINGLEFLIGHT_ENABLED = _env_bool("SINGLEFLIGHT_ENABLED", "true")
+
+# Incremental mode: rephrased sentences kept for reuse when an edited input
+# is resubmitted
+SEGMENT_CACHE_MAX_ENTRIES = int(os.getenv("SEGMENT_CACHE_MAX_ENTRIES", "8192"))
+
+# Long-input mode: split at paragraph boundaries into chunks of about this many
+# tokens and rephrase up to CHUNK_CONCURRENCY chunks of a style in parallel
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_CONCURRENCY = max(1, int(os.getenv("CHUNK_CONCURRENCY", "4")))
+
+# Upstream rate limiting (shared by every style and request in the process);
+# x-ratelimit-* response headers tighten these at runtime
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", "true")
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+# Retries on 429/5xx/connection errors, jittered exponential backoff
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+
+# Request hedging for rephrase_full: start a duplicate call when the first is
+# slower than HEDGE_DELAY_MS (0 = the tracked HEDGE_PERCENTILE latency), capped
+# at HEDGE_MAX_RATIO extra calls
+HEDGE_ENABLED = _env_bool("HEDGE_ENABLED", "false")
+HEDGE_DELAY_MS = float(os.getenv("HEDGE_DELAY_MS", "0"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+
+# Optional list of OpenAI-compatible backends to route across, as JSON:
+# [{"name": "a", "base_url": "...", "api_key": "...", "model": "...",
+#   "max_concurrency": 16, "requests_per_minute": 500, "tokens_per_minute": 200000}]
+# When unset the single OPENAI_BASE_URL / OPENAI_API_KEY backend is used.
+OPENAI_BACKENDS = os.getenv("OPENAI_BACKENDS", "")
+ROUTER_EJECT_AFTER = int(os.getenv("ROUTER_EJECT_AFTER", "3"))
+ROUTER_EJECT_SECONDS = float(os.getenv("ROUTER_EJECT_SECONDS", "30"))
+
+# Per-request deadline in seconds; clients may ask for a shorter or longer
+# one (up to REQUEST_TIMEOUT_MAX) with the X-Request-Timeout header. Streams
+# give up when the first token or the next token takes too long, and get the
+# much larger STREAM_TIMEOUT_SECONDS overall (0 for none) since a sequential
+# multi-style stream runs several completions back to back.
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+REQUEST_TIMEOUT_MAX = float(os.getenv("REQUEST_TIMEOUT_MAX", "300"))
+STREAM_TIMEOUT_SECONDS = float(os.getenv("STREAM_TIMEOUT_SECONDS", "900"))
+STREAM_FIRST_TOKEN_TIMEOUT = float(os.getenv("STREAM_FIRST_TOKEN_TIMEOUT", "30"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", "20"))
+
+# Cancel registry backend: "local" (single process) or "unix", a broker on a
+# Unix socket that routes cancels between the uvicorn workers of one host.
+# Request ids nobody cleared are dropped after CANCEL_TTL_SECONDS.
+CANCEL_BACKEND = os.getenv("CANCEL_BACKEND", "local").lower()
+CANCEL_SOCKET_PATH = os.getenv(
+    "CANCEL_SOCKET_PATH", "/tmp/ai-writing-assistant-cancel.sock"
+)
+CANCEL_TTL_SECONDS = float(os.getenv("CANCEL_TTL_SECONDS", "3600"))
+
+# Outgoing SSE: deltas of a style are merged until SSE_FLUSH_BYTES or
+# SSE_FLUSH_MS; each stream buffers at most SSE_MAX_BUFFER_BYTES of text /
+# SSE_MAX_BUFFER_EVENTS events before it stops reading upstream.
+SSE_FLUSH_MS = float(os.getenv("SSE_FLUSH_MS", "20"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "256"))
+SSE_MAX_BUFFER_BYTES = int(os.getenv("SSE_MAX_BUFFER_BYTES", "65536"))
+SSE_MAX_BUFFER_EVENTS = int(os.getenv("SSE_MAX_BUFFER_EVENTS", "256"))
+
+# POST /v1/rephrase/batch: items per request, and item x style pairs in
+# flight at once per batch (all batches share the upstream rate limiter)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_CONCURRENCY = max(1, int(os.getenv("BATCH_CONCURRENCY", "16")))
+
+# Durable jobs (POST /v1/jobs): a SQLite queue at JOBS_DB_PATH drained by
+# JOBS_WORKERS in-process workers, highest priority first. A job whose worker
+# died is picked up again once its JOBS_LEASE_SECONDS lease runs out, at most
+# JOBS_MAX_ATTEMPTS times. Off unless JOBS_DB_PATH is set.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "")
+JOBS_WORKERS = max(1, int(os.getenv("JOBS_WORKERS", "2")))
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))
+
+# Per-request timing spans, returned as a Server-Timing header (full
+# endpoints) or a final "timing" SSE event (streams). With
+# TIMING_EXPORT_PATH set, a TIMING_SAMPLE_RATE fraction of traces is also
+# appended there as JSON lines.
+TIMING_ENABLED = _env_bool("TIMING_ENABLED", "false")
+TIMING_EXPORT_PATH = os.getenv("TIMING_EXPORT_PATH", "")
+TIMING_SAMPLE_RATE = float(os.getenv("TIMING_SAMPLE_RATE", "1.0"))
+
+# Record-and-replay: RECORD_CORPUS_PATH appends every upstream call (text and
+# per-chunk timing) to a JSONL corpus; REPLAY_CORPUS_PATH serves a corpus
+# instead of calling any upstream. REPLAY_SPEED scales the recorded timing
+# (2 is twice as fast, 0 no waits). Inputs that were not recorded get a
+# recording of the same style picked by input hash, or fail with REPLAY_EXACT.
+RECORD_CORPUS_PATH = os.getenv("RECORD_CORPUS_PATH", "")
+REPLAY_CORPUS_PATH = os.getenv("REPLAY_CORPUS_PATH", "")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1.0"))
+REPLAY_EXACT = _env_bool("REPLAY_EXACT", "false")
+
+# Optional warmup after startup: resolve and connect to the upstream(s),
+# encode request prefixes and load the SQLite cache tier into memory.
+# GET /readyz answers 503 until it is done or WARMUP_TIMEOUT_SECONDS passed.
+WARMUP_ENABLED = _env_bool("WARMUP_ENABLED", "false")
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
+WARMUP_CONNECTIONS = max(1, int(os.getenv("WARMUP_CONNECTIONS", "2")))
@@ -1,11 +1,69 @@
-from app.config import CORS_ORIGINS
+from contextlib import asynccontextmanager
+
+from app.config import (CORS_ORIGINS, JOBS_DB_PATH, WARMUP_ENABLED,
+                        WARMUP_TIMEOUT_SECONDS)
+from app.routes.agent import build_agent_service
 from app.routes.agent import router as agent_router
+from app.routes.jobs import router as jobs_router
+from app.routes.rephrase import build_service
 from app.routes.rephrase import router as rephrase_router
+from app.services.jobs import JobQueue, JobStore
+from app.utils import metrics
+from app.utils.cache import close_response_cache, get_response_cache
+from app.utils.cancel import build_cancel_backend, cancel_registry
+from app.utils.http import close_http_client, start_http_client
+from app.utils.stats import collect_stats, register_stats
+from app.utils.warmup import readiness
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+
+def warmup_steps(app: FastAPI):
+    steps = {
+        "rephrase_upstream": app.state.rephrase_service.provider.warmup,
+        "agent_upstream": app.state.agent_service.provider.warmup,
+    }
+    cache = get_response_cache()
+    if cache is not None:
+        steps["cache"] = cache.preload
+    return steps
+
 
-app = FastAPI(title="AI Writing Assistant Server (FastAPI)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client per process, shared by every provider call
+    await start_http_client()
+    # cross-worker cancel routing when CANCEL_BACKEND is set
+    await cancel_registry.start(build_cancel_backend())
+    # providers and services are built once and shared by every request
+    app.state.rephrase_service = build_service()
+    app.state.agent_service = build_agent_service()
+    # durable job queue, resumed from the database on every start
+    app.state.jobs = None
+    if JOBS_DB_PATH:
+        app.state.jobs = JobQueue(JobStore(JOBS_DB_PATH), app.state.rephrase_service)
+        await app.state.jobs.start()
+    if WARMUP_ENABLED:
+        readiness.start(warmup_steps(app), WARMUP_TIMEOUT_SECONDS)
+    else:
+        readiness.mark_ready()
+    try:
+        yield
+    finally:
+        await readiness.stop()
+        if app.state.jobs is not None:
+            await app.state.jobs.close()
+            app.state.jobs.store.close()
+            app.state.jobs = None
+        await cancel_registry.close()
+        await close_http_client()
+        close_response_cache()
 
+
+app = FastAPI(title="AI Writing Assistant Server (FastAPI)", lifespan=lifespan)
+
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"] if CORS_ORIGINS == ["*"] else CORS_ORIGINS,
@@ -22,9 +80,41 @@ def health():
 
 @app.get("/healthz")
 def healthz():
-    # compatibility endpoint for docker healthchecks
+    # liveness: the process answers, possibly before it is ready
     return {"ok": True}
 
 
+@app.get("/readyz")
+def readyz():
+    # readiness: startup and warmup finished, safe to route traffic here
+    return JSONResponse(
+        readiness.snapshot(), status_code=200 if readiness.ready else 503
+    )
+
+
+def jobs_stats() -> dict:
+    # queue depth per status and the age of the oldest queued job
+    jobs = getattr(app.state, "jobs", None)
+    return {} if jobs is None else jobs.store.stats()
+
+
+register_stats("jobs", jobs_stats)
+
+
+@app.get("/stats")
+def stats():
+    # counters from the cache and other pipeline components
+    return collect_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Prometheus text format: latency histograms, stream gauges, error counters
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 app.include_router(rephrase_router)
 app.include_router(agent_router)
+app.include_router(jobs_router)
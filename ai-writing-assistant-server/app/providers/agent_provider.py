@@ -1,5 +1,5 @@
 import asyncio
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, List, Tuple
 
 from app.providers.mock_provider import MockProvider
 from app.providers.openai_chat import OpenAIChatProvider
@@ -21,6 +21,12 @@ class AgentProvider(LLMProvider):
             # Fallback to mock provider
             self._impl = MockProvider()
 
+    def cache_key(self, style: str, input_text: str) -> str:
+        return self._impl.cache_key(style, input_text)
+
+    async def warmup(self) -> None:
+        await self._impl.warmup()
+
     async def rephrase_full(self, style: str, input_text: str) -> str:
         return await self._impl.rephrase_full(style, input_text)
 
@@ -29,3 +35,14 @@ class AgentProvider(LLMProvider):
     ) -> AsyncGenerator[str, None]:
         async for tok in self._impl.rephrase_stream(style, input_text):
             yield tok
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return await self._impl.rephrase_multi_full(styles, input_text)
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        async for pair in self._impl.rephrase_multi_stream(styles, input_text):
+            yield pair
@@ -1,7 +1,20 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, List, Tuple
+
+from app.utils.cache import make_key, normalize_text
 
 
 class LLMProvider:
+    def cache_key(self, style: str, input_text: str) -> str:
+        """Identity of a (style, input) request for caching and coalescing.
+
+        Providers include whatever changes the output (model, prompt,
+        temperature) so different configurations never share entries.
+        """
+        return make_key(type(self).__name__, style, normalize_text(input_text))
+
+    async def warmup(self) -> None:
+        """Prepare for the first request (connections, encoders). Optional."""
+
     async def rephrase_full(self, style: str, input_text: str) -> str:
         raise NotImplementedError
 
@@ -9,3 +22,19 @@ class LLMProvider:
         self, style: str, input_text: str
     ) -> AsyncGenerator[str, None]:
         raise NotImplementedError
+
+    # Combined mode: every requested style from one upstream call. Providers
+    # that cannot do that fall back to one call per style.
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return {s: await self.rephrase_full(s, input_text) for s in styles}
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        """Yield `(style, delta)` pairs; each style's deltas are contiguous."""
+        for s in styles:
+            async for delta in self.rephrase_stream(s, input_text):
+                yield s, delta
@@ -0,0 +1,75 @@
+import re
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Tuple
+
+from app.utils.cache import ResponseCache, cache_bypassed
+
+from .base import LLMProvider
+
+_PIECE = re.compile(r"\s*\S+")
+
+
+def replay_pieces(text: str) -> List[str]:
+    """Split cached text into word-sized deltas that concatenate back to it."""
+    return _PIECE.findall(text) or [text]
+
+
+class CachedProvider(LLMProvider):
+    """Serves repeated (model, prompt, temperature, text) requests from cache.
+
+    Misses go to the wrapped provider and are stored once complete; streaming
+    hits replay the stored text as deltas. `bypass_cache()` skips the lookup
+    for the current request but still refreshes the stored entry.
+    """
+
+    def __init__(self, inner: LLMProvider, cache: ResponseCache):
+        self.inner = inner
+        self.cache = cache
+
+    def cache_key(self, style: str, input_text: str) -> str:
+        return self.inner.cache_key(style, input_text)
+
+    async def warmup(self) -> None:
+        await self.inner.warmup()
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        key = self.cache_key(style, input_text)
+        if not cache_bypassed():
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+        result = await self.inner.rephrase_full(style, input_text)
+        await self.cache.set(key, result.strip())
+        return result
+
+    async def rephrase_stream(
+        self, style: str, input_text: str
+    ) -> AsyncGenerator[str, None]:
+        key = self.cache_key(style, input_text)
+        if not cache_bypassed():
+            cached = await self.cache.get(key)
+            if cached is not None:
+                for piece in replay_pieces(cached):
+                    yield piece
+                return
+        parts = []
+        async with aclosing(self.inner.rephrase_stream(style, input_text)) as stream:
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+        # only reached when the upstream stream completed normally
+        await self.cache.set(key, "".join(parts).strip())
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return await self.inner.rephrase_multi_full(styles, input_text)
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        async with aclosing(
+            self.inner.rephrase_multi_stream(styles, input_text)
+        ) as stream:
+            async for pair in stream:
+                yield pair
@@ -0,0 +1,37 @@
+from typing import Optional
+
+from app.config import SINGLEFLIGHT_ENABLED
+from app.utils.cache import get_response_cache
+from app.utils.hedging import hedger
+from app.utils.singleflight import flights
+
+from .base import LLMProvider
+from .cached_provider import CachedProvider
+from .hedged_provider import HedgedProvider
+from .openai_chat import OpenAIChatProvider
+from .replay_provider import (RecordingProvider, get_corpus_writer,
+                              get_replay_provider)
+from .router_provider import get_router
+from .singleflight_provider import SingleFlightProvider
+
+
+def build_provider(base: Optional[LLMProvider] = None) -> LLMProvider:
+    """Wrap `base` with the configured layers. The default base is the
+    multi-backend router when OPENAI_BACKENDS is set, else OpenAIChatProvider.
+    With REPLAY_CORPUS_PATH set a recorded corpus replaces any base (offline);
+    with RECORD_CORPUS_PATH the base's calls are recorded.
+    """
+    provider = get_replay_provider()
+    if provider is None:
+        provider = base or get_router() or OpenAIChatProvider()
+        writer = get_corpus_writer()
+        if writer is not None:
+            provider = RecordingProvider(provider, writer)
+    if hedger is not None:
+        provider = HedgedProvider(provider, hedger)
+    if SINGLEFLIGHT_ENABLED:
+        provider = SingleFlightProvider(provider, flights)
+    cache = get_response_cache()
+    if cache is not None:
+        provider = CachedProvider(provider, cache)
+    return provider
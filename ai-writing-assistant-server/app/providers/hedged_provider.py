@@ -0,0 +1,48 @@
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Tuple
+
+from app.utils.hedging import Hedger
+
+from .base import LLMProvider
+
+
+class HedgedProvider(LLMProvider):
+    """Hedges rephrase_full calls through a shared `Hedger`; streams pass through."""
+
+    def __init__(self, inner: LLMProvider, hedger: Hedger):
+        self.inner = inner
+        self.hedger = hedger
+
+    def cache_key(self, style: str, input_text: str) -> str:
+        return self.inner.cache_key(style, input_text)
+
+    async def warmup(self) -> None:
+        await self.inner.warmup()
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        return await self.hedger.run(
+            lambda: self.inner.rephrase_full(style, input_text)
+        )
+
+    async def rephrase_stream(
+        self, style: str, input_text: str
+    ) -> AsyncGenerator[str, None]:
+        async with aclosing(self.inner.rephrase_stream(style, input_text)) as stream:
+            async for delta in stream:
+                yield delta
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return await self.hedger.run(
+            lambda: self.inner.rephrase_multi_full(styles, input_text)
+        )
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        async with aclosing(
+            self.inner.rephrase_multi_stream(styles, input_text)
+        ) as stream:
+            async for pair in stream:
+                yield pair
@@ -1,22 +1,39 @@
+import asyncio
 import json
 import os
 import time
-from typing import AsyncGenerator, Optional
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
 
 import httpx
-from app.config import OPENAI_API_KEY, OPENAI_MODEL
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MODEL,
+    WARMUP_CONNECTIONS,
+)
 
 # Allow temperature to be set via environment variable, default 0.7
 OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+from app.utils import codec, deadline, metrics, timing
+from app.utils.cache import make_key, normalize_text
+from app.utils.http import FULL_TIMEOUT, STREAM_TIMEOUT, get_http_client
+from app.utils.json_splitter import JsonObjectSplitter
 from app.utils.logging import logger
-from ratelimit import limits, sleep_and_retry
-from tenacity import retry, stop_after_attempt, wait_exponential
+from app.utils.ratelimit import (
+    RateLimiter,
+    backoff_delay,
+    openai_limiter,
+    parse_retry_after,
+)
+from app.utils.text import estimate_tokens
 
 from .base import LLMProvider
 
-OPENAI_URL = "https://api.openai.com/v1/chat/completions"
-MAX_RETRIES = 3
-CALLS_PER_MINUTE = 60  # Adjust based on your API tier
+OPENAI_URL = f"{OPENAI_BASE_URL}/chat/completions"
+MAX_RETRIES = OPENAI_MAX_RETRIES
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
 
 STYLE_SYSTEM = {
     "professional": (
@@ -41,6 +58,19 @@ STYLE_SYSTEM = {
     ),
 }
 
+# metric labels: styles are request text and each distinct value would keep a
+# histogram set, so only known styles are labelled (same bound for models)
+_style_label = metrics.BoundedLabel([*STYLE_SYSTEM, "combined"])
+_model_label = metrics.BoundedLabel(limit=16)
+
+# Short tone descriptions used when all styles are requested in one completion
+STYLE_TONE = {
+    "professional": "professional, clear, and concise",
+    "casual": "friendly, casual, and approachable",
+    "polite": "courteous, respectful, and polite",
+    "social-media": "catchy, brief, and engaging for social media audiences",
+}
+
 HEADERS = {
     "Authorization": f"Bearer {OPENAI_API_KEY}",
     "Content-Type": "application/json",
@@ -55,44 +85,302 @@ def _messages(style: str, input_text: str):
     ]
 
 
+def _multi_messages(styles: List[str], input_text: str):
+    tones = "\n".join(
+        f'- "{s}": {STYLE_TONE.get(s, STYLE_TONE["professional"])}' for s in styles
+    )
+    keys = ", ".join(json.dumps(s) for s in styles)
+    sys = (
+        "You are an expert English writer. Rewrite the user's text once for each style below. "
+        "Always respond in English, regardless of the input language. Do not translate, but rewrite in each tone. "
+        f"Respond with a single JSON object whose keys are exactly {keys}, in that order, "
+        "and whose values are the rewritten text as plain strings. "
+        "Do not include explanations or any other keys.\n"
+        f"Styles:\n{tones}"
+    )
+    return [
+        {"role": "system", "content": sys},
+        {"role": "user", "content": input_text},
+    ]
+
+
+@asynccontextmanager
+async def _client() -> AsyncIterator[httpx.AsyncClient]:
+    # Reuse the pooled process-wide client when the app lifespan started one;
+    # otherwise (scripts, unit tests) fall back to a short-lived client.
+    shared = get_http_client()
+    if shared is not None:
+        yield shared
+        return
+    async with httpx.AsyncClient() as client:
+        yield client
+
+
+async def _sse_deltas(resp: httpx.Response) -> AsyncGenerator[str, None]:
+    # content deltas of an OpenAI chat completion event stream, parsed from
+    # raw bytes (see app.utils.codec)
+    parser = codec.SSEParser()
+    async for chunk in resp.aiter_bytes():
+        for data in parser.feed(chunk):
+            if data == codec.DONE:
+                return
+            delta = codec.chat_delta(data)
+            if delta:
+                yield delta
+    for data in parser.flush():
+        if data != codec.DONE:
+            delta = codec.chat_delta(data)
+            if delta:
+                yield delta
+
+
+def _token_budget(messages, outputs: int = 1) -> int:
+    # prompt tokens plus roughly one rewrite of the user text per output
+    prompt = sum(estimate_tokens(m["content"]) for m in messages)
+    return prompt + outputs * estimate_tokens(messages[-1]["content"])
+
+
 class OpenAIChatProvider(LLMProvider):
-    async def rephrase_full(self, style: str, input_text: str) -> str:
-        async with httpx.AsyncClient(timeout=60) as client:
-            payload = {
-                "model": OPENAI_MODEL,
-                "messages": _messages(style, input_text),
-                "temperature": OPENAI_TEMPERATURE,
-                "stream": False,
-            }
-            r = await client.post(OPENAI_URL, headers=HEADERS, json=payload)
-            r.raise_for_status()
+    def __init__(
+        self,
+        limiter: Optional[RateLimiter] = openai_limiter,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+    ):
+        self.limiter = limiter
+        self.model = model or OPENAI_MODEL
+        self.model_label = _model_label(self.model)
+        self.url = (
+            f"{base_url.rstrip('/')}/chat/completions" if base_url else OPENAI_URL
+        )
+        self.headers = (
+            {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+            if api_key
+            else HEADERS
+        )
+
+    def cache_key(self, style: str, input_text: str) -> str:
+        return make_key(
+            self.model,
+            STYLE_SYSTEM.get(style, STYLE_SYSTEM["professional"]),
+            OPENAI_TEMPERATURE,
+            normalize_text(input_text),
+        )
+
+    async def warmup(self) -> None:
+        """Resolve the upstream host, open WARMUP_CONNECTIONS pooled (TLS)
+        connections and encode the per-style request prefixes, so the first
+        requests pay for none of it. Any HTTP status counts as connected.
+        """
+        for style in STYLE_SYSTEM:
+            for stream in (False, True):
+                codec.chat_body(
+                    self.model, _messages(style, ""), OPENAI_TEMPERATURE, stream
+                )
+        url = httpx.URL(self.url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        await asyncio.get_running_loop().getaddrinfo(url.host, port)
+        if get_http_client() is None:
+            return  # nothing to keep the connections in
+        models = self.url.rsplit("/", 2)[0] + "/models"
+        async with _client() as client:
+            await asyncio.gather(
+                *(
+                    client.get(models, headers=self.headers, timeout=FULL_TIMEOUT)
+                    for _ in range(WARMUP_CONNECTIONS)
+                )
+            )
+
+    async def _acquire(self, messages, outputs: int) -> None:
+        if self.limiter is not None:
+            await deadline.within(
+                self.limiter.acquire(_token_budget(messages, outputs)), "queue"
+            )
+
+    async def _backoff(self, delay: float) -> None:
+        # don't sleep past the deadline only to fail afterwards
+        left = deadline.remaining()
+        if left is not None and delay >= left:
+            raise deadline.exceeded("queue")
+        await asyncio.sleep(delay)
+
+    def _observe(self, resp) -> None:
+        headers = getattr(resp, "headers", None)
+        if self.limiter is not None and headers:
+            self.limiter.update_from_headers(headers)
+
+    def _failed(self, exc: BaseException) -> None:
+        if isinstance(exc, httpx.HTTPStatusError):
+            status = str(exc.response.status_code)
+        elif isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)):
+            status = "timeout"
+        else:
+            status = "transport"
+        metrics.UPSTREAM_ERRORS.labels(status, self.model_label).inc()
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `exc`, or None if it should propagate."""
+        if attempt >= MAX_RETRIES:
+            return None
+        if isinstance(exc, httpx.HTTPStatusError):
+            status = exc.response.status_code
+            if status not in RETRY_STATUS:
+                return None
+            delay = parse_retry_after(exc.response.headers)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if status == 429 and self.limiter is not None:
+                self.limiter.penalize(delay)
+        elif isinstance(exc, httpx.TransportError):
+            delay = backoff_delay(attempt)
+        else:
+            return None
+        logger.warning(
+            "upstream error (%s), retry %d in %.2fs", exc, attempt + 1, delay
+        )
+        return delay
+
+    async def _complete(
+        self, messages, outputs: int = 1, style: str = "combined", **extra
+    ) -> str:
+        body = codec.chat_body(self.model, messages, OPENAI_TEMPERATURE, False, **extra)
+        latency = metrics.UPSTREAM_LATENCY.labels(
+            metrics.current_route(), _style_label(style), self.model_label
+        )
+        async with _client() as client:
+            attempt = 0
+            while True:
+                with timing.span(f"queue.{style}"):
+                    await self._acquire(messages, outputs)
+                sent = time.perf_counter()
+                try:
+                    with timing.span(f"upstream.{style}"):
+                        r = await deadline.within(
+                            client.post(
+                                self.url,
+                                headers=self.headers,
+                                content=body,
+                                timeout=deadline.http_timeout(FULL_TIMEOUT),
+                            ),
+                            "upstream",
+                        )
+                    latency.observe(time.perf_counter() - sent)
+                    self._observe(r)
+                    r.raise_for_status()
+                    break
+                except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                    self._failed(e)
+                    expired = deadline.classify_timeout(e)
+                    if expired is not None:
+                        raise expired from e
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                except deadline.DeadlineExceeded as e:
+                    self._failed(e)
+                    raise
+                attempt += 1
+                await self._backoff(delay)
             data = r.json()
             return data["choices"][0]["message"]["content"].strip()
 
+    async def _stream(
+        self, messages, outputs: int = 1, style: str = "combined", **extra
+    ) -> AsyncGenerator[str, None]:
+        body = codec.chat_body(self.model, messages, OPENAI_TEMPERATURE, True, **extra)
+        labels = (metrics.current_route(), _style_label(style), self.model_label)
+        latency = metrics.UPSTREAM_LATENCY.labels(*labels)
+        ttft = metrics.TTFT.labels(*labels)
+        gap = metrics.INTER_TOKEN.labels(*labels)
+        count = metrics.DELTAS.labels(*labels)
+        last = called = time.perf_counter()
+        trace = timing.current()
+        async with _client() as client:
+            attempt = 0
+            started = False
+            while True:
+                with timing.span(f"queue.{style}"):
+                    await self._acquire(messages, outputs)
+                sent = time.perf_counter()
+                try:
+                    async with client.stream(
+                        "POST",
+                        self.url,
+                        headers=self.headers,
+                        content=body,
+                        timeout=deadline.http_timeout(STREAM_TIMEOUT),
+                    ) as resp:
+                        headers_at = time.perf_counter()
+                        latency.observe(headers_at - sent)
+                        if trace is not None:
+                            trace.add(f"connect.{style}", sent, headers_at)
+                        self._observe(resp)
+                        resp.raise_for_status()
+                        deltas = deadline.guard_stream(_sse_deltas(resp))
+                        async with aclosing(deltas):
+                            async for delta in deltas:
+                                now = time.perf_counter()
+                                # TTFT counts from the call, queueing included
+                                (gap if started else ttft).observe(now - last)
+                                if not started and trace is not None:
+                                    trace.add(f"ttft.{style}", called, now)
+                                last = now
+                                count.inc()
+                                started = True
+                                yield delta
+                    if trace is not None:
+                        trace.add(f"stream.{style}", headers_at, time.perf_counter())
+                    return
+                except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                    self._failed(e)
+                    expired = deadline.classify_timeout(e)
+                    if expired is not None:
+                        raise expired from e
+                    # once deltas went out a retry would duplicate them
+                    delay = None if started else self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                except deadline.DeadlineExceeded as e:
+                    self._failed(e)
+                    raise
+                attempt += 1
+                await self._backoff(delay)
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        return await self._complete(_messages(style, input_text), style=style)
+
     async def rephrase_stream(
         self, style: str, input_text: str
     ) -> AsyncGenerator[str, None]:
-        async with httpx.AsyncClient(timeout=None) as client:
-            payload = {
-                "model": OPENAI_MODEL,
-                "messages": _messages(style, input_text),
-                "temperature": OPENAI_TEMPERATURE,
-                "stream": True,
-            }
-            async with client.stream(
-                "POST", OPENAI_URL, headers=HEADERS, json=payload
-            ) as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if not line or not line.startswith("data: "):
-                        continue
-                    data = line[6:]
-                    if data.strip() == "[DONE]":
-                        break
-                    try:
-                        obj = json.loads(data)
-                        delta = obj["choices"][0]["delta"].get("content", "")
-                        if delta:
-                            yield delta
-                    except Exception:
-                        continue
+        async for delta in self._stream(_messages(style, input_text), style=style):
+            yield delta
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        content = await self._complete(
+            _multi_messages(styles, input_text),
+            outputs=len(styles),
+            response_format={"type": "json_object"},
+        )
+        data = json.loads(content)
+        return {s: data[s].strip() for s in styles if isinstance(data.get(s), str)}
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        splitter = JsonObjectSplitter()
+        wanted = set(styles)
+        stream = self._stream(
+            _multi_messages(styles, input_text),
+            outputs=len(styles),
+            response_format={"type": "json_object"},
+        )
+        async with aclosing(stream):
+            async for chunk in stream:
+                for style, delta in splitter.feed(chunk):
+                    if style in wanted:
+                        yield style, delta
+                if splitter.done:
+                    break
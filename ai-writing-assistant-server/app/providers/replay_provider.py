@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from app.config import (RECORD_CORPUS_PATH, REPLAY_CORPUS_PATH, REPLAY_EXACT,
+                        REPLAY_SPEED)
+from app.utils import codec
+from app.utils.cache import normalize_text
+from app.utils.logging import logger
+from app.utils.stats import register_stats
+
+from .base import LLMProvider
+
+# A corpus is a JSONL file with one line per upstream call:
+#   {"style": "casual", "input": "<digest>", "text": "...",
+#    "chunks": [5, 7, ...], "offsets": [0.4123, 0.4311, ...]}
+# `chunks` are the delta lengths (the text is stored once) and `offsets` the
+# seconds from the call to each delta; a full completion is a single chunk.
+# Inputs are kept as digests only, so a corpus holds no user text but the
+# model's replies.
+
+
+def input_digest(input_text: str) -> str:
+    return hashlib.sha256(normalize_text(input_text).encode("utf-8")).hexdigest()[:32]
+
+
+class Recording:
+    """One recorded call, split back into its deltas at load time."""
+
+    __slots__ = ("style", "digest", "text", "pieces", "offsets")
+
+    def __init__(self, style: str, digest: str, text: str, chunks: List[int], offsets):
+        self.style = style
+        self.digest = digest
+        self.text = text
+        self.pieces = []
+        pos = 0
+        for size in chunks:
+            self.pieces.append(text[pos : pos + size])
+            pos += size
+        self.offsets = list(offsets)
+
+    @property
+    def duration(self) -> float:
+        return self.offsets[-1] if self.offsets else 0.0
+
+
+class Corpus:
+    """Recordings indexed by (style, input digest) and by style."""
+
+    def __init__(self, recordings: List[Recording]):
+        self.recordings = recordings
+        self.by_key: Dict[Tuple[str, str], Recording] = {}
+        self.by_style: Dict[str, List[Recording]] = {}
+        for rec in recordings:
+            self.by_key[rec.style, rec.digest] = rec  # the latest one wins
+            self.by_style.setdefault(rec.style, []).append(rec)
+
+    @classmethod
+    def load(cls, path: str) -> "Corpus":
+        recordings = []
+        skipped = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    data = codec.loads(line)
+                    recordings.append(
+                        Recording(
+                            data["style"],
+                            data["input"],
+                            data["text"],
+                            data["chunks"],
+                            data["offsets"],
+                        )
+                    )
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1  # e.g. a line cut short by a crash while recording
+        if skipped:
+            logger.warning("replay corpus %s: skipped %d bad lines", path, skipped)
+        return cls(recordings)
+
+
+class CorpusWriter:
+    """Appends recordings to a corpus file, one line per write."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(
+        self, style: str, input_text: str, deltas: List[str], offsets: List[float]
+    ) -> None:
+        line = codec.dumps(
+            {
+                "style": style,
+                "input": input_digest(input_text),
+                "text": "".join(deltas),
+                "chunks": [len(d) for d in deltas],
+                "offsets": [round(o, 4) for o in offsets],
+            }
+        )
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab", buffering=0)
+            self._file.write(line + b"\n")
+            self.written += 1
+
+    def stats(self) -> dict:
+        return {"path": self.path, "written": self.written}
+
+
+class RecordingProvider(LLMProvider):
+    """Passes calls through to `inner` and records every completed one.
+
+    Streams are recorded with the time of each delta; calls that fail or are
+    closed early are not recorded. Combined (multi-style) calls pass through
+    unrecorded.
+    """
+
+    def __init__(self, inner: LLMProvider, writer: CorpusWriter):
+        self.inner = inner
+        self.writer = writer
+
+    def cache_key(self, style: str, input_text: str) -> str:
+        return self.inner.cache_key(style, input_text)
+
+    async def warmup(self) -> None:
+        await self.inner.warmup()
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        started = time.perf_counter()
+        result = await self.inner.rephrase_full(style, input_text)
+        self.writer.write(style, input_text, [result], [time.perf_counter() - started])
+        return result
+
+    async def rephrase_stream(
+        self, style: str, input_text: str
+    ) -> AsyncGenerator[str, None]:
+        started = time.perf_counter()
+        deltas: List[str] = []
+        offsets: List[float] = []
+        async with aclosing(self.inner.rephrase_stream(style, input_text)) as stream:
+            async for delta in stream:
+                deltas.append(delta)
+                offsets.append(time.perf_counter() - started)
+                yield delta
+        if deltas:
+            self.writer.write(style, input_text, deltas, offsets)
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return await self.inner.rephrase_multi_full(styles, input_text)
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        async with aclosing(
+            self.inner.rephrase_multi_stream(styles, input_text)
+        ) as stream:
+            async for pair in stream:
+                yield pair
+
+
+class ReplayProvider(LLMProvider):
+    """Serves recorded calls offline, with their timing scaled by 1/`speed`.
+
+    The recording of the same style and input is used when there is one;
+    otherwise (unless `exact`) one of the style's recordings is picked by the
+    input digest, so a given input always gets the same reply. Each stream
+    sleeps until its next delta is due against its own start time, one timer
+    per delta and no per-character work.
+    """
+
+    def __init__(
+        self, corpus: Corpus, speed: float = REPLAY_SPEED, exact: bool = REPLAY_EXACT
+    ):
+        if not corpus.recordings:
+            raise ValueError("replay corpus is empty")
+        self.corpus = corpus
+        self.speed = speed
+        self.exact = exact
+        self.matched = 0
+        self.picked = 0
+
+    def pick(self, style: str, input_text: str) -> Recording:
+        digest = input_digest(input_text)
+        rec = self.corpus.by_key.get((style, digest))
+        if rec is not None:
+            self.matched += 1
+            return rec
+        if self.exact:
+            raise LookupError(f"no recording for style {style!r} and this input")
+        pool = self.corpus.by_style.get(style) or self.corpus.recordings
+        self.picked += 1
+        return pool[int(digest, 16) % len(pool)]
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        rec = self.pick(style, input_text)
+        if self.speed:
+            await asyncio.sleep(rec.duration / self.speed)
+        return rec.text
+
+    async def rephrase_stream(
+        self, style: str, input_text: str
+    ) -> AsyncGenerator[str, None]:
+        rec = self.pick(style, input_text)
+        if not self.speed:
+            for piece in rec.pieces:
+                yield piece
+            return
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for piece, offset in zip(rec.pieces, rec.offsets):
+            # due times are absolute, so timer lateness does not accumulate
+            delay = started + offset / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield piece
+
+    def stats(self) -> dict:
+        return {
+            "recordings": len(self.corpus.recordings),
+            "matched": self.matched,
+            "picked": self.picked,
+        }
+
+
+_replay: Optional[ReplayProvider] = None
+_writer: Optional[CorpusWriter] = None
+
+
+def get_replay_provider() -> Optional[ReplayProvider]:
+    """Process-wide replay of REPLAY_CORPUS_PATH, or None when unset."""
+    global _replay
+    if _replay is None and REPLAY_CORPUS_PATH:
+        _replay = ReplayProvider(Corpus.load(REPLAY_CORPUS_PATH))
+        register_stats("replay", _replay.stats)
+    return _replay
+
+
+def get_corpus_writer() -> Optional[CorpusWriter]:
+    """Process-wide writer for RECORD_CORPUS_PATH, or None when unset."""
+    global _writer
+    if _writer is None and RECORD_CORPUS_PATH:
+        _writer = CorpusWriter(RECORD_CORPUS_PATH)
+        register_stats("recording", _writer.stats)
+    return _writer
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import random
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+import httpx
+from app.config import (OPENAI_BACKENDS, OPENAI_REQUESTS_PER_MINUTE,
+                        OPENAI_TOKENS_PER_MINUTE, RATE_LIMIT_ENABLED,
+                        ROUTER_EJECT_AFTER, ROUTER_EJECT_SECONDS)
+from app.utils.cache import make_key
+from app.utils.logging import logger
+from app.utils.ratelimit import RateLimiter
+from app.utils.stats import register_stats
+
+from .base import LLMProvider
+from .openai_chat import OpenAIChatProvider
+
+# EWMA smoothing for latency and error rate
+_ALPHA = 0.2
+
+
+def backend_failed(exc: BaseException) -> bool:
+    """Whether `exc` is the backend's fault, so another one may succeed:
+    transport errors, 5xx and 429. Deadlines and other 4xx come from the
+    request itself and would fail the same on every backend.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, httpx.TransportError)
+
+
+class Backend:
+    """One upstream endpoint with its own provider, concurrency limit and health."""
+
+    def __init__(self, name: str, provider: LLMProvider, max_concurrency: int = 16):
+        self.name = name
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.sem = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.calls = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self) -> float:
+        # lower is better: expected latency, inflated by queueing and errors
+        latency = self.ewma_latency if self.ewma_latency is not None else 0.0
+        return (latency + 0.001) * (self.in_flight + 1) * (1 + 4 * self.error_rate)
+
+    def record_success(self, latency: float) -> None:
+        self.ewma_latency = (
+            latency
+            if self.ewma_latency is None
+            else _ALPHA * latency + (1 - _ALPHA) * self.ewma_latency
+        )
+        self.error_rate *= 1 - _ALPHA
+        self.consecutive_failures = 0
+
+    def record_failure(self, eject_after: int, eject_seconds: float) -> None:
+        self.error_rate = _ALPHA + (1 - _ALPHA) * self.error_rate
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= eject_after:
+            # back off further each time a probe after ejection fails again
+            backoff = min(8, 2 ** max(0, self.consecutive_failures - eject_after))
+            self.ejected_until = time.monotonic() + eject_seconds * backoff
+            self.ejections += 1
+            logger.warning(
+                "backend %s ejected for %.0fs", self.name, eject_seconds * backoff
+            )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "ewma_latency_seconds": round(self.ewma_latency or 0.0, 4),
+            "error_rate": round(self.error_rate, 3),
+            "ejected": not self.healthy(time.monotonic()),
+            "ejections": self.ejections,
+        }
+
+
+class RoutingProvider(LLMProvider):
+    """Routes each call to one of several OpenAI-compatible backends.
+
+    Picks the better of two random healthy backends by EWMA latency, in-flight
+    load and error rate (power of two choices). Backends that fail
+    `eject_after` times in a row are ejected for `eject_seconds`; afterwards
+    the next call acts as a probe. A call that failed because of its backend
+    (see `backend_failed`) is retried once on another backend (streams only
+    before the first delta); other errors propagate without counting.
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        eject_after: int = ROUTER_EJECT_AFTER,
+        eject_seconds: float = ROUTER_EJECT_SECONDS,
+    ):
+        if not backends:
+            raise ValueError("RoutingProvider needs at least one backend")
+        self.backends = backends
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        # any backend may answer, so cached outputs belong to the whole set
+        self.identity = ",".join(
+            sorted(f"{b.name}={getattr(b.provider, 'model', '')}" for b in backends)
+        )
+        self._key_backend = min(backends, key=lambda b: b.name)
+
+    def cache_key(self, style: str, input_text: str) -> str:
+        # one backend's key still covers prompt and temperature
+        inner = self._key_backend.provider.cache_key(style, input_text)
+        return make_key(type(self).__name__, self.identity, inner)
+
+    async def warmup(self) -> None:
+        results = await asyncio.gather(
+            *(b.provider.warmup() for b in self.backends), return_exceptions=True
+        )
+        for backend, result in zip(self.backends, results):
+            if isinstance(result, Exception):
+                logger.warning("warmup of backend %s failed: %r", backend.name, result)
+
+    def pick(self, exclude: Tuple[Backend, ...] = ()) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude] or self.backends
+        healthy = [b for b in candidates if b.healthy(now)]
+        if not healthy:
+            # everything is ejected: probe the one that comes back first
+            return min(candidates, key=lambda b: b.ejected_until)
+        if len(healthy) == 1:
+            return healthy[0]
+        a, b = random.sample(healthy, 2)
+        return a if a.score() <= b.score() else b
+
+    async def _call(self, backend: Backend, fn):
+        async with backend.sem:
+            backend.in_flight += 1
+            backend.calls += 1
+            start = time.monotonic()
+            try:
+                result = await fn(backend.provider)
+            except Exception as e:
+                if backend_failed(e):
+                    backend.record_failure(self.eject_after, self.eject_seconds)
+                raise
+            finally:
+                backend.in_flight -= 1
+            backend.record_success(time.monotonic() - start)
+            return result
+
+    async def _full(self, fn):
+        first = self.pick()
+        try:
+            return await self._call(first, fn)
+        except Exception as e:
+            if len(self.backends) == 1 or not backend_failed(e):
+                raise
+        return await self._call(self.pick(exclude=(first,)), fn)
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        return await self._full(lambda p: p.rephrase_full(style, input_text))
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return await self._full(lambda p: p.rephrase_multi_full(styles, input_text))
+
+    async def _stream(self, open_stream) -> AsyncGenerator:
+        tried: Tuple[Backend, ...] = ()
+        while True:
+            backend = self.pick(exclude=tried)
+            tried += (backend,)
+            started = False
+            async with backend.sem:
+                backend.in_flight += 1
+                backend.calls += 1
+                start = time.monotonic()
+                try:
+                    async with aclosing(open_stream(backend.provider)) as stream:
+                        async for item in stream:
+                            if not started:
+                                # time to first token is the latency signal
+                                started = True
+                                backend.record_success(time.monotonic() - start)
+                            yield item
+                    if not started:
+                        backend.record_success(time.monotonic() - start)
+                    return
+                except Exception as e:
+                    if not backend_failed(e):
+                        raise
+                    backend.record_failure(self.eject_after, self.eject_seconds)
+                    if started or len(tried) >= min(2, len(self.backends)):
+                        raise
+                finally:
+                    backend.in_flight -= 1
+
+    async def rephrase_stream(
+        self, style: str, input_text: str
+    ) -> AsyncGenerator[str, None]:
+        async with aclosing(
+            self._stream(lambda p: p.rephrase_stream(style, input_text))
+        ) as stream:
+            async for delta in stream:
+                yield delta
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        async with aclosing(
+            self._stream(lambda p: p.rephrase_multi_stream(styles, input_text))
+        ) as stream:
+            async for pair in stream:
+                yield pair
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {b.name: b.stats() for b in self.backends}
+
+
+def backends_from_config(raw: str) -> List[Backend]:
+    backends = []
+    for i, spec in enumerate(json.loads(raw)):
+        # each backend has its own limiter; limits it does not set fall back
+        # to the global OPENAI_* ones, as for the single-backend provider
+        limiter = None
+        own = spec.get("requests_per_minute") or spec.get("tokens_per_minute")
+        if own or RATE_LIMIT_ENABLED:
+            limiter = RateLimiter(
+                float(spec.get("requests_per_minute", OPENAI_REQUESTS_PER_MINUTE)),
+                float(spec.get("tokens_per_minute", OPENAI_TOKENS_PER_MINUTE)),
+            )
+        provider = OpenAIChatProvider(
+            limiter=limiter,
+            base_url=spec.get("base_url"),
+            api_key=spec.get("api_key"),
+            model=spec.get("model"),
+        )
+        backends.append(
+            Backend(
+                spec.get("name") or f"backend-{i}",
+                provider,
+                int(spec.get("max_concurrency", 16)),
+            )
+        )
+    return backends
+
+
+_router: Optional[RoutingProvider] = None
+
+
+def get_router() -> Optional[RoutingProvider]:
+    """Process-wide router built from OPENAI_BACKENDS, or None when unset."""
+    global _router
+    if _router is None and OPENAI_BACKENDS:
+        _router = RoutingProvider(backends_from_config(OPENAI_BACKENDS))
+        register_stats("backends", _router.stats)
+    return _router
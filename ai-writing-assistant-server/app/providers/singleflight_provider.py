@@ -0,0 +1,61 @@
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Tuple
+
+from app.utils.cache import cache_bypassed
+from app.utils.singleflight import SingleFlight
+
+from .base import LLMProvider
+
+
+class SingleFlightProvider(LLMProvider):
+    """Shares one upstream call between identical concurrent requests.
+
+    Requests that bypass the cache (e.g. "regenerate") want a fresh output,
+    so they neither join nor lead a shared call.
+    """
+
+    def __init__(self, inner: LLMProvider, group: SingleFlight):
+        self.inner = inner
+        self.group = group
+
+    def cache_key(self, style: str, input_text: str) -> str:
+        return self.inner.cache_key(style, input_text)
+
+    async def warmup(self) -> None:
+        await self.inner.warmup()
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        if cache_bypassed():
+            return await self.inner.rephrase_full(style, input_text)
+        return await self.group.do(
+            self.cache_key(style, input_text),
+            lambda: self.inner.rephrase_full(style, input_text),
+        )
+
+    async def rephrase_stream(
+        self, style: str, input_text: str
+    ) -> AsyncGenerator[str, None]:
+        if cache_bypassed():
+            stream = self.inner.rephrase_stream(style, input_text)
+        else:
+            stream = self.group.stream(
+                self.cache_key(style, input_text),
+                lambda: self.inner.rephrase_stream(style, input_text),
+            )
+        async with aclosing(stream):
+            async for delta in stream:
+                yield delta
+
+    async def rephrase_multi_full(
+        self, styles: List[str], input_text: str
+    ) -> Dict[str, str]:
+        return await self.inner.rephrase_multi_full(styles, input_text)
+
+    async def rephrase_multi_stream(
+        self, styles: List[str], input_text: str
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        async with aclosing(
+            self.inner.rephrase_multi_stream(styles, input_text)
+        ) as stream:
+            async for pair in stream:
+                yield pair
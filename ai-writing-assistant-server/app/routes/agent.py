@@ -1,116 +1,169 @@
-import asyncio
 import json
+from contextlib import aclosing
+from typing import Optional
 
+from app.config import REPLAY_CORPUS_PATH
 from app.providers.agent_provider import AgentProvider
+from app.providers.factory import build_provider
 from app.providers.mock_provider import MockProvider
 from app.providers.openai_chat import OpenAIChatProvider
-from app.schemas import RephraseRequest
-from app.services.rephrase_service import RephraseService
-from fastapi import APIRouter, Depends, HTTPException
+from app.routes.rephrase import cancellable, staged_events
+from app.schemas import CancelResponse, RephraseRequest
+from app.services.rephrase_service import RephraseService, error_messages
+from app.utils import sse, timing
+from app.utils.cache import bypass_cache
+from app.utils.cancel import RequestCancelled, cancel_registry
+from app.utils.deadline import DeadlineExceeded, start_deadline
+from fastapi import (APIRouter, Depends, Header, HTTPException, Request,
+                     Response)
 from sse_starlette.sse import EventSourceResponse
 
 router = APIRouter(prefix="/v1/agent", tags=["agent"])
 
 
-def get_agent_service() -> RephraseService:
+def build_agent_service() -> RephraseService:
+    if REPLAY_CORPUS_PATH:
+        # recorded calls stand in for every upstream, the agent's included
+        return RephraseService(build_provider())
     # Try to use the full AgentProvider (requires OpenAI Agents SDK).
     try:
         provider = AgentProvider()
-        return RephraseService(provider)
+        return RephraseService(build_provider(provider))
     except RuntimeError:
         # Fallback: prefer the OpenAIChatProvider if available (requires OPENAI_API_KEY), else MockProvider
         try:
             provider = OpenAIChatProvider()
-            return RephraseService(provider)
+            return RephraseService(build_provider(provider))
         except Exception:
             provider = MockProvider()
             return RephraseService(provider)
 
 
+def get_agent_service(request: Request) -> RephraseService:
+    # built once by the app lifespan; lazily when it did not run (tests)
+    svc = getattr(request.app.state, "agent_service", None)
+    if svc is None:
+        svc = request.app.state.agent_service = build_agent_service()
+    return svc
+
+
 @router.post("", response_model=dict)
 async def run_agent(
-    req: RephraseRequest, svc: RephraseService = Depends(get_agent_service)
+    req: RephraseRequest,
+    request: Request,
+    response: Response,
+    svc: RephraseService = Depends(get_agent_service),
+    cache: bool = True,
+    x_request_timeout: Optional[float] = Header(None),
 ):
     """Run a simple agent-style rephrase; if the AgentProvider (OpenAI Agents SDK)
     is not installed we fallback to a simpler orchestration using the chat provider or mock provider.
     """
+    bypass_cache(not cache)
+    start_deadline(x_request_timeout)
     styles = svc.validate_styles(req.styles)
     rid = req.ensure_request_id()
-    results = {}
+    trace = timing.start_trace(rid, request.scope)
     try:
-        for s in styles:
-            # provider.rephrase_full returns the final rephrase for each style
-            results[s] = await svc.provider.rephrase_full(s, req.input_text)
-        return {"request_id": rid, "results": results}
+        # styles run concurrently; a failing style is reported under "errors"
+        with timing.span("service"):
+            results, errors = await svc.rephrase_all(styles, req.input_text)
+        if errors and not results:
+            raise next(iter(errors.values()))
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+        return {
+            "request_id": rid,
+            "results": results,
+            "errors": error_messages(errors),
+        }
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except RuntimeError as re:
         raise HTTPException(status_code=501, detail=str(re))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        timing.finish_trace(trace)
 
 
 @router.post("/stream")
 async def run_agent_stream(
     req: RephraseRequest,
+    request: Request,
     svc: RephraseService = Depends(get_agent_service),
     example_format: bool = True,
+    cumulative: bool = True,
+    cache: bool = True,
+    x_request_timeout: Optional[float] = Header(None),
 ):
     """Stream agent rephrases as SSE. By default `example_format=True` to emit staged
     '[wait]' messages and incremental fragments similar to the example you provided.
+    Both formats follow the provider's token stream; cumulative=False sends only the
+    new text in each staged delta.
+    Cancel with POST /v1/agent/{request_id}/cancel.
     """
+    bypass_cache(not cache)
+    start_deadline(x_request_timeout, stream=True)
     styles = svc.validate_styles(req.styles)
     rid = req.ensure_request_id()
 
+    cancel_ev = cancel_registry.create(rid)
+    trace = timing.start_trace(rid, request.scope)
+
+    async def plain(style: str):
+        # deltas as they arrive, then the final text
+        label = style.capitalize()
+        parts = []
+        deltas = cancel_ev.iterate(svc.provider.rephrase_stream(style, req.input_text))
+        async with aclosing(deltas):
+            async for delta in deltas:
+                cancel_ev.record(style, delta)
+                parts.append(delta)
+                yield sse.delta(label, delta)
+        cancel_ev.finish(style)
+        final = "".join(parts).strip()
+        yield {
+            "event": "style_end",
+            "data": json.dumps({"style": label, "final": final}),
+        }
+
     async def gen():
-        try:
-            yield {"event": "meta", "data": json.dumps({"request_id": rid})}
-            for style in styles:
-                label = style.capitalize()
-                # get final sentence (may raise RuntimeError if provider is AgentProvider without SDK)
-                try:
-                    final = await svc.provider.rephrase_full(style, req.input_text)
-                except RuntimeError as re:
-                    yield {"event": "error", "data": json.dumps({"detail": str(re)})}
-                    continue
-
-                if example_format:
-                    # Emit the initial wait label then incremental fragments
-                    yield {
-                        "event": "delta",
-                        "data": json.dumps(
-                            {"style": label, "delta": f"[wait] {label}:"}
-                        ),
-                    }
-                    acc = []
-                    for w in final.split():
-                        acc.append(w)
-                        await asyncio.sleep(0.02)
-                        yield {
-                            "event": "delta",
-                            "data": json.dumps(
-                                {
-                                    "style": label,
-                                    "delta": f"[wait] {label}: {' '.join(acc)}",
-                                }
-                            ),
-                        }
-                    yield {
-                        "event": "style_end",
-                        "data": json.dumps({"style": label, "final": final}),
-                    }
-                else:
-                    # simple full emit
-                    yield {
-                        "event": "delta",
-                        "data": json.dumps({"style": label, "delta": final}),
-                    }
-                    yield {
-                        "event": "style_end",
-                        "data": json.dumps({"style": label, "final": final}),
-                    }
-
-            yield {"event": "done", "data": "[DONE]"}
-        finally:
-            # nothing to cleanup for now
-            return
-
-    return EventSourceResponse(gen())
+        for style in styles:
+            label = style.capitalize()
+            if example_format:
+                source = svc.provider.rephrase_stream(style, req.input_text)
+                events = staged_events(cancel_ev, source, style, cumulative)
+            else:
+                events = plain(style)
+            try:
+                async with aclosing(events):
+                    async for event in events:
+                        yield event
+            except DeadlineExceeded as e:
+                yield {
+                    "event": "error",
+                    "data": json.dumps(
+                        {"style": label, "detail": str(e), "stage": e.stage}
+                    ),
+                }
+                break
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                # e.g. RuntimeError when the Agents SDK is missing, or an
+                # upstream failure: report it and move on to the next style
+                yield {
+                    "event": "error",
+                    "data": json.dumps({"style": label, "detail": str(e)}),
+                }
+
+    return EventSourceResponse(
+        sse.coalesce(cancellable(rid, cancel_ev, styles, req.input_text, gen(), trace))
+    )
+
+
+@router.post("/{request_id}/cancel", response_model=CancelResponse)
+async def cancel(request_id: str):
+    ok = await cancel_registry.cancel(request_id)
+    return CancelResponse(request_id=request_id, cancelled=ok)
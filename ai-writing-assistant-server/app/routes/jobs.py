@@ -0,0 +1,36 @@
+from app.schemas import JobRequest, JobResponse
+from app.services.jobs import JobQueue
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+router = APIRouter(prefix="/v1/jobs", tags=["jobs"])
+
+
+def get_jobs(request: Request) -> JobQueue:
+    # started by the app lifespan unless JOBS_DB_PATH is empty
+    jobs = getattr(request.app.state, "jobs", None)
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="job queue is not enabled")
+    return jobs
+
+
+@router.post("", response_model=JobResponse, status_code=202)
+async def submit_job(req: JobRequest, jobs: JobQueue = Depends(get_jobs)):
+    """Queue a rephrase job and return at once; poll GET /v1/jobs/{id}.
+
+    Jobs are stored in SQLite, so they survive restarts: a job that was
+    running when its process stopped resumes with the styles it had not
+    finished yet.
+    """
+    job_id = await jobs.submit(
+        req.input_text, jobs.svc.validate_styles(req.styles), req.priority
+    )
+    return JobResponse(**await jobs.get(job_id))
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, jobs: JobQueue = Depends(get_jobs)):
+    """Status of a job, with the results of the styles finished so far."""
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return JobResponse(**job)
@@ -1,120 +1,384 @@
-import asyncio
 import json
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, List, Optional
 
+from app.config import BATCH_CONCURRENCY
+from app.providers.factory import build_provider
 from app.providers.mock_provider import MockProvider
-from app.providers.openai_chat import OpenAIChatProvider
-from app.schemas import CancelResponse, RephraseRequest, RephraseResponse
-from app.services.rephrase_service import RephraseService
-from app.utils.cancel import cancel_registry
-from fastapi import APIRouter, Depends, HTTPException
+from app.schemas import (BatchRequest, CancelResponse, RephraseRequest,
+                         RephraseResponse)
+from app.services.rephrase_service import RephraseService, error_messages
+from app.utils import codec, metrics, sse, streams, timing
+from app.utils.cache import bypass_cache
+from app.utils.cancel import CancelToken, RequestCancelled, cancel_registry
+from app.utils.deadline import DeadlineExceeded, start_deadline
+from app.utils.text import estimate_tokens
+from fastapi import (APIRouter, Depends, Header, HTTPException, Request,
+                     Response)
+from fastapi.responses import StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 
 router = APIRouter(prefix="/v1/rephrase", tags=["rephrase"])
 
 
-def get_service() -> RephraseService:
-    provider = OpenAIChatProvider()
+def error_event(style: str, exc: Exception) -> dict:
+    data = {"style": style, "detail": str(exc)}
+    if isinstance(exc, DeadlineExceeded):
+        data["stage"] = exc.stage
+    return {"event": "error", "data": json.dumps(data)}
+
+
+async def cancellable(
+    rid: str,
+    token: CancelToken,
+    styles: List[str],
+    input_text: str,
+    events: AsyncGenerator[dict, None],
+    trace: Optional[timing.Trace] = None,
+) -> AsyncGenerator[dict, None]:
+    """Wrap a stream's events with meta/done and cancellation handling.
+
+    `events` is expected to do its upstream waits through `token`, so a cancel
+    aborts them at once; a "cancelled" event then reports the estimated tokens
+    and time saved. A client disconnect closes `events` (and with it every
+    upstream stream) and is counted the same way. With a timing `trace` the
+    stream ends with a "timing" event holding its spans.
+    """
+    reported = False
+    in_flight = metrics.STREAMS_IN_FLIGHT.labels(metrics.current_route())
+    in_flight.inc()
+    try:
+        yield {"event": "meta", "data": json.dumps({"request_id": rid})}
+        async with aclosing(events):
+            try:
+                async for event in events:
+                    yield event
+            except RequestCancelled:
+                saved = token.savings(styles, estimate_tokens(input_text))
+                reported = True
+                yield {
+                    "event": "cancelled",
+                    "data": json.dumps({"request_id": rid, **saved}),
+                }
+        reported = True
+        if trace is not None:
+            yield {"event": "timing", "data": json.dumps(trace.summary())}
+        yield {"event": "done", "data": "[DONE]"}
+    finally:
+        timing.finish_trace(trace)
+        in_flight.dec()
+        cancel_registry.clear(rid)
+        if not reported:
+            token.savings(styles, estimate_tokens(input_text))
+
+
+async def staged_events(
+    token: CancelToken,
+    source: AsyncIterator[str],
+    style: str,
+    cumulative: bool = True,
+    fallback: Optional[str] = None,
+) -> AsyncGenerator[dict, None]:
+    """example_format events for one style, driven by its token stream.
+
+    Emits the "[wait] Label:" marker, then per upstream delta either the
+    cumulative "[wait] Label: text so far" or, with cumulative=False, just the
+    new text; then style_end with the final text. If `fallback` is given it
+    stands in for the output when the stream fails before its first delta.
+    """
+    label = style.capitalize()
+    marker = f"[wait] {label}:"
+    yield {"event": "delta", "data": json.dumps({"style": label, "delta": marker})}
+    parts: List[str] = []
+    deltas = token.iterate(source)
+    try:
+        async with aclosing(deltas):
+            async for piece in deltas:
+                if not parts:
+                    piece = piece.lstrip()
+                    if not piece:
+                        continue
+                token.record(style, piece)
+                parts.append(piece)
+                if not cumulative:
+                    yield sse.delta(label, piece)
+                    continue
+                # replaces the previous cumulative delta if both are pending
+                yield sse.snapshot(label, f"{marker} {''.join(parts).rstrip()}")
+    except (DeadlineExceeded, RequestCancelled):
+        raise
+    except Exception:
+        if parts or fallback is None:
+            raise
+        parts.append(fallback)
+        delta = fallback if not cumulative else f"{marker} {fallback}"
+        yield {"event": "delta", "data": json.dumps({"style": label, "delta": delta})}
+    token.finish(style)
+    final = "".join(parts).strip()
+    yield {"event": "style_end", "data": json.dumps({"style": label, "final": final})}
+
+
+def build_service() -> RephraseService:
+    provider = build_provider()
     return RephraseService(provider)
 
 
+def get_service(request: Request) -> RephraseService:
+    # built once by the app lifespan; lazily when it did not run (tests)
+    svc = getattr(request.app.state, "rephrase_service", None)
+    if svc is None:
+        svc = request.app.state.rephrase_service = build_service()
+    return svc
+
+
 @router.post("", response_model=RephraseResponse)
-async def rephrase(req: RephraseRequest, svc: RephraseService = Depends(get_service)):
+async def rephrase(
+    req: RephraseRequest,
+    request: Request,
+    response: Response,
+    svc: RephraseService = Depends(get_service),
+    combined: bool = False,
+    incremental: bool = False,
+    chunked: bool = False,
+    cache: bool = True,
+    x_request_timeout: Optional[float] = Header(None),
+):
+    """Rephrase into every requested style. With combined=True all styles are
+    generated by a single upstream completion instead of one call per style.
+    incremental=True only re-rephrases sentences that changed since an earlier
+    submission and reports reused/regenerated segment counts. chunked=True splits
+    long inputs into paragraph chunks that are rephrased in parallel.
+    cache=False skips cached results (e.g. "regenerate") and refreshes them.
+    The X-Request-Timeout header (seconds) overrides the default deadline;
+    running out of it returns 504. With TIMING_ENABLED the response carries
+    a Server-Timing header with the request's spans.
+    """
+    bypass_cache(not cache)
+    start_deadline(x_request_timeout)
     styles = svc.validate_styles(req.styles)
     rid = req.ensure_request_id()
+    trace = timing.start_trace(rid, request.scope)
+    segments = None
     try:
-        results = await svc.rephrase_all_full(styles, req.input_text)
-        return RephraseResponse(request_id=rid, results=results)
+        with timing.span("service"):
+            if incremental:
+                results, errors, segments = await svc.rephrase_all_incremental(
+                    styles, req.input_text
+                )
+            elif chunked:
+                results, errors = await svc.rephrase_all_chunked(styles, req.input_text)
+            elif combined:
+                results, errors = await svc.rephrase_all_combined(
+                    styles, req.input_text
+                )
+            else:
+                results, errors = await svc.rephrase_all(styles, req.input_text)
+        if errors and not results:
+            raise next(iter(errors.values()))
+        with timing.span("serialize"):
+            out = RephraseResponse(
+                request_id=rid,
+                results=results,
+                errors=error_messages(errors),
+                segments=segments,
+            )
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+        return out
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        timing.finish_trace(trace)
 
 
 @router.post("/stream")
 async def rephrase_stream(
     req: RephraseRequest,
+    request: Request,
     svc: RephraseService = Depends(get_service),
     example_format: bool = False,
+    cumulative: bool = True,
+    interleave: bool = False,
+    combined: bool = False,
+    chunked: bool = False,
+    cache: bool = True,
+    x_request_timeout: Optional[float] = Header(None),
 ):
     """Stream rephrases. If example_format=True the server will emit staged '[wait]' messages
     and incremental sentence fragments to match the example format requested by the client.
+    They follow the real token stream; with cumulative=False each delta carries only the
+    new text instead of the whole "[wait] Label: ..." sentence so far.
+    With interleave=True all styles stream at the same time and their deltas are merged
+    as they arrive (each tagged with its style); otherwise styles stream one after another.
+    combined=True asks for all styles in one upstream completion and splits its output
+    back into per-style events of the same shape. chunked=True rephrases long inputs
+    as parallel paragraph chunks, still emitted in original order.
+    cache=False skips cached results. When the deadline (X-Request-Timeout or
+    the default) runs out, the style gets an error event with "stage" set.
+    POST /{request_id}/cancel aborts in-flight upstream calls immediately and
+    ends the stream with a "cancelled" event reporting the estimated savings.
+    Consecutive deltas of a style are merged into one event (see SSE_FLUSH_MS
+    and SSE_FLUSH_BYTES), more so while the client reads slowly.
     """
+    bypass_cache(not cache)
+    start_deadline(x_request_timeout, stream=True)
     styles = svc.validate_styles(req.styles)
     rid = req.ensure_request_id()
     cancel_ev = cancel_registry.create(rid)
+    trace = timing.start_trace(rid, request.scope)
 
     async def gen_example():
         # Produce the example-style staged output for each style
-        try:
-            yield {"event": "meta", "data": json.dumps({"request_id": rid})}
-            for style in styles:
-                if cancel_ev.is_set():
-                    break
-                # label capitalized for human-friendly display
-                label = style.capitalize()
-                # sample final sentence generation using the provider full call if available
-                try:
-                    final = await svc.provider.rephrase_full(style, req.input_text)
-                except Exception:
-                    final = f"{label}: {req.input_text}"
-
-                # Break final into words and progressively emit
-                words = final.split()
-                # initial waits
-                yield {
-                    "event": "delta",
-                    "data": json.dumps({"style": label, "delta": f"[wait] {label}:"}),
-                }
-                # progressively reveal sentence
-                acc = []
-                for w in words:
-                    if cancel_ev.is_set():
-                        break
-                    acc.append(w)
-                    # small pause to simulate streaming
-                    await asyncio.sleep(0.02)
-                    yield {
-                        "event": "delta",
-                        "data": json.dumps(
-                            {
-                                "style": label,
-                                "delta": f"[wait] {label}: {' '.join(acc)}",
-                            }
-                        ),
-                    }
-                # final emit for style
-                yield {
-                    "event": "style_end",
-                    "data": json.dumps({"style": label, "final": final}),
-                }
-            yield {"event": "done", "data": "[DONE]"}
-        finally:
-            cancel_registry.clear(rid)
+        for style in styles:
+            source = svc.stream_style(style, req.input_text, chunked=chunked)
+            try:
+                async for event in staged_events(
+                    cancel_ev,
+                    source,
+                    style,
+                    cumulative,
+                    fallback=f"{style.capitalize()}: {req.input_text}",
+                ):
+                    yield event
+            except DeadlineExceeded as e:
+                yield error_event(style, e)
+                break
 
     async def gen_default():
         # Existing behavior: stream raw deltas from provider
+        for style in styles:
+            yield {"event": "style_start", "data": style}
+            deltas = cancel_ev.iterate(
+                svc.stream_style(style, req.input_text, chunked=chunked)
+            )
+            try:
+                async with aclosing(deltas):
+                    async for delta in deltas:
+                        cancel_ev.record(style, delta)
+                        yield sse.delta(style, delta)
+            except DeadlineExceeded as e:
+                yield error_event(style, e)
+                break
+            cancel_ev.finish(style)
+            yield {"event": "style_end", "data": style}
+
+    async def gen_tagged(source):
+        # Styles are produced together; events are tagged with their style
+        tagged = cancel_ev.iterate(source)
+        async with aclosing(tagged):
+            async for style, kind, value in tagged:
+                if kind == streams.START:
+                    yield {"event": "style_start", "data": style}
+                elif kind == streams.ITEM:
+                    cancel_ev.record(style, value)
+                    yield sse.delta(style, value)
+                elif kind == streams.END:
+                    cancel_ev.finish(style)
+                    yield {"event": "style_end", "data": style}
+                else:
+                    cancel_ev.finish(style)
+                    yield error_event(style, value)
+
+    def respond(events):
+        return EventSourceResponse(
+            sse.coalesce(
+                cancellable(rid, cancel_ev, styles, req.input_text, events, trace)
+            )
+        )
+
+    if example_format:
+        return respond(gen_example())
+    if combined:
+        return respond(gen_tagged(svc.stream_styles_combined(styles, req.input_text)))
+    if interleave:
+        source = svc.stream_styles_interleaved(styles, req.input_text, chunked=chunked)
+        return respond(gen_tagged(source))
+    return respond(gen_default())
+
+
+@router.post("/batch")
+async def rephrase_batch(
+    req: BatchRequest,
+    svc: RephraseService = Depends(get_service),
+    cache: bool = True,
+    x_request_timeout: Optional[float] = Header(None),
+):
+    """Rephrase many items in one request, streamed back as NDJSON.
+
+    Every item x style pair is scheduled under one concurrency limit
+    (BATCH_CONCURRENCY) and the shared upstream rate limiter; X-Request-Timeout
+    applies to each pair. Lines are a "meta" line, then one "result" or
+    "error" line per pair as soon as it finishes, then "done" with the counts.
+    A failed pair does not stop the others. POST /{request_id}/cancel aborts
+    the pairs in flight and ends the stream with a "cancelled" line instead.
+    """
+    bypass_cache(not cache)
+    rid = req.ensure_request_id()
+    pairs = [
+        (item.id or str(i), style, item.input_text)
+        for i, item in enumerate(req.items)
+        for style in svc.validate_styles(item.styles)
+    ]
+    token = cancel_registry.create(rid)
+
+    def line(obj: dict) -> bytes:
+        return codec.dumps(obj) + b"\n"
+
+    async def lines():
+        completed = failed = 0
         try:
-            yield {"event": "meta", "data": json.dumps({"request_id": rid})}
-            for style in styles:
-                if cancel_ev.is_set():
-                    break
-                yield {"event": "style_start", "data": style}
-                async for delta in svc.stream_style(style, req.input_text):
-                    if cancel_ev.is_set():
-                        break
-                    yield {
-                        "event": "delta",
-                        "data": json.dumps({"style": style, "delta": delta}),
+            yield line(
+                {
+                    "type": "meta",
+                    "request_id": rid,
+                    "items": len(req.items),
+                    "pairs": len(pairs),
+                }
+            )
+            results = svc.rephrase_batch(
+                pairs, BATCH_CONCURRENCY, token, x_request_timeout
+            )
+            try:
+                async with aclosing(results):
+                    async for item_id, style, out in results:
+                        if isinstance(out, Exception):
+                            failed += 1
+                            data = {"type": "error", "id": item_id, "style": style}
+                            data["detail"] = str(out) or type(out).__name__
+                            if isinstance(out, DeadlineExceeded):
+                                data["stage"] = out.stage
+                            yield line(data)
+                        else:
+                            completed += 1
+                            yield line(
+                                {
+                                    "type": "result",
+                                    "id": item_id,
+                                    "style": style,
+                                    "result": out,
+                                }
+                            )
+            except RequestCancelled:
+                yield line(
+                    {
+                        "type": "cancelled",
+                        "request_id": rid,
+                        "completed": completed,
+                        "failed": failed,
+                        "skipped": len(pairs) - completed - failed,
                     }
-                yield {"event": "style_end", "data": style}
-            yield {"event": "done", "data": "[DONE]"}
+                )
+                return
+            yield line({"type": "done", "completed": completed, "failed": failed})
         finally:
             cancel_registry.clear(rid)
 
-    if example_format:
-        return EventSourceResponse(gen_example())
-    return EventSourceResponse(gen_default())
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @router.post("/{request_id}/cancel", response_model=CancelResponse)
 async def cancel(request_id: str):
-    ok = cancel_registry.cancel(request_id)
+    ok = await cancel_registry.cancel(request_id)
     return CancelResponse(request_id=request_id, cancelled=ok)
@@ -1,6 +1,7 @@
 import uuid
 from typing import Dict, List, Optional
 
+from app.config import BATCH_MAX_ITEMS
 from pydantic import BaseModel, Field
 
 DEFAULT_STYLES = ["professional", "casual", "polite", "social-media"]
@@ -15,9 +16,49 @@ class RephraseRequest(BaseModel):
         return self.request_id or str(uuid.uuid4())
 
 
+class BatchItem(BaseModel):
+    # defaults to the item's position in the batch
+    id: Optional[str] = None
+    input_text: str = Field(min_length=1, max_length=8000)
+    styles: List[str] = Field(default_factory=lambda: DEFAULT_STYLES)
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+    request_id: Optional[str] = None
+
+    def ensure_request_id(self) -> str:
+        return self.request_id or str(uuid.uuid4())
+
+
+class JobRequest(BaseModel):
+    input_text: str = Field(min_length=1, max_length=8000)
+    styles: List[str] = Field(default_factory=lambda: DEFAULT_STYLES)
+    # higher runs first; equal priorities run oldest first
+    priority: int = Field(default=0, ge=-100, le=100)
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    priority: int
+    styles: List[str]
+    # partial while running: styles appear here as they finish
+    results: Dict[str, str] = Field(default_factory=dict)
+    errors: Dict[str, str] = Field(default_factory=dict)
+    attempts: int = 0
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
 class RephraseResponse(BaseModel):
     request_id: str
     results: Dict[str, str]
+    # styles that failed, with the upstream error message
+    errors: Dict[str, str] = Field(default_factory=dict)
+    # incremental mode only: {"style": {"reused": n, "regenerated": m}}
+    segments: Optional[Dict[str, Dict[str, int]]] = None
 
 
 class CancelResponse(BaseModel):
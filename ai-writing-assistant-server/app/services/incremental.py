@@ -0,0 +1,61 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from app.config import CACHE_TTL_SECONDS, SEGMENT_CACHE_MAX_ENTRIES
+from app.providers.base import LLMProvider
+from app.utils.cache import LRUCache, cache_bypassed
+from app.utils.stats import register_stats
+from app.utils.text import split_segments
+
+# Rephrased segments keyed by provider.cache_key(style, segment), so the key
+# covers the segment's content hash, the style and the model settings
+segment_cache = LRUCache(SEGMENT_CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+register_stats(
+    "segments",
+    lambda: {"entries": len(segment_cache), "evictions": segment_cache.evictions},
+)
+
+
+class IncrementalRephraser:
+    """Rephrases text sentence by sentence, reusing previously rephrased ones.
+
+    When an edited input is resubmitted only the segments whose content
+    changed go to the provider; the rest come from `segment_cache` and the
+    output is stitched back together with the original separators.
+    """
+
+    def __init__(self, provider: LLMProvider, cache: LRUCache = segment_cache):
+        self.provider = provider
+        self.cache = cache
+
+    async def rephrase(
+        self, style: str, text: str, sem: asyncio.Semaphore
+    ) -> Tuple[str, Dict[str, int]]:
+        pairs = split_segments(text)
+        keys = [self.provider.cache_key(style, seg) for seg, _ in pairs]
+        out: List[str] = [""] * len(pairs)
+        # identical segments within one text are rephrased once
+        todo: Dict[str, List[int]] = {}
+        reused = 0
+        for i, key in enumerate(keys):
+            cached = None if cache_bypassed() else self.cache.get(key)
+            if cached is not None:
+                out[i] = cached
+                reused += 1
+            else:
+                todo.setdefault(key, []).append(i)
+
+        async def one(key: str, indexes: List[int]):
+            async with sem:
+                result = await self.provider.rephrase_full(
+                    style, pairs[indexes[0]][0].strip()
+                )
+            result = result.strip()
+            self.cache.set(key, result)
+            for i in indexes:
+                out[i] = result
+
+        await asyncio.gather(*(one(k, idx) for k, idx in todo.items()))
+        stitched = "".join(o + sep for o, (_, sep) in zip(out, pairs)).strip()
+        regenerated = sum(len(idx) for idx in todo.values())
+        return stitched, {"reused": reused, "regenerated": regenerated}
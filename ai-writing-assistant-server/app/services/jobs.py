@@ -0,0 +1,281 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from app.config import (
+    JOBS_LEASE_SECONDS,
+    JOBS_MAX_ATTEMPTS,
+    JOBS_POLL_SECONDS,
+    JOBS_WORKERS,
+)
+from app.services.rephrase_service import RephraseService
+from app.utils.deadline import start_deadline
+from app.utils.logging import logger
+
+STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobStore:
+    """SQLite (WAL) table of rephrase jobs, shared by the workers of a host.
+
+    A worker claims a job by taking a lease on it and renews the lease while
+    it runs. Per-style results are written as they finish, so a job whose
+    worker died is claimed again once the lease runs out and only its
+    missing styles are redone.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "input_text TEXT NOT NULL, styles TEXT NOT NULL, "
+            "results TEXT NOT NULL DEFAULT '{}', errors TEXT NOT NULL DEFAULT '{}', "
+            "attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_queue "
+            "ON jobs (status, priority DESC, created_at)"
+        )
+        self._conn.commit()
+
+    def submit(
+        self, input_text: str, styles: List[str], priority: int = 0, job_id=None
+    ) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, input_text, styles, "
+                "created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, priority, input_text, json.dumps(styles), time.time()),
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return None if row is None else _job(row)
+
+    def claim(self, lease: float, max_attempts: int) -> Optional[dict]:
+        """Lease the highest-priority runnable job, oldest first, or None.
+
+        Runnable means queued, or running under an expired lease (its worker
+        died); jobs that already used `max_attempts` are failed instead,
+        keeping the per-style results and errors they got so far.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")  # one claimer at a time
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                "errors = json_set(errors, '$.\"*\"', 'too many attempts') "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now, max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', lease_until = ?, "
+                "attempts = attempts + 1, started_at = COALESCE(started_at, ?) "
+                "WHERE id = ?",
+                (now + lease, now, row["id"]),
+            )
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+            ).fetchone()
+        return _job(row)
+
+    def renew(self, job_id: str, lease: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                (time.time() + lease, job_id),
+            )
+
+    def save_style(
+        self, job_id: str, style: str, result: Optional[str], error: Optional[str]
+    ) -> None:
+        column = "results" if error is None else "errors"
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                f"SELECT {column} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            values = json.loads(row[0])
+            values[style] = result if error is None else error
+            self._conn.execute(
+                f"UPDATE jobs SET {column} = ? WHERE id = ?",
+                (json.dumps(values), job_id),
+            )
+
+    def finish(self, job_id: str) -> None:
+        # done if any style succeeded, failed if every one errored
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET finished_at = ?, lease_until = NULL, status = "
+                "CASE WHEN results = '{}' THEN 'failed' ELSE 'done' END "
+                "WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+    def release(self, job_ids: List[str]) -> None:
+        # hand unfinished jobs back at shutdown instead of waiting for leases
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'queued', lease_until = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND status = 'running'",
+                [(job_id,) for job_id in job_ids],
+            )
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            counts = dict(
+                self._conn.execute(
+                    "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+                ).fetchall()
+            )
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+        out: Dict[str, float] = {s: counts.get(s, 0) for s in STATUSES}
+        out["oldest_queued_seconds"] = round(now - oldest, 3) if oldest else 0.0
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    for key in ("styles", "results", "errors"):
+        job[key] = json.loads(job[key])
+    return job
+
+
+class JobQueue:
+    """Pool of in-process workers draining a `JobStore` through `svc`.
+
+    Workers wake up on local submits and otherwise poll every
+    JOBS_POLL_SECONDS, which also picks up jobs submitted to other processes
+    and jobs whose previous worker died.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        svc: RephraseService,
+        workers: int = JOBS_WORKERS,
+        lease: float = JOBS_LEASE_SECONDS,
+        poll: float = JOBS_POLL_SECONDS,
+        max_attempts: int = JOBS_MAX_ATTEMPTS,
+    ):
+        self.store = store
+        self.svc = svc
+        self.workers = workers
+        self.lease = lease
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._running: Set[str] = set()
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        # snapshot first: cancelled workers drop their jobs from _running
+        running = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.to_thread(self.store.release, running)
+        self._running.clear()
+
+    async def submit(self, input_text: str, styles: List[str], priority: int = 0):
+        job_id = await asyncio.to_thread(
+            self.store.submit, input_text, styles, priority
+        )
+        self._wake.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _work(self) -> None:
+        while True:
+            job = await asyncio.to_thread(
+                self.store.claim, self.lease, self.max_attempts
+            )
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running.add(job["id"])
+            try:
+                await self._run(job)
+            except Exception:
+                # the lease runs out and the job is retried
+                logger.exception("job %s failed", job["id"])
+            finally:
+                self._running.discard(job["id"])
+
+    async def _run(self, job: dict) -> None:
+        todo = [
+            s
+            for s in job["styles"]
+            if s not in job["results"] and s not in job["errors"]
+        ]
+
+        sem = asyncio.Semaphore(self.svc.max_concurrency)
+
+        async def one(style: str) -> None:
+            # each style is stored as soon as it finishes (partial results)
+            result = error = None
+            async with sem:
+                start_deadline()
+                try:
+                    result = await self.svc.provider.rephrase_full(
+                        style, job["input_text"]
+                    )
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+            await asyncio.to_thread(
+                self.store.save_style, job["id"], style, result, error
+            )
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(self.lease / 3)
+                await asyncio.to_thread(self.store.renew, job["id"], self.lease)
+
+        renewing = asyncio.create_task(heartbeat())
+        try:
+            await asyncio.gather(*(one(s) for s in todo))
+        finally:
+            renewing.cancel()
+            await asyncio.gather(renewing, return_exceptions=True)
+        await asyncio.to_thread(self.store.finish, job["id"])
@@ -1,22 +1,268 @@
-from typing import AsyncGenerator, Dict, List
+import asyncio
+from contextlib import aclosing
+from typing import (Any, AsyncGenerator, Awaitable, Callable, Dict, List,
+                    Optional, Tuple)
 
+from app.config import CHUNK_CONCURRENCY, CHUNK_MAX_TOKENS, STYLE_CONCURRENCY
 from app.providers.base import LLMProvider
 from app.schemas import DEFAULT_STYLES
+from app.services.incremental import IncrementalRephraser
+from app.utils import streams, timing
+from app.utils.cancel import CancelToken, RequestCancelled
+from app.utils.deadline import start_deadline
+from app.utils.streams import merge_tagged
+from app.utils.text import chunk_paragraphs
+
+
+async def _gather_styles(
+    styles: List[str], fn: Callable[[str], Awaitable[Any]]
+) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    # Run fn per style concurrently; failures are collected per style
+    outcomes = await asyncio.gather(*(fn(s) for s in styles), return_exceptions=True)
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Exception] = {}
+    for style, out in zip(styles, outcomes):
+        if isinstance(out, asyncio.CancelledError):
+            raise out
+        if isinstance(out, BaseException):
+            errors[style] = out
+        else:
+            results[style] = out
+    return results, errors
+
+
+def error_messages(errors: Dict[str, Exception]) -> Dict[str, str]:
+    return {style: str(e) or type(e).__name__ for style, e in errors.items()}
 
 
 class RephraseService:
-    def __init__(self, provider: LLMProvider):
+    def __init__(self, provider: LLMProvider, max_concurrency: Optional[int] = None):
         self.provider = provider
+        self.max_concurrency = max_concurrency or STYLE_CONCURRENCY
 
     def validate_styles(self, styles: List[str]) -> List[str]:
         return styles or DEFAULT_STYLES
 
+    async def rephrase_all(
+        self, styles: List[str], text: str
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """Rephrase every style concurrently (at most `max_concurrency` at a time).
+
+        Returns `(results, errors)`, both keyed by style in the requested order.
+        A failing style lands in `errors` without affecting the others.
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(style: str) -> str:
+            with timing.span(f"style.{style}"):
+                async with sem:
+                    return await self.provider.rephrase_full(style, text)
+
+        return await _gather_styles(styles, one)
+
+    async def rephrase_batch(
+        self,
+        pairs: List[Tuple[str, str, str]],
+        concurrency: int,
+        token: Optional[CancelToken] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncGenerator[Tuple[str, str, Any], None]:
+        """Rephrase `(item_id, style, text)` pairs, at most `concurrency` at a
+        time, yielding `(item_id, style, result)` in completion order.
+
+        A failed pair yields its exception as the result. Each pair gets its
+        own deadline (`timeout` as for X-Request-Timeout). Cancelling `token`
+        aborts the calls in flight and raises RequestCancelled; so does
+        closing the generator, minus the exception.
+        """
+        todo = iter(pairs)
+        # bounded, so workers stop taking pairs while the consumer lags
+        done: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+        async def worker():
+            try:
+                for item_id, style, text in todo:
+                    start_deadline(timeout)
+                    call = self.provider.rephrase_full(style, text)
+                    try:
+                        out = await (token.guard(call) if token else call)
+                    except RequestCancelled:
+                        raise
+                    except Exception as e:
+                        out = e
+                    await done.put((item_id, style, out))
+            except RequestCancelled as e:
+                await done.put(e)
+
+        workers = [
+            asyncio.create_task(worker()) for _ in range(min(concurrency, len(pairs)))
+        ]
+        try:
+            # every pair is reported exactly once, unless the batch is cancelled
+            for _ in pairs:
+                got = await done.get()
+                if isinstance(got, RequestCancelled):
+                    raise got
+                yield got
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def rephrase_all_incremental(
+        self, styles: List[str], text: str
+    ) -> Tuple[Dict[str, str], Dict[str, Exception], Dict[str, Dict[str, int]]]:
+        """Like `rephrase_all`, but only segments that changed since a previous
+        submission are sent upstream. Also returns reused/regenerated segment
+        counts per style.
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        rephraser = IncrementalRephraser(self.provider)
+        outcomes, errors = await _gather_styles(
+            styles, lambda style: rephraser.rephrase(style, text, sem)
+        )
+        results = {style: out[0] for style, out in outcomes.items()}
+        segments = {style: out[1] for style, out in outcomes.items()}
+        return results, errors, segments
+
     async def rephrase_all_full(self, styles: List[str], text: str) -> Dict[str, str]:
-        results: Dict[str, str] = {}
-        for s in styles:
-            results[s] = await self.provider.rephrase_full(s, text)
+        results, errors = await self.rephrase_all(styles, text)
+        if errors and not results:
+            raise next(iter(errors.values()))
         return results
 
-    async def stream_style(self, style: str, text: str) -> AsyncGenerator[str, None]:
-        async for tok in self.provider.rephrase_stream(style, text):
-            yield tok
+    async def rephrase_all_chunked(
+        self, styles: List[str], text: str
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """Like `rephrase_all`, for long inputs: each style's text is split into
+        paragraph chunks that are rephrased in parallel and joined in order.
+        """
+        chunks = chunk_paragraphs(text, CHUNK_MAX_TOKENS)
+        if len(chunks) == 1:
+            return await self.rephrase_all(styles, text)
+        style_sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(style: str) -> str:
+            sem = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+            async def chunk(piece: str) -> str:
+                if not piece.strip():
+                    return ""
+                async with sem:
+                    out = await self.provider.rephrase_full(style, piece.strip())
+                return out.strip()
+
+            async with style_sem:
+                outs = await asyncio.gather(*(chunk(c) for c, _ in chunks))
+            return "".join(o + sep for o, (_, sep) in zip(outs, chunks)).strip()
+
+        return await _gather_styles(styles, one)
+
+    async def stream_style(
+        self, style: str, text: str, chunked: bool = False
+    ) -> AsyncGenerator[str, None]:
+        chunks = chunk_paragraphs(text, CHUNK_MAX_TOKENS) if chunked else []
+        if len(chunks) > 1:
+            source = self._stream_chunks(style, chunks)
+        else:
+            source = self.provider.rephrase_stream(style, text)
+        async with aclosing(source) as stream:
+            async for tok in stream:
+                yield tok
+
+    async def _stream_chunks(
+        self, style: str, chunks: List[Tuple[str, str]]
+    ) -> AsyncGenerator[str, None]:
+        # Chunks stream concurrently but are emitted in original order: a chunk
+        # that gets ahead is buffered and flushed once every earlier chunk is done.
+        n = len(chunks)
+        buffers: List[List[str]] = [[] for _ in range(n)]
+        sources = {
+            i: self.provider.rephrase_stream(style, piece.strip())
+            for i, (piece, _) in enumerate(chunks)
+            if piece.strip()
+        }
+        done = [i not in sources for i in range(n)]
+        current = 0
+
+        def advance() -> List[str]:
+            # flush separators and buffered output of chunks that can go out now
+            nonlocal current
+            out: List[str] = []
+            while current < n and done[current]:
+                out.append(chunks[current][1])
+                current += 1
+                if current < n:
+                    out.extend(buffers[current])
+                    buffers[current].clear()
+            return out
+
+        merged = merge_tagged(sources, max_concurrency=CHUNK_CONCURRENCY)
+        async with aclosing(merged):
+            for piece in advance():
+                if piece:
+                    yield piece
+            async for i, kind, value in merged:
+                if kind == streams.ERROR:
+                    raise value
+                if kind == streams.ITEM:
+                    if i == current:
+                        yield value
+                    else:
+                        buffers[i].append(value)
+                elif kind == streams.END:
+                    done[i] = True
+                    for piece in advance():
+                        if piece:
+                            yield piece
+
+    def stream_styles_interleaved(
+        self, styles: List[str], text: str, chunked: bool = False
+    ) -> AsyncGenerator[Tuple[str, str, Any], None]:
+        """Stream all styles at once; see `merge_tagged` for the yielded tuples."""
+        return merge_tagged(
+            {s: self.stream_style(s, text, chunked=chunked) for s in styles},
+            max_concurrency=self.max_concurrency,
+        )
+
+    async def rephrase_all_combined(
+        self, styles: List[str], text: str
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """Like `rephrase_all`, but every style comes from a single upstream call."""
+        data = await self.provider.rephrase_multi_full(styles, text)
+        results = {s: data[s] for s in styles if s in data}
+        errors: Dict[str, Exception] = {
+            s: ValueError("style missing from combined output")
+            for s in styles
+            if s not in data
+        }
+        return results, errors
+
+    async def stream_styles_combined(
+        self, styles: List[str], text: str
+    ) -> AsyncGenerator[Tuple[str, str, Any], None]:
+        """Single-call counterpart of `stream_styles_interleaved`, same tuples."""
+        current = None
+        seen = set()
+        source = self.provider.rephrase_multi_stream(styles, text)
+        try:
+            async for style, delta in source:
+                if style != current:
+                    if current is not None:
+                        yield current, streams.END, None
+                    current = style
+                    seen.add(style)
+                    yield style, streams.START, None
+                yield style, streams.ITEM, delta
+        except Exception as e:
+            for s in styles:
+                if s not in seen or s == current:
+                    yield s, streams.ERROR, e
+            return
+        finally:
+            await source.aclose()
+        if current is not None:
+            yield current, streams.END, None
+        for s in styles:
+            if s not in seen:
+                yield s, streams.ERROR, ValueError("style missing from combined output")
@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.config import (
+    CACHE_ENABLED,
+    CACHE_MAX_ENTRIES,
+    CACHE_SQLITE_PATH,
+    CACHE_TTL_SECONDS,
+)
+from app.utils.stats import register_stats
+
+# Set per request (e.g. "regenerate" clicks) to skip cache reads; fresh
+# results are still written back so the next identical request gets them.
+_bypass: ContextVar[bool] = ContextVar("cache_bypass", default=False)
+
+
+def bypass_cache(enabled: bool = True) -> None:
+    _bypass.set(enabled)
+
+
+def cache_bypassed() -> bool:
+    return _bypass.get()
+
+
+def normalize_text(text: str) -> str:
+    # Collapse whitespace so trailing newlines or double spaces still hit
+    return " ".join(text.split())
+
+
+def make_key(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class LRUCache:
+    """In-memory LRU with a per-entry TTL and a size bound."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+
+class SQLiteCache:
+    """On-disk tier shared by every worker on the host (SQLite in WAL mode).
+
+    Expired rows are never returned; they are deleted by a sweep that runs
+    on a write at most every `sweep_interval` seconds.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, sweep_interval: float = 60):
+        self.path = path
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rephrase_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS rephrase_cache_expires "
+            "ON rephrase_cache (expires_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM rephrase_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rephrase_cache (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, now + self.ttl),
+            )
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                self._conn.execute(
+                    "DELETE FROM rephrase_cache WHERE expires_at < ?", (now,)
+                )
+            self._conn.commit()
+
+    def recent(self, limit: int) -> List[Tuple[str, str, float]]:
+        """Up to `limit` live `(key, value, expires_at)` rows, newest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, value, expires_at FROM rephrase_cache WHERE expires_at >= ? "
+                "ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """Two-tier cache: memory LRU in front of an optional SQLite tier."""
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self.writes += 1
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    async def preload(self) -> int:
+        """Fill the memory tier from the SQLite tier; returns entries loaded."""
+        if self.disk is None:
+            return 0
+        rows = await asyncio.to_thread(self.disk.recent, self.memory.max_entries)
+        now = time.time()
+        for key, value, expires_at in reversed(rows):  # newest ends up MRU
+            self.memory.set(key, value, ttl=expires_at - now)
+        return len(rows)
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "entries": len(self.memory),
+        }
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache built from config, or None when CACHE_ENABLED is off."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        disk = (
+            SQLiteCache(CACHE_SQLITE_PATH, CACHE_TTL_SECONDS)
+            if CACHE_SQLITE_PATH
+            else None
+        )
+        _cache = ResponseCache(LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS), disk)
+        register_stats("cache", _cache.stats)
+    return _cache
+
+
+def close_response_cache() -> None:
+    global _cache
+    cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
@@ -1,28 +1,217 @@
 import asyncio
-from typing import Dict
+import time
+from collections import OrderedDict
+from typing import (AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict,
+                    Iterable, Optional, Set, TypeVar)
 
+from app.config import CANCEL_BACKEND, CANCEL_SOCKET_PATH, CANCEL_TTL_SECONDS
+from app.utils import metrics
+from app.utils.stats import register_stats
+from app.utils.text import estimate_tokens
+
+T = TypeVar("T")
+
+
+class RequestCancelled(Exception):
+    """Raised inside a guarded await when its request is cancelled."""
+
+
+class CancelToken:
+    """Cancellation state of one request.
+
+    Behaves like the asyncio.Event it replaces (`is_set`, `set`, `wait`), and
+    `guard(aw)` additionally aborts an in-flight await the moment the request
+    is cancelled, so upstream work stops without waiting for the next token.
+    It also tracks what was streamed per style to estimate what a cancel saved.
+    """
 
-class CancelRegistry:
     def __init__(self):
-        self._events: Dict[str, asyncio.Event] = {}
+        self._event = asyncio.Event()
+        self._callbacks: Set[Callable[[], None]] = set()
+        self.started = time.monotonic()
+        self._tokens: Dict[str, int] = {}
+        self._finished: Set[str] = set()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def set(self) -> None:
+        self._event.set()
+        for callback in list(self._callbacks):
+            callback()
+
+    async def wait(self) -> None:
+        await self._event.wait()
+
+    async def guard(self, aw: Awaitable[T]) -> T:
+        """Await `aw`, cancelling it and raising RequestCancelled on cancel."""
+        if self.is_set():
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise RequestCancelled()
+        task = asyncio.current_task()
+        fired = False
+
+        def fire():
+            nonlocal fired
+            if not fired:
+                fired = True
+                task.cancel()
+
+        # same approach as asyncio.timeout: cancel the awaiting task, then
+        # turn our own cancellation back into a regular exception
+        self._callbacks.add(fire)
+        try:
+            return await aw
+        except asyncio.CancelledError:
+            if fired and task.uncancel() == 0:
+                raise RequestCancelled() from None
+            raise
+        finally:
+            self._callbacks.discard(fire)
+
+    async def iterate(self, source: AsyncIterator[T]) -> AsyncGenerator[T, None]:
+        """Re-yield `source` with every wait for the next item guarded.
+        `source` is closed when this generator finishes or is closed.
+        """
+        try:
+            while True:
+                try:
+                    item = await self.guard(source.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def record(self, style: str, delta: str) -> None:
+        # a streamed delta is roughly one token; estimate_tokens keeps it >= 1
+        self._tokens[style] = self._tokens.get(style, 0) + estimate_tokens(delta)
+
+    def finish(self, style: str) -> None:
+        self._finished.add(style)
 
-    def create(self, request_id: str) -> asyncio.Event:
-        ev = asyncio.Event()
+    def savings(self, styles: Iterable[str], expected_tokens: int) -> dict:
+        """Estimate the output tokens (and generation time) a cancel avoided.
+
+        Each unfinished style is expected to produce `expected_tokens`; time is
+        extrapolated from this request's own token rate when it has one.
+        """
+        elapsed = time.monotonic() - self.started
+        produced = sum(self._tokens.values())
+        saved = sum(
+            max(0, expected_tokens - self._tokens.get(s, 0))
+            for s in styles
+            if s not in self._finished
+        )
+        seconds = saved * elapsed / produced if produced else None
+        _totals["tokens_saved"] += saved
+        _totals["seconds_saved"] += seconds or 0.0
+        return {
+            "tokens_saved": saved,
+            "seconds_saved": None if seconds is None else round(seconds, 3),
+            "elapsed_seconds": round(elapsed, 3),
+        }
+
+
+class CancelRegistry:
+    """Maps request ids to their CancelToken.
+
+    Without a backend cancels only reach streams in this process. With one
+    (see `build_cancel_backend`) ids are also registered with a host-wide
+    broker, so a cancel POST that lands on another worker is pushed here.
+    """
+
+    def __init__(self, ttl: float = CANCEL_TTL_SECONDS):
+        self.ttl = ttl
+        # in creation order, which is also expiry order (one ttl for all)
+        self._events: OrderedDict[str, CancelToken] = OrderedDict()
+        self._backend = None
+
+    async def start(self, backend) -> None:
+        self._backend = backend
+        if backend is not None:
+            await backend.start(self._cancel_local, lambda: list(self._events))
+
+    async def close(self) -> None:
+        backend, self._backend = self._backend, None
+        if backend is not None:
+            await backend.close()
+
+    def create(self, request_id: str) -> CancelToken:
+        self._expire()
+        ev = CancelToken()
         self._events[request_id] = ev
+        self._events.move_to_end(request_id)
+        if self._backend is not None:
+            self._backend.register(request_id)
         return ev
 
-    def get(self, request_id: str):
+    def get(self, request_id: str) -> Optional[CancelToken]:
         return self._events.get(request_id)
 
-    def cancel(self, request_id: str) -> bool:
+    def _cancel_local(self, request_id: str) -> bool:
         ev = self._events.get(request_id)
         if not ev:
             return False
         ev.set()
         return True
 
+    async def cancel(self, request_id: str) -> bool:
+        ok = self._cancel_local(request_id)
+        if not ok and self._backend is not None:
+            ok = await self._backend.cancel(request_id)
+        if ok:
+            _totals["cancelled"] += 1
+        return ok
+
     def clear(self, request_id: str) -> None:
-        self._events.pop(request_id, None)
+        if self._events.pop(request_id, None) and self._backend is not None:
+            self._backend.unregister(request_id)
+
+    def _expire(self) -> None:
+        # drop ids of streams that were never consumed (and so never cleared);
+        # only the expired ones at the front are visited
+        cutoff = time.monotonic() - self.ttl
+        while self._events:
+            rid, ev = next(iter(self._events.items()))
+            if ev.started >= cutoff:
+                break
+            self.clear(rid)
+
+
+def build_cancel_backend():
+    """The backend selected by CANCEL_BACKEND, or None for in-process only."""
+    if CANCEL_BACKEND == "unix":
+        from app.utils.cancel_broker import UnixCancelBackend
+
+        return UnixCancelBackend(CANCEL_SOCKET_PATH, CANCEL_TTL_SECONDS)
+    return None
 
 
 cancel_registry = CancelRegistry()
+
+_totals = {"cancelled": 0, "tokens_saved": 0, "seconds_saved": 0.0}
+register_stats(
+    "cancellation",
+    lambda: {**_totals, "seconds_saved": round(_totals["seconds_saved"], 3)},
+)
+metrics.CallbackGauge(
+    "cancel_requests_registered",
+    "Requests that can currently be cancelled in this process",
+    lambda: len(cancel_registry._events),
+)
+metrics.CallbackGauge(
+    "cancellations_total",
+    "Requests cancelled through the cancel endpoints",
+    lambda: _totals["cancelled"],
+    kind="counter",
+)
+metrics.CallbackGauge(
+    "cancel_tokens_saved_total",
+    "Estimated output tokens avoided by cancels and disconnects",
+    lambda: _totals["tokens_saved"],
+    kind="counter",
+)
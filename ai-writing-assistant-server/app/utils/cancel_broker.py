@@ -0,0 +1,233 @@
+import asyncio
+import fcntl
+import itertools
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from app.utils.logging import logger
+
+# Newline-delimited JSON over a Unix socket. Workers send
+#   {"op": "register" | "unregister", "id": ...}
+#   {"op": "cancel", "id": ..., "seq": n}   -> {"op": "result", "seq": n, "ok": bool}
+# and the broker pushes {"op": "cancel", "id": ...} to the worker that
+# registered the id, so nobody polls.
+
+
+def _encode(msg: dict) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode() + b"\n"
+
+
+class CancelBroker:
+    """Routes cancel requests to whichever connection registered the id."""
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._owners: Dict[str, Tuple[asyncio.StreamWriter, float]] = {}
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket of a dead broker (we hold the lock)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._server is not None:
+            self._server.close()
+            # drop every connection so the other workers notice and take over
+            for writer in list(self._clients):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            self._owners.clear()
+            await self._server.wait_closed()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _sweep(self) -> None:
+        # TTL cleanup of ids whose worker never cleared them
+        while True:
+            await asyncio.sleep(min(60.0, max(self.ttl / 4, 0.01)))
+            now = time.monotonic()
+            for rid, (_, expires) in list(self._owners.items()):
+                if expires <= now:
+                    del self._owners[rid]
+
+    def _lookup(self, rid: str) -> Optional[asyncio.StreamWriter]:
+        entry = self._owners.get(rid)
+        if entry is None:
+            return None
+        writer, expires = entry
+        if expires <= time.monotonic() or writer.is_closing():
+            del self._owners[rid]
+            return None
+        return writer
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                op, rid = msg.get("op"), msg.get("id")
+                if op == "register":
+                    self._owners[rid] = (writer, time.monotonic() + self.ttl)
+                elif op == "unregister":
+                    if self._owners.get(rid, (None,))[0] is writer:
+                        del self._owners[rid]
+                elif op == "cancel":
+                    owner = self._lookup(rid)
+                    if owner is not None:
+                        owner.write(_encode({"op": "cancel", "id": rid}))
+                    writer.write(
+                        _encode(
+                            {
+                                "op": "result",
+                                "seq": msg.get("seq"),
+                                "ok": owner is not None,
+                            }
+                        )
+                    )
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            for rid, (owner, _) in list(self._owners.items()):
+                if owner is writer:
+                    del self._owners[rid]
+            writer.close()
+
+
+class UnixCancelBackend:
+    """Connects a worker's registry to the host-wide cancel broker.
+
+    The first worker to take the lock file next to the socket runs the broker
+    in its own event loop; every worker (that one included) talks to it as a
+    client. If the broker's worker exits, the others reconnect, one of them
+    takes over, and each re-registers its live ids.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._on_cancel: Callable[[str], None] = lambda rid: None
+        self._live: Callable[[], Iterable[str]] = lambda: ()
+        self._broker: Optional[CancelBroker] = None
+        self._lock_fd: Optional[int] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_broker(self) -> bool:
+        return self._broker is not None
+
+    async def start(
+        self, on_cancel: Callable[[str], None], live: Callable[[], Iterable[str]]
+    ) -> None:
+        self._on_cancel = on_cancel
+        self._live = live
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), 5)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "cancel broker at %s unreachable; cancels stay local", self.path
+            )
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self._release_broker()
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _release_broker(self) -> None:
+        if self._broker is not None:
+            await self._broker.close()
+            self._broker = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the flock
+            self._lock_fd = None
+
+    async def _run(self) -> None:
+        while True:
+            if self._broker is None and self._try_lock():
+                self._broker = CancelBroker(self.path, self.ttl)
+                await self._broker.start()
+                logger.info("cancel broker listening on %s", self.path)
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionError):
+                # the lock holder is still starting up, or just died
+                await asyncio.sleep(0.05)
+                continue
+            for rid in self._live():
+                self._send({"op": "register", "id": rid})
+            self._connected.set()
+            try:
+                while line := await reader.readline():
+                    msg = json.loads(line)
+                    if msg.get("op") == "cancel":
+                        self._on_cancel(msg["id"])
+                    elif msg.get("op") == "result":
+                        fut = self._pending.pop(msg.get("seq"), None)
+                        if fut is not None and not fut.done():
+                            fut.set_result(bool(msg.get("ok")))
+            except (ConnectionError, ValueError):
+                pass
+            finally:
+                self._connected.clear()
+                self._writer.close()
+                self._writer = None
+                for fut in self._pending.values():
+                    if not fut.done():
+                        fut.set_result(False)
+                self._pending.clear()
+            logger.warning("lost connection to cancel broker; reconnecting")
+            await asyncio.sleep(0.05)
+
+    def _send(self, msg: dict) -> bool:
+        if self._writer is None or self._writer.is_closing():
+            return False
+        self._writer.write(_encode(msg))
+        return True
+
+    def register(self, rid: str) -> None:
+        self._send({"op": "register", "id": rid})
+
+    def unregister(self, rid: str) -> None:
+        self._send({"op": "unregister", "id": rid})
+
+    async def cancel(self, rid: str, timeout: float = 2.0) -> bool:
+        """Ask the broker to cancel `rid` wherever it runs."""
+        seq = next(self._seq)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[seq] = fut
+        if not self._send({"op": "cancel", "id": rid, "seq": seq}):
+            self._pending.pop(seq, None)
+            return False
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(seq, None)
+            return False
@@ -0,0 +1,117 @@
+import json
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Hot-path encoding for upstream chat completions: orjson when installed,
+# else the stdlib (same values either way).
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+DONE = b"[DONE]"
+
+
+if orjson is not None:
+    loads: Callable[[Any], Any] = orjson.loads
+    dumps: Callable[[Any], bytes] = orjson.dumps
+else:
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class SSEParser:
+    """Incremental server-sent events parser working on bytes.
+
+    `feed(chunk)` returns the `data` payloads of every event completed by the
+    chunk; lines and events may be split anywhere across chunks. Multi-line
+    data fields are joined with newlines, other fields and comments ignored.
+    """
+
+    def __init__(self):
+        self._buf = b""
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        buf = self._buf + chunk
+        if b"\r" in buf:
+            buf = buf.replace(b"\r\n", b"\n")
+        blocks = buf.split(b"\n\n")
+        self._buf = blocks.pop()  # incomplete last event, kept for next feed
+        events: List[bytes] = []
+        for block in blocks:
+            if block.startswith(b"data: ") and b"\n" not in block:
+                # the usual single-line event, no per-line work needed
+                events.append(block[6:])
+            else:
+                data = _event_data(block)
+                if data is not None:
+                    events.append(data)
+        return events
+
+    def flush(self) -> List[bytes]:
+        # an event not terminated by a blank line when the stream closed
+        block, self._buf = self._buf, b""
+        data = _event_data(block)
+        return [] if data is None else [data]
+
+
+def _event_data(block: bytes) -> Optional[bytes]:
+    fields = [
+        line[6:] if line.startswith(b"data: ") else line[5:]
+        for line in block.split(b"\n")
+        if line.startswith(b"data:")
+    ]
+    return b"\n".join(fields) if fields else None
+
+
+def chat_delta(data: bytes) -> Optional[str]:
+    """Content delta of one chat.completion.chunk payload (None if absent)."""
+    try:
+        return loads(data)["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+@lru_cache(maxsize=64)
+def _chat_prefix(model: str, system: str, temperature: float, stream: bool):
+    # everything but the user text, which goes between the two halves
+    head = b'{"model":%s,"messages":[{"role":"system","content":%s},' % (
+        dumps(model),
+        dumps(system),
+    )
+    tail = b'}],"temperature":%s,"stream":%s}' % (
+        dumps(temperature),
+        b"true" if stream else b"false",
+    )
+    return head + b'{"role":"user","content":', tail
+
+
+def chat_body(
+    model: str, messages: List[dict], temperature: float, stream: bool, **extra
+) -> bytes:
+    """Encoded chat completion request, equal to dumping the payload dict.
+
+    The common system + user shape is assembled from a cached prefix so only
+    the user text is serialised per call.
+    """
+    if (
+        not extra
+        and len(messages) == 2
+        and messages[0]["role"] == "system"
+        and messages[1]["role"] == "user"
+    ):
+        head, tail = _chat_prefix(model, messages[0]["content"], temperature, stream)
+        return head + dumps(messages[1]["content"]) + tail
+    return dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream,
+            **extra,
+        }
+    )
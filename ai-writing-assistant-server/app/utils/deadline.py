@@ -0,0 +1,141 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import (AsyncGenerator, AsyncIterator, Awaitable, Dict, Optional,
+                    TypeVar)
+
+import httpx
+from app.config import (REQUEST_TIMEOUT_MAX, REQUEST_TIMEOUT_SECONDS,
+                        STREAM_FIRST_TOKEN_TIMEOUT, STREAM_IDLE_TIMEOUT,
+                        STREAM_TIMEOUT_SECONDS)
+from app.utils.stats import register_stats
+
+T = TypeVar("T")
+
+# Stages a request can run out of time in, counted by GET /stats
+STAGES = ("queue", "connect", "upstream", "ttft", "inter_token")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+_hits: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's time budget ran out; `stage` says where."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded ({stage})")
+        self.stage = stage
+
+
+def set_deadline(seconds: Optional[float]) -> None:
+    """Start the current request's budget: `seconds` from now, None for none."""
+    _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def start_deadline(requested: Optional[float] = None, stream: bool = False) -> None:
+    """Start the request's budget: `requested` (X-Request-Timeout) clamped to
+    the max, else the default. Streams default to STREAM_TIMEOUT_SECONDS,
+    since the first-token and idle caps in guard_stream are their real limits.
+    """
+    default, most = REQUEST_TIMEOUT_SECONDS, REQUEST_TIMEOUT_MAX
+    if stream:
+        default, most = STREAM_TIMEOUT_SECONDS, max(most, STREAM_TIMEOUT_SECONDS)
+        if requested is None and not default:
+            set_deadline(None)
+            return
+    seconds = default if requested is None else requested
+    set_deadline(max(0.0, min(seconds, most)))
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None if unbounded."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def exceeded(stage: str) -> DeadlineExceeded:
+    _hits[stage] = _hits.get(stage, 0) + 1
+    return DeadlineExceeded(stage)
+
+
+def _budget(cap: Optional[float] = None) -> Optional[float]:
+    left = remaining()
+    if left is None:
+        return cap
+    return left if cap is None else min(left, cap)
+
+
+async def within(aw: Awaitable[T], stage: str, cap: Optional[float] = None) -> T:
+    """Await `aw` within the remaining budget (and `cap`, if given)."""
+    budget = _budget(cap)
+    if budget is None:
+        return await aw
+    if budget <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise exceeded(stage)
+    # asyncio.timeout runs `aw` in the current task, so nothing is spawned
+    # per token when this guards a stream
+    timeout = asyncio.timeout(budget)
+    try:
+        async with timeout:
+            return await aw
+    except DeadlineExceeded:
+        raise
+    except TimeoutError:
+        if not timeout.expired():
+            raise
+        raise exceeded(stage) from None
+
+
+def http_timeout(base: httpx.Timeout) -> httpx.Timeout:
+    """`base` with every phase capped at the remaining budget."""
+    left = remaining()
+    if left is None:
+        return base
+    left = max(left, 0.001)
+
+    def cap(value: Optional[float]) -> float:
+        return left if value is None else min(value, left)
+
+    return httpx.Timeout(
+        cap(base.read),
+        connect=cap(base.connect),
+        write=cap(base.write),
+        pool=cap(base.pool),
+    )
+
+
+def classify_timeout(exc: Exception) -> Optional[DeadlineExceeded]:
+    """Map an httpx timeout that happened because the budget ran out to a
+    DeadlineExceeded; other errors (and timeouts with budget left) map to None.
+    """
+    left = remaining()
+    if not isinstance(exc, httpx.TimeoutException) or left is None or left > 0.01:
+        return None
+    if isinstance(exc, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return exceeded("connect")
+    return exceeded("upstream")
+
+
+async def guard_stream(
+    source: AsyncIterator[T],
+    first: Optional[float] = STREAM_FIRST_TOKEN_TIMEOUT,
+    idle: Optional[float] = STREAM_IDLE_TIMEOUT,
+) -> AsyncGenerator[T, None]:
+    """Re-yield `source`, giving up when the first item takes longer than
+    `first`, a later one longer than `idle`, or the budget runs out.
+    The timed-out `source` is cancelled, which closes its upstream.
+    """
+    started = False
+    while True:
+        stage = "inter_token" if started else "ttft"
+        try:
+            item = await within(source.__anext__(), stage, idle if started else first)
+        except StopAsyncIteration:
+            return
+        started = True
+        yield item
+
+
+register_stats("deadlines", lambda: dict(_hits))
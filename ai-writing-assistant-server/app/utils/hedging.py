@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from app.config import HEDGE_DELAY_MS, HEDGE_ENABLED, HEDGE_MAX_RATIO, HEDGE_PERCENTILE
+from app.utils.stats import register_stats
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies (seconds)."""
+
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class HedgeBudget:
+    """Allows a hedge only while hedges stay under `max_ratio` of recent calls."""
+
+    def __init__(self, max_ratio: float, window: int = 1000):
+        self.max_ratio = max_ratio
+        self._events: Deque[bool] = deque(maxlen=window)  # True = hedge
+        self._calls = 0
+        self._hedges = 0
+
+    def _push(self, hedge: bool) -> None:
+        if len(self._events) == self._events.maxlen:
+            if self._events[0]:
+                self._hedges -= 1
+            else:
+                self._calls -= 1
+        self._events.append(hedge)
+        if hedge:
+            self._hedges += 1
+        else:
+            self._calls += 1
+
+    def record_call(self) -> None:
+        self._push(False)
+
+    def try_spend(self) -> bool:
+        if self._hedges + 1 > self.max_ratio * self._calls:
+            return False
+        self._push(True)
+        return True
+
+
+class Hedger:
+    """Runs a call, and a duplicate if the first is slow; first success wins.
+
+    The hedge delay is fixed when `delay` is set, otherwise the tracked
+    `percentile` latency (or `fallback_delay` until `min_samples` calls were
+    seen). The loser is cancelled, and the budget caps extra calls to
+    `max_ratio` of recent calls so hedging cannot multiply spend under load.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        max_ratio: float = 0.1,
+        min_samples: int = 20,
+        fallback_delay: float = 2.0,
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.fallback_delay = fallback_delay
+        self.latency = LatencyTracker()
+        self.budget = HedgeBudget(max_ratio)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def hedge_delay(self) -> float:
+        if self.delay:
+            return self.delay
+        if len(self.latency) < self.min_samples:
+            return self.fallback_delay
+        return self.latency.percentile(self.percentile)
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.monotonic()
+        result = await fn()
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        self.budget.record_call()
+        primary_at = time.monotonic()
+        primary = asyncio.create_task(self._timed(fn))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done:
+                return primary.result()
+            if not self.budget.try_spend():
+                self.budget_denied += 1
+                return await primary
+            self.hedged += 1
+            hedged_at = time.monotonic()
+            hedge = asyncio.create_task(self._timed(fn))
+            tasks.add(hedge)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for t in done:
+                    if t.exception() is None:
+                        if t is hedge:
+                            self.hedge_wins += 1
+                        # the loser is cancelled below and never completes;
+                        # its time so far is a lower bound on its latency,
+                        # without which the window only keeps fast samples
+                        now = time.monotonic()
+                        for loser in pending:
+                            started = hedged_at if loser is hedge else primary_at
+                            self.latency.record(now - started)
+                        return t.result()
+                    error = error or t.exception()
+            raise error
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "win_rate": round(self.hedge_wins / self.hedged, 3) if self.hedged else 0.0,
+            "budget_denied": self.budget_denied,
+            "delay_seconds": round(self.hedge_delay(), 3),
+        }
+
+
+# Process-wide hedger for the upstream provider, or None when disabled
+hedger: Optional[Hedger] = None
+if HEDGE_ENABLED:
+    hedger = Hedger(
+        delay=HEDGE_DELAY_MS / 1000 or None,
+        percentile=HEDGE_PERCENTILE,
+        max_ratio=HEDGE_MAX_RATIO,
+    )
+    register_stats("hedging", hedger.stats)
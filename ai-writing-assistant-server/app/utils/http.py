@@ -0,0 +1,68 @@
+from typing import Optional
+
+import httpx
+from app.config import (HTTP2_ENABLED, HTTP_CONNECT_TIMEOUT,
+                        HTTP_KEEPALIVE_EXPIRY, HTTP_MAX_CONNECTIONS,
+                        HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_POOL_TIMEOUT,
+                        HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT)
+from app.utils.logging import logger
+
+# Timeouts for non-streaming completions and for streams. Streams keep the
+# read timeout open because a long completion can legitimately idle between
+# tokens; connect/pool limits still apply.
+FULL_TIMEOUT = httpx.Timeout(
+    HTTP_READ_TIMEOUT,
+    connect=HTTP_CONNECT_TIMEOUT,
+    write=HTTP_WRITE_TIMEOUT,
+    pool=HTTP_POOL_TIMEOUT,
+)
+STREAM_TIMEOUT = httpx.Timeout(
+    None,
+    connect=HTTP_CONNECT_TIMEOUT,
+    write=HTTP_WRITE_TIMEOUT,
+    pool=HTTP_POOL_TIMEOUT,
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_http_client(**kwargs) -> httpx.AsyncClient:
+    """Build a pooled AsyncClient using the limits and timeouts from config."""
+    http2 = HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED is set but 'h2' is not installed; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    kwargs.setdefault("timeout", FULL_TIMEOUT)
+    return httpx.AsyncClient(limits=limits, http2=http2, **kwargs)
+
+
+def get_http_client() -> Optional[httpx.AsyncClient]:
+    """Return the process-wide client, or None if it has not been started."""
+    return _client
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
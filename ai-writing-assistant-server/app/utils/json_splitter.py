@@ -0,0 +1,116 @@
+from typing import List, Optional, Tuple
+
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+# parser states
+_BEFORE_OBJECT = 0
+_BEFORE_KEY = 1
+_IN_KEY = 2
+_BEFORE_COLON = 3
+_BEFORE_VALUE = 4
+_IN_VALUE = 5
+_AFTER_VALUE = 6
+_DONE = 7
+
+
+class JsonObjectSplitter:
+    """Incremental parser for a flat JSON object of string values.
+
+    Feed it the model output as it streams in; each call returns the decoded
+    `(key, fragment)` pieces of string values completed so far, so a stream
+    like `{"casual": "Hey th` + `ere"}` yields `("casual", "Hey th")` and then
+    `("casual", "ere")`. Escapes (including `\\uXXXX` and surrogate pairs) may
+    be split across chunks. Anything that is not a flat string-valued object
+    raises ValueError.
+    """
+
+    def __init__(self):
+        self._state = _BEFORE_OBJECT
+        self._key: List[str] = []
+        self._current: Optional[str] = None
+        self._escape: Optional[str] = None  # pending escape sequence after '\'
+        self._high_surrogate: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        out: List[Tuple[str, str]] = []
+        buf: List[str] = []
+
+        def flush():
+            if buf and self._state == _IN_VALUE:
+                out.append((self._current, "".join(buf)))
+            buf.clear()
+
+        for ch in chunk:
+            state = self._state
+            if state in (_IN_KEY, _IN_VALUE):
+                target = self._key if state == _IN_KEY else buf
+                if self._escape is not None:
+                    decoded = self._read_escape(ch)
+                    if decoded:
+                        target.append(decoded)
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    if state == _IN_KEY:
+                        self._current = "".join(self._key)
+                        self._key = []
+                        self._state = _BEFORE_COLON
+                    else:
+                        flush()
+                        self._state = _AFTER_VALUE
+                else:
+                    target.append(ch)
+                continue
+            if ch.isspace():
+                continue
+            if state == _BEFORE_OBJECT and ch == "{":
+                self._state = _BEFORE_KEY
+            elif state == _BEFORE_KEY and ch == '"':
+                self._state = _IN_KEY
+            elif state == _BEFORE_KEY and ch == "}":
+                self._state = _DONE
+            elif state == _BEFORE_COLON and ch == ":":
+                self._state = _BEFORE_VALUE
+            elif state == _BEFORE_VALUE and ch == '"':
+                self._state = _IN_VALUE
+            elif state == _AFTER_VALUE and ch == ",":
+                self._state = _BEFORE_KEY
+            elif state == _AFTER_VALUE and ch == "}":
+                self._state = _DONE
+            else:
+                raise ValueError(f"unexpected {ch!r} in combined JSON output")
+        flush()
+        return out
+
+    def _read_escape(self, ch: str) -> str:
+        esc = self._escape + ch
+        if esc[0] != "u":
+            self._escape = None
+            if esc not in _ESCAPES:
+                raise ValueError(f"invalid escape \\{esc}")
+            return _ESCAPES[esc]
+        if len(esc) < 5:
+            self._escape = esc
+            return ""
+        self._escape = None
+        code = int(esc[1:], 16)
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return chr(code)
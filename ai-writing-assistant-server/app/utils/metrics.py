@@ -0,0 +1,251 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Prometheus text-format metrics served by GET /metrics. Kept dependency-free
+# and cheap: callers resolve a labelled child once (`hist.labels(...)`) and
+# the per-event work is a bisect and a few additions, fine for every delta.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+GAP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+_registry: List["_Metric"] = []
+
+# route template of the current request (see MetricsMiddleware)
+_scope: ContextVar[Optional[dict]] = ContextVar("metrics_scope", default=None)
+
+
+def current_route() -> str:
+    scope = _scope.get()
+    return "other" if scope is None else route_of(scope)
+
+
+def route_of(scope: dict) -> str:
+    # FastAPI puts the matched route in the scope once routing happened
+    return getattr(scope.get("route"), "path", "other")
+
+
+class BoundedLabel:
+    """Maps label values onto `known` plus the first `limit` other values
+    seen; the rest become "other". For values from requests or config, where
+    each distinct value would otherwise add a child that is kept forever.
+    """
+
+    def __init__(self, known: Sequence[str] = (), limit: int = 0):
+        self.values = set(known)
+        self.room = limit
+
+    def __call__(self, value: str) -> str:
+        if value in self.values:
+            return value
+        if self.room > 0:
+            self.room -= 1
+            self.values.add(value)
+            return value
+        return "other"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._child()
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_num(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _child = _Value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _child = _Value
+
+
+class CallbackGauge(_Metric):
+    """Unlabelled value read from `fn` at scrape time (e.g. a queue size)."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], kind="gauge"):
+        super().__init__(name, help)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_num(self.fn())}",
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else _num(bound)
+            labels = _labels(self.labelnames, values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {total}")
+        labels = _labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_num(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request until its response body is complete (for SSE
+    and NDJSON that is the end of the stream) and exposes the request's route
+    to `current_route()` for metrics recorded deeper in the pipeline.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        scope["received_at"] = started  # start of the request's timing trace
+        status = 500
+        token = _scope.set(scope)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _scope.reset(token)
+            REQUEST_LATENCY.labels(
+                route_of(scope), scope["method"], str(status)
+            ).observe(time.perf_counter() - started)
+
+
+# -- pipeline metrics --------------------------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response (or stream) completed",
+    ("route", "method", "status"),
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_latency_seconds",
+    "Upstream completion latency per attempt (streams: until response headers)",
+    ("route", "style", "model"),
+)
+TTFT = Histogram(
+    "stream_ttft_seconds",
+    "Time from starting an upstream stream (queueing included) to its first delta",
+    ("route", "style", "model"),
+)
+INTER_TOKEN = Histogram(
+    "stream_inter_token_seconds",
+    "Gap between consecutive upstream stream deltas",
+    ("route", "style", "model"),
+    buckets=GAP_BUCKETS,
+)
+DELTAS = Counter(
+    "stream_deltas_total",
+    "Upstream stream deltas received (rate() gives tokens per second)",
+    ("route", "style", "model"),
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed upstream attempts by HTTP status (or timeout / transport)",
+    ("status", "model"),
+)
+STREAMS_IN_FLIGHT = Gauge("streams_in_flight", "SSE streams currently open", ("route",))
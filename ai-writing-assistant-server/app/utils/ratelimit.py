@@ -0,0 +1,164 @@
+import asyncio
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from app.config import (OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE,
+                        RATE_LIMIT_ENABLED, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+from app.utils.stats import register_stats
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse OpenAI reset durations such as "20ms", "1s" or "6m0s" into seconds."""
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from `retry-after-ms` / `Retry-After` (seconds or HTTP date)."""
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    # "full jitter": uniform in [0, base * 2^attempt], capped
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+class _Bucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """Async token bucket over requests/min and tokens/min.
+
+    `acquire` never blocks the event loop; waiters are served in FIFO order.
+    Upstream `x-ratelimit-*` headers and 429 `Retry-After` values adjust the
+    buckets at runtime so several processes sharing a key converge on the
+    real limit.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    async def acquire(self, tokens: int = 1) -> float:
+        """Wait for capacity for one request of ~`tokens` tokens; returns seconds waited."""
+        start = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    delay = max(
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(tokens),
+                        self.blocked_until - now,
+                    )
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.requests.level -= 1
+                self.tokens.level -= min(tokens, self.tokens.capacity)
+        finally:
+            self.queue_depth -= 1
+        waited = time.monotonic() - start
+        self.acquired += 1
+        if waited > 0.001:
+            self.waited += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if limit:
+                    bucket.refill(now)
+                    bucket.capacity = float(limit)
+                if remaining is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining))
+                    if float(remaining) <= 0:
+                        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            self.blocked_until = max(self.blocked_until, now + reset)
+            except ValueError:
+                continue
+
+    def penalize(self, seconds: float) -> None:
+        """Hold every caller back for `seconds` (after a 429)."""
+        self.throttled += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "total_wait_seconds": round(self.total_wait, 3),
+            "max_wait_seconds": round(self.max_wait, 3),
+            "throttled": self.throttled,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level, 1),
+        }
+
+
+# Process-wide limiter for the OpenAI key, or None when disabled
+openai_limiter: Optional[RateLimiter] = None
+if RATE_LIMIT_ENABLED:
+    openai_limiter = RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
+    register_stats("ratelimit", openai_limiter.stats)
@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+from contextlib import aclosing
+from typing import (Any, AsyncGenerator, AsyncIterator, Awaitable, Callable,
+                    Dict, List, Optional)
+
+from app.utils import deadline
+from app.utils.stats import register_stats
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Flight:
+    """One upstream stream plus everything it produced so far."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls so each key has one upstream call.
+
+    Later callers join the pending call; stream subscribers first get a replay
+    of what was already produced, then the live items. The upstream call is
+    only cancelled once its last caller/subscriber has gone away.
+
+    The shared call runs in an empty context, so it inherits no request's
+    deadline, trace or metrics scope; each caller waits within its own
+    deadline instead.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn(), context=contextvars.Context()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t: self._forget(self._calls, key, call))
+            self.leaders += 1
+        else:
+            self.joined += 1
+        call.waiters += 1
+        try:
+            # shield: a caller being cancelled must not cancel the shared call
+            return await deadline.within(asyncio.shield(call.task), "upstream")
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(self._calls, key, call)
+
+    async def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncGenerator[Any, None]:
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._streams[key] = flight
+            flight.task = asyncio.create_task(
+                self._produce(key, flight, factory), context=contextvars.Context()
+            )
+            self.leaders += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        i = 0
+        try:
+            while True:
+                if i < len(flight.items):
+                    i += 1
+                    yield flight.items[i - 1]
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    stage = "inter_token" if i else "ttft"
+                    await deadline.within(flight.changed.wait(), stage)
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                self._forget(self._streams, key, flight)
+
+    async def _produce(self, key: str, flight: _Flight, factory) -> None:
+        try:
+            async with aclosing(factory()) as source:
+                async for item in source:
+                    flight.items.append(item)
+                    flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            self._forget(self._streams, key, flight)
+
+    @staticmethod
+    def _forget(table: Dict[str, Any], key: str, entry: Any) -> None:
+        if table.get(key) is entry:
+            del table[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "joined": self.joined,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+        }
+
+
+# Process-wide group shared by every provider instance
+flights = SingleFlight()
+register_stats("singleflight", flights.stats)
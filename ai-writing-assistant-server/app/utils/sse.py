@@ -0,0 +1,229 @@
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from typing import (AsyncGenerator, AsyncIterator, Dict, List, Optional, Set,
+                    Union)
+
+from app.config import (SSE_FLUSH_BYTES, SSE_FLUSH_MS, SSE_MAX_BUFFER_BYTES,
+                        SSE_MAX_BUFFER_EVENTS)
+from app.utils.stats import register_stats
+
+
+def delta(style: str, text: str) -> dict:
+    """An appendable delta for `coalesce`; encoded to a regular "delta" event."""
+    return {"event": "delta", "style": style, "delta": text}
+
+
+def snapshot(style: str, text: str) -> dict:
+    """Like `delta`, but `text` replaces the style's pending text instead of
+    extending it (for cumulative "text so far" deltas).
+    """
+    return {"event": "delta", "style": style, "delta": text, "replace": True}
+
+
+def _encode(style: str, parts: List[str]) -> dict:
+    text = parts[0] if len(parts) == 1 else "".join(parts)
+    return {"event": "delta", "data": json.dumps({"style": style, "delta": text})}
+
+
+class _Slot:
+    # pending text of one style, merged until it is flushed
+    __slots__ = ("style", "parts", "size", "created", "replace", "first")
+
+    def __init__(self, style: str, replace: bool = False, first: bool = False):
+        self.style = style
+        self.replace = replace
+        self.first = first  # the style's first text: sent without waiting
+        self.parts: List[str] = []
+        self.size = 0
+        self.created = time.monotonic()
+
+
+class _Totals:
+    def __init__(self):
+        self.streams = 0
+        self.deltas_in = 0
+        self.events_out = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.high_water_bytes = 0
+        self.high_water_events = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "streams": self.streams,
+            "deltas_in": self.deltas_in,
+            "events_out": self.events_out,
+            "events_per_second": (
+                round(self.events_out / self.seconds, 1) if self.seconds else 0.0
+            ),
+            "bytes_per_event": (
+                round(self.bytes_out / self.events_out, 1) if self.events_out else 0.0
+            ),
+            "buffer_high_water_bytes": self.high_water_bytes,
+            "buffer_high_water_events": self.high_water_events,
+        }
+
+
+totals = _Totals()
+register_stats("sse", totals.snapshot)
+
+
+class _Buffer:
+    """Bounded outgoing queue that merges deltas of the same style.
+
+    Deltas join the open slot of their style until a non-delta event is
+    queued behind them, so per-style order and event boundaries are kept.
+    A style's first slot is flushed at once, so coalescing never delays the
+    first token.
+    The producer waits once `max_bytes` of text or `max_events` entries are
+    pending, which pushes back on the upstream read.
+    """
+
+    def __init__(self, max_bytes: int, max_events: int):
+        self.max_bytes = max_bytes
+        self.max_events = max_events
+        self.items: List[Union[dict, _Slot]] = []
+        self.open: Dict[str, _Slot] = {}
+        self.bytes = 0
+        self.controls = 0  # queued non-delta events
+        self.firsts = 0  # queued first slots of a style
+        self.started: Set[str] = set()
+        self.closed = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+    def _full(self) -> bool:
+        return self.bytes >= self.max_bytes or len(self.items) >= self.max_events
+
+    def _accepts(self, event: dict) -> bool:
+        if self.bytes >= self.max_bytes:
+            return False
+        # merging into an open slot does not add an entry
+        if "data" not in event and event["style"] in self.open:
+            return True
+        return len(self.items) < self.max_events
+
+    async def put(self, event: dict) -> None:
+        async with self.changed:
+            await self.changed.wait_for(lambda: self._accepts(event))
+            if "data" in event:
+                self.items.append(event)
+                self.controls += 1
+                self.open.clear()
+            else:
+                slot = self.open.get(event["style"])
+                if slot is None:
+                    first = event["style"] not in self.started
+                    if first:
+                        self.started.add(event["style"])
+                        self.firsts += 1
+                    slot = _Slot(event["style"], bool(event.get("replace")), first)
+                    self.open[event["style"]] = slot
+                    self.items.append(slot)
+                if slot.replace:
+                    self.bytes -= slot.size
+                    slot.parts.clear()
+                    slot.size = 0
+                slot.parts.append(event["delta"])
+                slot.size += len(event["delta"])
+                self.bytes += len(event["delta"])
+                totals.deltas_in += 1
+            totals.high_water_bytes = max(totals.high_water_bytes, self.bytes)
+            totals.high_water_events = max(totals.high_water_events, len(self.items))
+            self.changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        async with self.changed:
+            self.closed = True
+            self.error = error
+            self.changed.notify_all()
+
+    def _ready(self, flush_bytes: int, window: float) -> float:
+        # 0 if the head can go out now, else seconds until its window ends
+        head = self.items[0]
+        if (
+            isinstance(head, dict)
+            or self.closed
+            or self.controls
+            or self.firsts
+            or (head.size >= flush_bytes and not head.replace)
+            or self._full()
+        ):
+            return 0.0
+        return max(0.0, head.created + window - time.monotonic())
+
+    async def get(self, flush_bytes: int, window: float) -> Optional[dict]:
+        """Next event to send, or None once the producer finished."""
+        async with self.changed:
+            while True:
+                if not self.items:
+                    if self.closed:
+                        if self.error is not None:
+                            raise self.error
+                        return None
+                    await self.changed.wait()
+                    continue
+                wait = self._ready(flush_bytes, window)
+                if wait <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self.changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            head = self.items.pop(0)
+            if isinstance(head, _Slot):
+                if self.open.get(head.style) is head:
+                    del self.open[head.style]
+                self.bytes -= head.size
+                self.firsts -= head.first
+                event = _encode(head.style, head.parts)
+            else:
+                self.controls -= 1
+                event = head
+            self.changed.notify_all()
+            return event
+
+
+async def coalesce(
+    events: AsyncIterator[dict],
+    flush_ms: float = SSE_FLUSH_MS,
+    flush_bytes: int = SSE_FLUSH_BYTES,
+    max_bytes: int = SSE_MAX_BUFFER_BYTES,
+    max_events: int = SSE_MAX_BUFFER_EVENTS,
+) -> AsyncGenerator[dict, None]:
+    """Re-yield SSE `events` with `delta(...)` entries merged per style
+    (and `snapshot(...)` entries collapsed to the latest one).
+
+    A style's first delta goes out straight away; later pending text goes
+    out once it reaches `flush_bytes`, after `flush_ms`, or as soon as
+    another event is queued behind it. While the client reads slowly,
+    deltas keep merging in a bounded buffer instead of piling up as separate
+    events. Other events pass through unchanged.
+    """
+    buffer = _Buffer(max_bytes, max_events)
+    window = flush_ms / 1000
+
+    async def produce():
+        try:
+            async with aclosing(events) as source:
+                async for event in source:
+                    await buffer.put(event)
+        except Exception as e:
+            await buffer.finish(e)
+        else:
+            await buffer.finish()
+
+    totals.streams += 1
+    started = time.monotonic()
+    producer = asyncio.create_task(produce())
+    try:
+        while (event := await buffer.get(flush_bytes, window)) is not None:
+            totals.events_out += 1
+            totals.bytes_out += len(event.get("data", ""))
+            yield event
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        totals.seconds += time.monotonic() - started
@@ -0,0 +1,12 @@
+from typing import Callable, Dict
+
+# name -> callable returning a JSON-serialisable snapshot, served by GET /stats
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register_stats(name: str, source: Callable[[], dict]) -> None:
+    _sources[name] = source
+
+
+def collect_stats() -> Dict[str, dict]:
+    return {name: source() for name, source in _sources.items()}
@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional, Tuple
+
+# Markers yielded by merge_tagged alongside the stream key
+START = "start"
+ITEM = "item"
+END = "end"
+ERROR = "error"
+
+
+async def merge_tagged(
+    streams: Dict[str, AsyncIterator[Any]],
+    max_concurrency: Optional[int] = None,
+    max_buffer: int = 256,
+) -> AsyncGenerator[Tuple[str, str, Any], None]:
+    """Run several async iterators at once and yield their items as they arrive.
+
+    Yields `(key, kind, value)` where kind is START, ITEM, END or ERROR (value
+    is the exception). Every stream ends with exactly one END or ERROR. Closing
+    this generator cancels all pumps and closes every source iterator, which
+    in turn tears down their upstream connections.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+    sem = asyncio.Semaphore(max_concurrency or len(streams) or 1)
+
+    async def pump(key: str, source: AsyncIterator[Any]):
+        try:
+            async with sem:
+                await queue.put((key, START, None))
+                async for item in source:
+                    await queue.put((key, ITEM, item))
+            await queue.put((key, END, None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put((key, ERROR, e))
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    tasks = [asyncio.create_task(pump(k, s)) for k, s in streams.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            key, kind, value = await queue.get()
+            if kind in (END, ERROR):
+                remaining -= 1
+            yield key, kind, value
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,81 @@
+import re
+from typing import List, Tuple
+
+# A segment ends at a line break or after sentence-ending punctuation
+_SEGMENT_BREAK = re.compile(r"\s*\n\s*|(?<=[.!?])\s+")
+# Shorter pieces ("Dr.", "Hi!") are merged into the next segment so the model
+# always gets a meaningful sentence to rephrase
+MIN_SEGMENT_CHARS = 20
+
+
+def split_segments(text: str) -> List[Tuple[str, str]]:
+    """Split text into sentence/line segments.
+
+    Returns `(segment, separator)` pairs where separator is the whitespace
+    that followed the segment, so `"".join(s + sep for s, sep in pairs)`
+    gives back the original text.
+    """
+    segments: List[Tuple[str, str]] = []
+    pending = ""
+    pos = 0
+    for m in _SEGMENT_BREAK.finditer(text):
+        if m.start() == pos:
+            continue
+        piece = pending + text[pos : m.start()]
+        pos = m.end()
+        if len(piece.strip()) < MIN_SEGMENT_CHARS and "\n" not in m.group():
+            pending = piece + m.group()
+            continue
+        segments.append((piece, m.group()))
+        pending = ""
+    tail = pending + text[pos:]
+    if tail:
+        segments.append((tail, ""))
+    return segments
+
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for sizing chunks
+    return (len(text) + 3) // 4
+
+
+def chunk_paragraphs(text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """Pack paragraphs into chunks of at most ~max_tokens.
+
+    Returns `(chunk, separator)` pairs like `split_segments`. Chunks only break
+    at paragraph boundaries, except a single paragraph over the limit, which
+    is split at sentence boundaries instead.
+    """
+    paragraphs: List[Tuple[str, str]] = []
+    pos = 0
+    for m in _PARAGRAPH_BREAK.finditer(text):
+        paragraphs.append((text[pos : m.start()], m.group()))
+        pos = m.end()
+    paragraphs.append((text[pos:], ""))
+
+    pieces: List[Tuple[str, str]] = []
+    for para, sep in paragraphs:
+        if estimate_tokens(para) <= max_tokens:
+            pieces.append((para, sep))
+            continue
+        sentences = split_segments(para)
+        if sentences:
+            sentences[-1] = (sentences[-1][0], sentences[-1][1] + sep)
+        pieces.extend(sentences)
+
+    chunks: List[Tuple[str, str]] = []
+    current = ""
+    current_sep = ""
+    for piece, sep in pieces:
+        if current and estimate_tokens(current + current_sep + piece) > max_tokens:
+            chunks.append((current, current_sep))
+            current, current_sep = piece, sep
+        else:
+            current = current + current_sep + piece
+            current_sep = sep
+    if current or not chunks:
+        chunks.append((current, current_sep))
+    return chunks
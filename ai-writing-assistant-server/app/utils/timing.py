@@ -0,0 +1,163 @@
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.config import TIMING_ENABLED, TIMING_EXPORT_PATH, TIMING_SAMPLE_RATE
+from app.utils import codec
+
+# Per-request timing spans. A route starts a Trace for its request id; code
+# below it wraps phases in `with span("name"):`. With TIMING_ENABLED off no
+# trace is started and `span` costs one ContextVar lookup.
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("timing_trace", default=None)
+
+# Server-Timing metric names must be HTTP tokens; span names carry the
+# client's style names, so anything else is sent by index with a quoted desc
+_TOKEN = re.compile(r"[A-Za-z0-9._-]+")
+
+
+class Trace:
+    def __init__(self, request_id: str, route: str, started: float):
+        self.request_id = request_id
+        self.route = route
+        self.started = started
+        # (name, start, end), perf_counter seconds
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, end: float) -> None:
+        self.spans.append((name, start, end))
+
+    def totals(self) -> Dict[str, float]:
+        """Milliseconds per span name, summed over repeats, in first-seen
+        order; concurrent spans (e.g. one per style) each keep their own name.
+        """
+        out: Dict[str, float] = {}
+        for name, start, end in self.spans:
+            out[name] = out.get(name, 0.0) + (end - start) * 1000
+        out["total"] = (time.perf_counter() - self.started) * 1000
+        return {name: round(ms, 2) for name, ms in out.items()}
+
+    def server_timing(self) -> str:
+        parts = []
+        for i, (name, ms) in enumerate(self.totals().items()):
+            if _TOKEN.fullmatch(name):
+                parts.append(f"{name};dur={ms}")
+                continue
+            # escapes backslashes, control and non-ASCII characters
+            desc = name.encode("unicode_escape").decode("ascii").replace('"', '\\"')
+            parts.append(f'span{i};dur={ms};desc="{desc}"')
+        return ", ".join(parts)
+
+    def summary(self) -> dict:
+        return {"request_id": self.request_id, "spans": self.totals()}
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    """Context manager timing `name` in the current request's trace, if any."""
+    trace = _trace.get()
+    return _NO_SPAN if trace is None else _Span(trace, name)
+
+
+def current() -> Optional[Trace]:
+    return _trace.get()
+
+
+def start_trace(request_id: str, scope: Optional[dict] = None) -> Optional[Trace]:
+    """Start timing the current request (no-op unless TIMING_ENABLED).
+
+    With the ASGI `scope` the trace starts when the request arrived, and the
+    time before the handler ran (body parsing, validation, dependencies such
+    as the service) becomes the "parse" span.
+    """
+    if not TIMING_ENABLED:
+        return None
+    now = time.perf_counter()
+    received = now
+    route = "other"
+    if scope is not None:
+        received = scope.get("received_at", now)
+        route = getattr(scope.get("route"), "path", "other")
+    trace = Trace(request_id, route, received)
+    if received < now:
+        trace.add("parse", received, now)
+    _trace.set(trace)
+    return trace
+
+
+class _Exporter:
+    """Appends sampled traces to TIMING_EXPORT_PATH as JSON lines."""
+
+    def __init__(self, path: str, rate: float):
+        self.path = path
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, trace: Trace) -> None:
+        if random.random() >= self.rate:
+            return
+        line = codec.dumps(
+            {
+                "request_id": trace.request_id,
+                "route": trace.route,
+                "time": time.time(),
+                "spans": [
+                    {
+                        "name": name,
+                        "start_ms": round((start - trace.started) * 1000, 3),
+                        "dur_ms": round((end - start) * 1000, 3),
+                    }
+                    for name, start, end in trace.spans
+                ],
+                "total_ms": trace.totals()["total"],
+            }
+        )
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab", buffering=0)
+            self._file.write(line + b"\n")
+
+
+_exporter = (
+    _Exporter(TIMING_EXPORT_PATH, TIMING_SAMPLE_RATE)
+    if TIMING_EXPORT_PATH and TIMING_ENABLED
+    else None
+)
+
+
+def finish_trace(trace: Optional[Trace]) -> None:
+    """Hand a finished trace to the exporter, when one is configured."""
+    if trace is not None and _exporter is not None:
+        _exporter.export(trace)
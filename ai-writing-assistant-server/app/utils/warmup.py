@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.utils.logging import logger
+from app.utils.stats import register_stats
+
+
+class Readiness:
+    """Whether this process should receive traffic, served by GET /readyz.
+
+    Liveness (/healthz) only says the process answers; readiness stays false
+    until startup, including the optional warmup, has finished. A failed or
+    timed-out warmup step is logged and reported but does not keep the
+    instance out of rotation: it is merely cold.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.steps: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> dict:
+        return {"ready": self.ready, "warmup": dict(self.steps)}
+
+    def mark_ready(self) -> None:
+        self.ready = True
+
+    def start(
+        self, steps: Dict[str, Callable[[], Awaitable[object]]], timeout: float
+    ) -> None:
+        """Run `steps` concurrently in the background, then become ready."""
+        self.ready = False
+        self.steps = {name: {"status": "running"} for name in steps}
+        self._task = asyncio.create_task(self._run(steps, timeout))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.ready = False
+
+    async def _run(self, steps, timeout: float) -> None:
+        await asyncio.gather(
+            *(self._step(name, fn, timeout) for name, fn in steps.items())
+        )
+        self.ready = True
+
+    async def _step(self, name: str, fn, timeout: float) -> None:
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), timeout)
+        except asyncio.TimeoutError:
+            entry = {"status": "timeout"}
+            logger.warning("warmup step %s timed out after %.0fs", name, timeout)
+        except Exception as e:
+            entry = {"status": "failed", "error": str(e) or type(e).__name__}
+            logger.warning("warmup step %s failed: %r", name, e)
+        else:
+            entry = {"status": "ok"}
+            if result is not None:
+                entry["result"] = result
+        entry["seconds"] = round(time.monotonic() - started, 3)
+        self.steps[name] = entry
+
+
+readiness = Readiness()
+register_stats("readiness", readiness.snapshot)
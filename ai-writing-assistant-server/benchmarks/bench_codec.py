@@ -0,0 +1,118 @@
+"""Compare the old str/line SSE path with app.utils.codec on one core.
+
+Usage (from ai-writing-assistant-server/):
+
+    python -m benchmarks.bench_codec --tokens 200000
+
+Parsing feeds a synthetic OpenAI chat stream, cut into network-sized chunks,
+through both decoders; encoding builds request bodies for every style. No
+network is involved, so the numbers are pure CPU cost per token / request.
+"""
+
+import argparse
+import json
+import time
+
+from app.providers.openai_chat import STYLE_SYSTEM, _messages
+from app.utils import codec
+from httpx._decoders import LineDecoder, TextDecoder
+
+
+def _stream(tokens: int, chunk_size: int):
+    event = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "delta": {"content": ""}, "finish_reason": None}],
+    }
+    parts = []
+    for i in range(tokens):
+        event["choices"][0]["delta"]["content"] = f" tok{i % 97}"
+        parts.append(f"data: {json.dumps(event)}\n\n")
+    parts.append("data: [DONE]\n\n")
+    raw = "".join(parts).encode()
+    return [raw[i : i + chunk_size] for i in range(0, len(raw), chunk_size)]
+
+
+def _old_parse(chunks) -> int:
+    # what rephrase_stream did before: aiter_lines + slicing + json.loads
+    text, lines, count = TextDecoder(), LineDecoder(), 0
+    for chunk in chunks:
+        for line in lines.decode(text.decode(chunk)):
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data.strip() == "[DONE]":
+                return count
+            try:
+                obj = json.loads(data)
+                delta = obj["choices"][0]["delta"].get("content", "")
+                if delta:
+                    count += 1
+            except Exception:
+                continue
+    return count
+
+
+def _new_parse(chunks) -> int:
+    parser, count = codec.SSEParser(), 0
+    for chunk in chunks:
+        for data in parser.feed(chunk):
+            if data == codec.DONE:
+                return count
+            if codec.chat_delta(data):
+                count += 1
+    return count
+
+
+def _old_encode(requests: int) -> None:
+    styles = list(STYLE_SYSTEM)
+    for i in range(requests):
+        payload = {
+            "model": "gpt-4o-mini",
+            "messages": _messages(styles[i % 4], f"Hello team number {i}"),
+            "temperature": 0.7,
+            "stream": True,
+        }
+        json.dumps(payload).encode()
+
+
+def _new_encode(requests: int) -> None:
+    styles = list(STYLE_SYSTEM)
+    for i in range(requests):
+        messages = _messages(styles[i % 4], f"Hello team number {i}")
+        codec.chat_body("gpt-4o-mini", messages, 0.7, True)
+
+
+def _best(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn(*args)
+        best = min(best, time.process_time() - t0)
+    return best
+
+
+def main(tokens: int, chunk_size: int, requests: int):
+    chunks = _stream(tokens, chunk_size)
+    assert _old_parse(chunks) == _new_parse(chunks) == tokens
+    print(f"json backend: {codec.JSON_BACKEND}")
+    old, new = _best(_old_parse, chunks), _best(_new_parse, chunks)
+    print(
+        f"sse parse   before={tokens / old:>12,.0f} tok/s  "
+        f"after={tokens / new:>12,.0f} tok/s  speedup={old / new:.2f}x"
+    )
+    old, new = _best(_old_encode, requests), _best(_new_encode, requests)
+    print(
+        f"req encode  before={requests / old:>12,.0f} req/s  "
+        f"after={requests / new:>12,.0f} req/s  speedup={old / new:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--requests", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.tokens, args.chunk_size, args.requests)
@@ -0,0 +1,76 @@
+"""Compare per-call AsyncClient construction with the shared pooled client.
+
+Usage (from ai-writing-assistant-server/):
+
+    python -m benchmarks.bench_http_client --calls 400 --concurrency 4
+
+Both modes drive OpenAIChatProvider.rephrase_full against a local fake
+upstream, so the difference is the connection setup paid on every call.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from benchmarks.fake_upstream import create_app, free_port, serve
+
+
+async def _run(provider, calls: int, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            await provider.rephrase_full("professional", f"Hello team {i}")
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - t0, latencies
+
+
+def _report(name: str, elapsed: float, latencies, connections: int):
+    lat = sorted(latencies)
+    p95 = lat[int(len(lat) * 0.95) - 1]
+    print(
+        f"{name:<10} calls={len(lat):<5} total={elapsed:7.3f}s "
+        f"mean={statistics.mean(lat) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms "
+        f"connections={connections}"
+    )
+
+
+async def main(calls: int, concurrency: int):
+    port = free_port()
+    # Point the provider at the fake upstream before importing it
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    from app.providers.openai_chat import OpenAIChatProvider
+    from app.utils.http import close_http_client, start_http_client
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    upstream = create_app()
+    provider = OpenAIChatProvider()
+    async with serve(upstream, port):
+        await close_http_client()
+        upstream.state.connections.clear()
+        elapsed, lat = await _run(provider, calls, concurrency)
+        _report("per-call", elapsed, lat, len(upstream.state.connections))
+
+        await start_http_client()
+        upstream.state.connections.clear()
+        try:
+            elapsed, lat = await _run(provider, calls, concurrency)
+        finally:
+            await close_http_client()
+        _report("shared", elapsed, lat, len(upstream.state.connections))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.concurrency))
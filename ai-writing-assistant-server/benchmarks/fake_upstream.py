@@ -0,0 +1,165 @@
+"""Minimal OpenAI-compatible chat completions server for local benchmarks.
+
+Run it on its own, e.g. as the upstream of a manually started server:
+
+    python -m benchmarks.fake_upstream --port 9100 --ttft 0.2 --tps 50 \\
+        --jitter 0.3 --error-rate 0.01 --rate-limit-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_REPLY = "Thank you for reaching out. We will review your request shortly."
+
+
+def create_app(
+    reply: str = DEFAULT_REPLY,
+    token_delay: float = 0.0,
+    ttft: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    retry_after_ms: int = 100,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    """`ttft` is the wait before the first token and `token_delay` the wait
+    between tokens (a completion waits for all of them); `jitter` scales each
+    wait by a random factor in [1 - jitter, 1 + jitter]. A share `error_rate`
+    of calls fails with 500 and a share `rate_limit_rate` with 429 and a
+    `retry-after-ms` of `retry_after_ms`.
+    """
+    app = FastAPI()
+    # Every distinct (host, port) pair seen is one TCP connection opened by a client
+    app.state.connections: Set[Tuple[str, int]] = set()
+    app.state.requests = 0
+    rng = random.Random(seed)
+
+    def wait(seconds: float):
+        if jitter:
+            seconds *= rng.uniform(1 - jitter, 1 + jitter)
+        return asyncio.sleep(seconds)
+
+    def failure() -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status_code=429,
+                headers={"retry-after-ms": str(retry_after_ms)},
+            )
+        if roll < rate_limit_rate + error_rate:
+            return JSONResponse(
+                {"error": {"message": "The server had an error", "type": "server"}},
+                status_code=500,
+            )
+        return None
+
+    @app.middleware("http")
+    async def track_connections(request: Request, call_next):
+        if request.client:
+            app.state.connections.add((request.client.host, request.client.port))
+        app.state.requests += 1
+        return await call_next(request)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failed = failure()
+        if failed is not None:
+            return failed
+        if not body.get("stream"):
+            if ttft or token_delay:
+                await wait(ttft + token_delay * (len(reply.split()) - 1))
+            return JSONResponse(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            )
+
+        async def events():
+            for i, word in enumerate(reply.split(" ")):
+                delay = ttft if i == 0 else token_delay
+                if delay:
+                    await wait(delay)
+                delta = word if i == 0 else f" {word}"
+                chunk = {"choices": [{"index": 0, "delta": {"content": delta}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def serve(app: FastAPI, port: int) -> AsyncIterator[str]:
+    """Run `app` on 127.0.0.1:`port` in the current event loop; yields the base URL."""
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        await task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    parser.add_argument("--ttft", type=float, default=0.0, help="seconds")
+    parser.add_argument(
+        "--tps", type=float, default=0.0, help="tokens per second (0: no delay)"
+    )
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-ms", type=int, default=100)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    app = create_app(
+        args.reply,
+        token_delay=1 / args.tps if args.tps else 0.0,
+        ttft=args.ttft,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_ms=args.retry_after_ms,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,423 @@
+"""Load-test the server against a fake upstream and compare with a baseline.
+
+Usage (from ai-writing-assistant-server/):
+
+    python -m benchmarks.loadgen --concurrency 1,8,32 --duration 10 --save base.json
+    python -m benchmarks.loadgen --compare base.json          # exit 1 on regressions
+    python -m benchmarks.loadgen --compare base.json --current new.json
+
+The fake upstream (benchmarks/fake_upstream.py, see --ttft, --tps, --jitter,
+--error-rate, --rate-limit-rate) and the server run as subprocesses, or with
+--replay the server serves a recorded corpus (REPLAY_CORPUS_PATH); each
+scenario is then driven by a closed loop of N clients per concurrency level
+for --duration seconds. Every request has a unique text and cache=false, so
+neither the response cache nor single-flight hide upstream work. Streams run
+with example_format=false, so TTFT is the time to the first model delta.
+
+Reported per step: RPS, p50/p95/p99 latency, stream TTFT, error share and the
+server's CPU time per request and peak RSS (from /proc, Linux only). With
+--url an already running server is used; pass --pid for its CPU and memory.
+The load generator shares the machine with the server, so compare numbers
+taken on the same host only.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_upstream import free_port
+
+SCENARIOS = {
+    "rephrase": ("/v1/rephrase", False),
+    "stream": ("/v1/rephrase/stream", True),
+    "agent_stream": ("/v1/agent/stream", True),
+}
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms", "ttft_p95_ms")
+
+# -- server process stats ----------------------------------------------------
+
+
+def cpu_seconds(pid: Optional[int]) -> Optional[float]:
+    """User + system CPU time of `pid`, or None without /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, TypeError):
+        return None
+    # utime and stime are fields 14 and 15 of stat(5), counted after the name
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, TypeError):
+        pass
+    return None
+
+
+# -- load --------------------------------------------------------------------
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _one(client: httpx.AsyncClient, path: str, stream: bool, body: dict):
+    """(latency, ttft) in seconds for one request; raises on failure."""
+    started = time.perf_counter()
+    if not stream:
+        r = await client.post(path, params={"cache": "false"}, json=body)
+        r.raise_for_status()
+        return time.perf_counter() - started, None
+    ttft = None
+    event = None
+    params = {"cache": "false", "example_format": "false"}
+    async with client.stream("POST", path, params=params, json=body) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:].strip()
+                if event == "delta" and ttft is None:
+                    ttft = time.perf_counter() - started
+                elif event in ("error", "cancelled"):
+                    raise RuntimeError(f"stream ended with {event}")
+    if event != "done":
+        raise RuntimeError("stream ended without done")
+    return time.perf_counter() - started, ttft
+
+
+async def run_step(
+    base_url: str,
+    scenario: str,
+    concurrency: int,
+    duration: float,
+    styles: List[str],
+    pid: Optional[int] = None,
+) -> dict:
+    """Drive `scenario` with `concurrency` clients for `duration` seconds."""
+    path, stream = SCENARIOS[scenario]
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors = 0
+    counter = 0
+    peak_rss = rss_mb(pid)
+
+    async def client_loop(client: httpx.AsyncClient, stop: float):
+        nonlocal errors, counter
+        while time.perf_counter() < stop:
+            counter += 1
+            body = {
+                "input_text": f"Hi team, load test message number {counter}.",
+                "styles": styles,
+            }
+            try:
+                latency, ttft = await _one(client, path, stream, body)
+            except (httpx.HTTPError, RuntimeError):
+                errors += 1
+                continue
+            latencies.append(latency)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    async def sample_rss(stop: float):
+        nonlocal peak_rss
+        while time.perf_counter() < stop:
+            await asyncio.sleep(0.25)
+            rss = rss_mb(pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0.0, rss)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+        cpu_before = cpu_seconds(pid)
+        started = time.perf_counter()
+        stop = started + duration
+        await asyncio.gather(
+            sample_rss(stop), *(client_loop(client, stop) for _ in range(concurrency))
+        )
+        elapsed = time.perf_counter() - started
+        cpu_after = cpu_seconds(pid)
+
+    done = len(latencies)
+    out = {
+        "requests": done + errors,
+        "errors": errors,
+        "error_rate": round(errors / max(1, done + errors), 4),
+        "rps": round(done / elapsed, 2),
+    }
+    for key, values, q in (
+        ("p50_ms", latencies, 0.5),
+        ("p95_ms", latencies, 0.95),
+        ("p99_ms", latencies, 0.99),
+        ("ttft_p50_ms", ttfts, 0.5),
+        ("ttft_p95_ms", ttfts, 0.95),
+    ):
+        value = percentile(values, q)
+        out[key] = None if value is None else round(value * 1000, 2)
+    cpu = None if cpu_before is None else cpu_after - cpu_before
+    out["cpu_percent"] = None if cpu is None else round(100 * cpu / elapsed, 1)
+    out["cpu_ms_per_request"] = (
+        None if cpu is None or not done else round(1000 * cpu / done, 3)
+    )
+    out["rss_mb"] = None if peak_rss is None else round(peak_rss, 1)
+    return out
+
+
+# -- processes ---------------------------------------------------------------
+
+
+async def _wait_ready(url: str, proc: Optional[subprocess.Popen], timeout=20.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=1) as client:
+        while time.monotonic() < deadline:
+            if proc is not None and proc.poll() is not None:
+                raise RuntimeError(f"{url}: process exited with {proc.returncode}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _spawn(args: List[str], log, env: Optional[dict] = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        env={**os.environ, **(env or {})},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def _stop(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def run(args) -> dict:
+    procs: List[subprocess.Popen] = []
+    base_url, pid = args.url, args.pid
+    # the server logs every upstream call; keep that out of the report
+    log = open(args.server_log, "ab") if args.server_log else subprocess.DEVNULL
+    try:
+        if base_url is None and args.replay:
+            upstream_env = {
+                "REPLAY_CORPUS_PATH": os.path.abspath(args.replay),
+                "REPLAY_SPEED": str(args.replay_speed),
+            }
+        elif base_url is None:
+            upstream_port = free_port()
+            upstream_env = {"OPENAI_BASE_URL": f"http://127.0.0.1:{upstream_port}/v1"}
+            procs.append(
+                _spawn(
+                    [
+                        "-m",
+                        "benchmarks.fake_upstream",
+                        f"--port={upstream_port}",
+                        f"--ttft={args.ttft}",
+                        f"--tps={args.tps}",
+                        f"--jitter={args.jitter}",
+                        f"--error-rate={args.error_rate}",
+                        f"--rate-limit-rate={args.rate_limit_rate}",
+                        "--seed=0",
+                    ],
+                    log,
+                )
+            )
+            await _wait_ready(f"http://127.0.0.1:{upstream_port}/v1/models", procs[0])
+        if base_url is None:
+            port = free_port()
+            # no client-side limits or persistence in the way of the measurement
+            server = _spawn(
+                [
+                    "-m",
+                    "uvicorn",
+                    "app.main:app",
+                    "--host=127.0.0.1",
+                    f"--port={port}",
+                    "--log-level=warning",
+                ],
+                log,
+                env={
+                    **upstream_env,
+                    "OPENAI_API_KEY": "bench",
+                    "OPENAI_REQUESTS_PER_MINUTE": "1e9",
+                    "OPENAI_TOKENS_PER_MINUTE": "1e12",
+                    "RETRY_BASE_DELAY": "0.05",
+                    "CACHE_SQLITE_PATH": "",
+                    "JOBS_DB_PATH": "",
+                    "WARMUP_ENABLED": "true",
+                },
+            )
+            procs.append(server)
+            base_url, pid = f"http://127.0.0.1:{port}", server.pid
+        await _wait_ready(f"{base_url}/readyz", procs[-1] if procs else None)
+
+        styles = args.styles.split(",")
+        results: Dict[str, Dict[str, dict]] = {}
+        for scenario in args.scenarios.split(","):
+            results[scenario] = {}
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                step = await run_step(
+                    base_url, scenario, concurrency, args.duration, styles, pid
+                )
+                results[scenario][str(concurrency)] = step
+                print(_row(scenario, concurrency, step), flush=True)
+    finally:
+        for proc in reversed(procs):
+            _stop(proc)
+        if log is not subprocess.DEVNULL:
+            log.close()
+    return {
+        "config": {
+            k: getattr(args, k)
+            for k in (
+                "duration",
+                "styles",
+                "ttft",
+                "tps",
+                "jitter",
+                "error_rate",
+                "rate_limit_rate",
+                "replay",
+                "replay_speed",
+            )
+        },
+        "results": results,
+    }
+
+
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def _row(scenario: str, concurrency: int, step: dict) -> str:
+    return (
+        f"{scenario:<13} c={concurrency:<4} rps={step['rps']:8.2f} "
+        f"p50={_fmt(step['p50_ms'], '8.1f')}ms p95={_fmt(step['p95_ms'], '8.1f')}ms "
+        f"p99={_fmt(step['p99_ms'], '8.1f')}ms "
+        f"ttft50={_fmt(step['ttft_p50_ms'], '7.1f')}ms "
+        f"err={step['error_rate']:.2%} cpu={_fmt(step['cpu_percent'], '5.1f')}% "
+        f"rss={_fmt(step['rss_mb'], '6.1f')}MB"
+    )
+
+
+# -- baseline comparison -----------------------------------------------------
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    tolerance: float = 0.15,
+    floor_ms: float = 5.0,
+    floor_mb: float = 10.0,
+) -> List[str]:
+    """Regressions of `current` against `baseline`, one message each.
+
+    Only steps present in both are compared. Throughput may drop and
+    latencies, CPU per request and memory may grow by `tolerance` (a
+    fraction); latencies and memory also get an absolute slack of `floor_ms`
+    / `floor_mb` so that tiny values do not flap. The error share may grow by
+    one percentage point.
+    """
+    problems = []
+    for scenario, steps in current["results"].items():
+        for concurrency, now in steps.items():
+            base = baseline["results"].get(scenario, {}).get(concurrency)
+            if base is None:
+                continue
+            where = f"{scenario} c={concurrency}"
+            if now["rps"] < base["rps"] * (1 - tolerance):
+                problems.append(f"{where}: rps {base['rps']} -> {now['rps']}")
+            limits = [(key, floor_ms) for key in LATENCY_KEYS]
+            limits += [("cpu_ms_per_request", 0.0), ("rss_mb", floor_mb)]
+            for key, floor in limits:
+                old, new = base.get(key), now.get(key)
+                if old is not None and new is not None:
+                    if new > old * (1 + tolerance) + floor:
+                        problems.append(f"{where}: {key} {old} -> {new}")
+            if now["error_rate"] > base["error_rate"] + 0.01:
+                problems.append(
+                    f"{where}: error_rate {base['error_rate']} -> {now['error_rate']}"
+                )
+    return problems
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per step")
+    parser.add_argument("--styles", default="casual,professional")
+    parser.add_argument("--url", help="use a running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="server pid for CPU/RSS with --url")
+    parser.add_argument(
+        "--server-log", help="append server output here (default: drop)"
+    )
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tps", type=float, default=200.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--replay", help="serve this recorded corpus instead of the fake upstream"
+    )
+    parser.add_argument("--replay-speed", type=float, default=1.0)
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to check the results against")
+    parser.add_argument(
+        "--current", help="with --compare: check this result file instead of running"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.current and not args.compare:
+        parser.error("--current needs --compare")
+
+    current = _load(args.current) if args.current else asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        baseline = _load(args.compare)
+        if baseline["config"] != current["config"]:
+            print("warning: baseline was taken with a different upstream/load config")
+        problems = compare(baseline, current, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+from app.main import app
+from app.providers.base import LLMProvider
+from app.routes.rephrase import get_service
+from app.services.rephrase_service import RephraseService
+from app.utils.cancel import cancel_registry
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+
+
+class BatchProvider(LLMProvider):
+    """Echoes after `delay`; texts starting with "bad" fail."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def rephrase_full(self, style, input_text):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        self.started.set()
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if input_text.startswith("bad"):
+            raise RuntimeError("upstream said no")
+        return f"{style}:{input_text}"
+
+
+async def post_batch(body, cancel_after_start=None):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        canceller = None
+        if cancel_after_start is not None:
+
+            async def cancel():
+                await asyncio.wait_for(cancel_after_start.started.wait(), 2)
+                return await ac.post(f"/v1/rephrase/{body['request_id']}/cancel")
+
+            canceller = asyncio.create_task(cancel())
+        r = await asyncio.wait_for(ac.post("/v1/rephrase/batch", json=body), 5)
+        if canceller is not None:
+            assert (await canceller).json()["cancelled"] is True
+    assert r.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+@pytest.fixture
+def provider():
+    provider = BatchProvider()
+    app.dependency_overrides[get_service] = lambda: RephraseService(provider)
+    yield provider
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_every_pair_and_isolates_failures(provider):
+    body = {
+        "items": [
+            {"id": "a", "input_text": "hello", "styles": ["casual", "polite"]},
+            {"input_text": "bad input", "styles": ["casual"]},
+            {"id": "c", "input_text": "bye", "styles": ["polite"]},
+        ]
+    }
+    lines = await post_batch(body)
+    assert lines[0]["type"] == "meta" and lines[0]["pairs"] == 4
+    assert lines[-1] == {"type": "done", "completed": 3, "failed": 1}
+    results = {(l["id"], l["style"]): l for l in lines[1:-1]}
+    assert results["a", "polite"]["result"] == "polite:hello"
+    assert results["c", "polite"]["result"] == "polite:bye"
+    # items without an id are named by their position
+    assert results["1", "casual"]["type"] == "error"
+    assert results["1", "casual"]["detail"] == "upstream said no"
+
+
+@pytest.mark.asyncio
+async def test_batch_respects_concurrency():
+    provider = BatchProvider()
+    svc = RephraseService(provider)
+    pairs = [(str(i), "casual", f"text {i}") for i in range(20)]
+    out = [r async for r in svc.rephrase_batch(pairs, concurrency=3)]
+    assert sorted(r[0] for r in out) == sorted(p[0] for p in pairs)
+    assert provider.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_cancel_stops_remaining_pairs(provider):
+    provider.delay = 0.2
+    body = {
+        "request_id": "batch-cancel",
+        "items": [
+            {"input_text": f"text {i}", "styles": ["casual"]} for i in range(100)
+        ],
+    }
+    lines = await post_batch(body, cancel_after_start=provider)
+    assert lines[-1]["type"] == "cancelled"
+    assert lines[-1]["skipped"] == 100 - lines[-1]["completed"]
+    assert provider.calls < 100
+    await asyncio.sleep(0)
+    assert provider.in_flight == 0
+    assert cancel_registry.get("batch-cancel") is None
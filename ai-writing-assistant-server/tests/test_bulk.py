@@ -0,0 +1,171 @@
+import asyncio
+import io
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from app import bulk
+from app.providers.mock_provider import MockProvider
+from app.services.rephrase_service import RephraseService
+
+
+class GatedProvider(MockProvider):
+    """MockProvider whose calls on texts containing "slow" wait for `gate`."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.calls = 0
+
+    async def rephrase_full(self, style, input_text):
+        self.calls += 1
+        if "slow" in input_text:
+            await self.gate.wait()
+        return await super().rephrase_full(style, input_text)
+
+
+def write_input(path, texts):
+    with open(path, "w") as f:
+        for i, text in enumerate(texts):
+            f.write(json.dumps({"id": f"r{i}", "input_text": text}) + "\n")
+
+
+def read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+async def run(svc, src, dst, **kwargs):
+    kwargs.setdefault("styles", ["casual"])
+    return await bulk.run(svc, str(src), str(dst), progress_out=io.StringIO(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_bulk_rephrases_every_line_once(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, [f"text {i}" for i in range(50)])
+    with open(src, "a") as f:
+        f.write("\nnot json\n")
+    progress = await run(RephraseService(MockProvider()), src, dst, concurrency=4)
+    rows = read_output(dst)
+    assert sorted(r["line"] for r in rows) == list(range(50)) + [51]
+    assert rows[0]["results"] == {"casual": f"[CASUAL] text {rows[0]['line']}"}
+    bad = [r for r in rows if r["line"] == 51][0]
+    assert bad["errors"]["*"].startswith("invalid line")
+    assert progress.done == 51 and progress.failed == 1
+
+    # a second run finds nothing left to do
+    again = await run(RephraseService(MockProvider()), src, dst)
+    assert again.done == 0 and len(read_output(dst)) == 51
+
+
+@pytest.mark.asyncio
+async def test_bulk_resumes_after_interruption(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["slow start"] + [f"text {i}" for i in range(1, 30)])
+    provider = GatedProvider()
+    task = asyncio.create_task(
+        run(RephraseService(provider), src, dst, concurrency=2, checkpoint_every=0)
+    )
+    while provider.calls < 5:
+        await asyncio.sleep(0.001)
+    task.cancel()  # like Ctrl-C: line 0 never finished
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert 0 < len(read_output(dst)) < 30
+
+    provider.gate.set()
+    await run(RephraseService(provider), src, dst, concurrency=2)
+    rows = read_output(dst)
+    assert sorted(r["line"] for r in rows) == list(range(30))
+
+
+@pytest.mark.asyncio
+async def test_bulk_reads_a_bounded_window_ahead(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["slow start"] + [f"text {i}" for i in range(1, 200)])
+    provider = GatedProvider()
+    task = asyncio.create_task(run(RephraseService(provider), src, dst, concurrency=2))
+    await asyncio.sleep(0.1)
+    # line 0 is stuck, so reading stops `concurrency * 4` lines past it
+    assert provider.calls <= 2 * 4
+    provider.gate.set()
+    await task
+    assert len(read_output(dst)) == 200
+
+
+class PipeInput:
+    """stdin stand-in whose second line only arrives once the first is done."""
+
+    def __init__(self, first_done: threading.Event):
+        self.first_done = first_done
+        self.lines = [b'{"input_text": "one"}\n', b'{"input_text": "two"}\n']
+
+    def readline(self):
+        if len(self.lines) == 1:
+            # a readline on the event loop would block the worker that sets this
+            assert self.first_done.wait(timeout=2)
+        return self.lines.pop(0) if self.lines else b""
+
+
+@pytest.mark.asyncio
+async def test_bulk_reads_stdin_off_the_event_loop(tmp_path, monkeypatch):
+    first_done = threading.Event()
+
+    class Provider(MockProvider):
+        async def rephrase_full(self, style, input_text):
+            first_done.set()
+            return await super().rephrase_full(style, input_text)
+
+    monkeypatch.setattr(
+        bulk.sys, "stdin", SimpleNamespace(buffer=PipeInput(first_done))
+    )
+    dst = tmp_path / "out.jsonl"
+    progress = await asyncio.wait_for(run(RephraseService(Provider()), "-", dst), 5)
+    assert progress.done == 2 and len(read_output(dst)) == 2
+
+
+@pytest.mark.asyncio
+async def test_lines_that_failed_on_every_style_are_retried(tmp_path, monkeypatch):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["fine", "flaky", "fine again"])
+
+    class Flaky(MockProvider):
+        down = True
+
+        async def rephrase_full(self, style, input_text):
+            if "flaky" in input_text and self.down:
+                raise TimeoutError("upstream timed out")
+            return await super().rephrase_full(style, input_text)
+
+    fsync_threads = []
+    fsync = bulk.os.fsync
+    monkeypatch.setattr(
+        bulk.os,
+        "fsync",
+        lambda fd: fsync_threads.append(threading.current_thread()) or fsync(fd),
+    )
+    provider = Flaky()
+    first = await run(RephraseService(provider), src, dst, styles=["casual", "polite"])
+    assert first.failed == 1
+    # checkpoints fsync off the event loop
+    assert fsync_threads and threading.main_thread() not in fsync_threads
+
+    provider.down = False
+    again = await run(RephraseService(provider), src, dst)
+    assert again.done == 1 and again.failed == 0
+    rows = [r for r in read_output(dst) if r["line"] == 1]
+    assert [bool(r["results"]) for r in rows] == [False, True]
+
+    # nothing is left to retry
+    assert (await run(RephraseService(provider), src, dst)).done == 0
+
+
+@pytest.mark.asyncio
+async def test_resume_refuses_a_missing_output(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(src, ["one", "two"])
+    await run(RephraseService(MockProvider()), src, dst)
+    dst.unlink()
+    with pytest.raises(ValueError, match="delete the checkpoint"):
+        await run(RephraseService(MockProvider()), src, dst)
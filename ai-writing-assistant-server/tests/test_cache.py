@@ -0,0 +1,113 @@
+import pytest
+from app.providers.cached_provider import CachedProvider
+from app.providers.mock_provider import MockProvider
+from app.utils.cache import (
+    LRUCache,
+    ResponseCache,
+    SQLiteCache,
+    bypass_cache,
+    normalize_text,
+)
+
+
+class CountingProvider(MockProvider):
+    def __init__(self):
+        self.calls = 0
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        self.calls += 1
+        return await super().rephrase_full(style, input_text)
+
+    async def rephrase_stream(self, style: str, input_text: str):
+        self.calls += 1
+        async for ch in super().rephrase_stream(style, input_text):
+            yield ch
+
+
+def test_lru_evicts_oldest_and_expires():
+    lru = LRUCache(max_entries=2, ttl=60)
+    lru.set("a", "1")
+    lru.set("b", "2")
+    assert lru.get("a") == "1"  # "b" is now least recently used
+    lru.set("c", "3")
+    assert lru.get("b") is None
+    assert lru.evictions == 1
+
+    lru.set("d", "4", ttl=-1)
+    assert lru.get("d") is None
+    assert lru.expirations == 1
+
+
+def test_normalize_text_collapses_whitespace():
+    assert normalize_text("  Hello \n team  ") == "Hello team"
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = ResponseCache(LRUCache(), SQLiteCache(path))
+    reader = ResponseCache(LRUCache(), SQLiteCache(path))
+    try:
+        await writer.set("k", "value")
+        assert await reader.get("k") == "value"
+        assert reader.disk_hits == 1
+        # promoted into the memory tier
+        assert reader.memory.get("k") == "value"
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_disk_tier_sweeps_expired_rows_periodically(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), sweep_interval=3600)
+
+    def rows():
+        return disk._conn.execute("SELECT COUNT(*) FROM rephrase_cache").fetchone()[0]
+
+    try:
+        disk.set("live", "0")  # the first write sweeps
+        disk.ttl = -1
+        disk.set("a", "1")
+        disk.set("b", "2")
+        assert disk.get("a") is None  # expired rows are hidden before the sweep
+        assert rows() == 3
+        disk.ttl = 60
+        disk._next_sweep = 0.0
+        disk.set("c", "3")
+        assert rows() == 2
+        plan = disk._conn.execute(
+            "EXPLAIN QUERY PLAN DELETE FROM rephrase_cache WHERE expires_at < 0"
+        ).fetchall()
+        assert "rephrase_cache_expires" in str(plan)
+    finally:
+        disk.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_provider_full_and_stream_replay():
+    inner = CountingProvider()
+    provider = CachedProvider(inner, ResponseCache(LRUCache()))
+
+    first = await provider.rephrase_full("casual", "Hello   team")
+    second = await provider.rephrase_full("casual", "Hello team\n")
+    assert first == second
+    assert inner.calls == 1
+
+    deltas = [d async for d in provider.rephrase_stream("casual", "Hello team")]
+    assert len(deltas) > 1
+    assert "".join(deltas) == first
+    assert inner.calls == 1
+    assert provider.cache.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_provider_bypass_reaches_model():
+    inner = CountingProvider()
+    provider = CachedProvider(inner, ResponseCache(LRUCache()))
+    await provider.rephrase_full("polite", "Hi")
+    bypass_cache()
+    try:
+        await provider.rephrase_full("polite", "Hi")
+    finally:
+        bypass_cache(False)
+    assert inner.calls == 2
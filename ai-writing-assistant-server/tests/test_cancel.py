@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+from app.main import app
+from app.providers.base import LLMProvider
+from app.routes import agent, rephrase
+from app.services.rephrase_service import RephraseService
+from app.utils.cancel import CancelToken, RequestCancelled, cancel_registry
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+from sse_starlette.sse import AppStatus
+
+
+class StallingProvider(LLMProvider):
+    """Streams one delta per style and then hangs, like a slow upstream."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.open = 0
+        self.after_cancel = 0
+
+    async def rephrase_full(self, style, input_text):
+        self.open += 1
+        self.started.set()
+        try:
+            await asyncio.sleep(10)
+            self.after_cancel += 1
+            return "late"
+        finally:
+            self.open -= 1
+
+    async def rephrase_stream(self, style, input_text):
+        self.open += 1
+        try:
+            yield f"{style} "
+            self.started.set()
+            await asyncio.sleep(10)
+            self.after_cancel += 1
+            yield "late"
+        finally:
+            self.open -= 1
+
+
+@pytest.mark.asyncio
+async def test_guard_aborts_pending_await():
+    token = CancelToken()
+    task = asyncio.create_task(token.guard(asyncio.sleep(10)))
+    await asyncio.sleep(0)
+    token.set()
+    with pytest.raises(RequestCancelled):
+        await task
+    # already cancelled: fails without starting the await
+    with pytest.raises(RequestCancelled):
+        await token.guard(asyncio.sleep(10))
+
+
+@pytest.mark.asyncio
+async def test_guard_keeps_outside_cancellation():
+    token = CancelToken()
+    task = asyncio.create_task(token.guard(asyncio.sleep(10)))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def stream_and_cancel(path, query, provider, rid):
+    # start a stream, cancel it once the provider is mid-generation
+    AppStatus.should_exit_event = asyncio.Event()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+
+        async def cancel_when_started():
+            await asyncio.wait_for(provider.started.wait(), 2)
+            return await ac.post(f"{path}/{rid}/cancel")
+
+        canceller = asyncio.create_task(cancel_when_started())
+        body = {
+            "input_text": "Please rewrite this sentence",
+            "styles": ["casual", "polite"],
+            "request_id": rid,
+        }
+        r = await asyncio.wait_for(ac.post(f"{path}/stream{query}", json=body), 2)
+        assert (await canceller).json()["cancelled"] is True
+    assert "event: cancelled" in r.text
+    line = r.text.split("event: cancelled")[1].split("data: ")[1].splitlines()[0]
+    return json.loads(line)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "query", ["", "?interleave=true", "?combined=true", "?example_format=true"]
+)
+async def test_stream_cancel_aborts_upstream(query):
+    provider = StallingProvider()
+    app.dependency_overrides[rephrase.get_service] = lambda: RephraseService(provider)
+    try:
+        rid = "cancel-rephrase-" + query.strip("?").replace("=", "-")
+        saved = await stream_and_cancel("/v1/rephrase", query, provider, rid)
+    finally:
+        app.dependency_overrides.clear()
+    # nothing upstream kept running after the cancel
+    assert provider.open == 0
+    assert provider.after_cancel == 0
+    assert saved["request_id"] == rid
+    assert saved["tokens_saved"] > 0
+    assert cancel_registry.get(rid) is None
+
+
+@pytest.mark.asyncio
+async def test_agent_stream_cancel_aborts_upstream():
+    provider = StallingProvider()
+    app.dependency_overrides[agent.get_agent_service] = lambda: RephraseService(
+        provider
+    )
+    try:
+        saved = await stream_and_cancel("/v1/agent", "", provider, "cancel-agent")
+    finally:
+        app.dependency_overrides.clear()
+    assert provider.open == 0
+    assert provider.after_cancel == 0
+    # two styles of ~7 expected tokens each, minus what was already streamed
+    assert 7 < saved["tokens_saved"] < 2 * 7
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from app.utils.cancel import CancelRegistry
+from app.utils.cancel_broker import UnixCancelBackend
+
+
+async def start_workers(path, n=2, ttl=60.0):
+    # each registry plays one uvicorn worker; they share only the socket path
+    workers = []
+    for _ in range(n):
+        registry = CancelRegistry(ttl=ttl)
+        await registry.start(UnixCancelBackend(path, ttl))
+        workers.append(registry)
+    return workers
+
+
+async def stop_workers(workers):
+    for registry in workers:
+        await registry.close()
+
+
+@pytest.fixture
+def sock_path(tmp_path):
+    return str(tmp_path / "cancel.sock")
+
+
+@pytest.mark.asyncio
+async def test_cancel_reaches_other_worker(sock_path):
+    a, b = await start_workers(sock_path)
+    try:
+        assert a._backend.is_broker and not b._backend.is_broker
+        token = b.create("req-1")
+        await asyncio.sleep(0.05)  # registration is fire-and-forget
+        assert await a.cancel("req-1") is True
+        await asyncio.wait_for(token.wait(), 1)
+        assert await a.cancel("unknown") is False
+        b.clear("req-1")
+        await asyncio.sleep(0.05)
+        assert await a.cancel("req-1") is False
+    finally:
+        await stop_workers([a, b])
+
+
+@pytest.mark.asyncio
+async def test_broker_expires_abandoned_ids(sock_path):
+    a, b = await start_workers(sock_path, ttl=0.05)
+    try:
+        b.create("stale")
+        await asyncio.sleep(0.15)
+        assert await a.cancel("stale") is False
+    finally:
+        await stop_workers([a, b])
+
+
+@pytest.mark.asyncio
+async def test_worker_takes_over_when_broker_exits(sock_path):
+    a, b, c = await start_workers(sock_path, n=3)
+    try:
+        token = c.create("req-2")
+        await a.close()  # the broker's worker goes away
+        for _ in range(50):
+            if b._backend.is_broker or c._backend.is_broker:
+                break
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.1)  # reconnect and re-register
+        assert await b.cancel("req-2") is True
+        await asyncio.wait_for(token.wait(), 1)
+    finally:
+        await stop_workers([b, c])
+
+
+@pytest.mark.asyncio
+async def test_local_registry_expires_unconsumed_ids():
+    registry = CancelRegistry(ttl=0.01)
+    registry.create("never-streamed")
+    await asyncio.sleep(0.02)
+    registry.create("fresh")
+    assert registry.get("never-streamed") is None
+    assert await registry.cancel("fresh") is True
+
+
+def test_registry_expiry_only_visits_expired_ids():
+    class Untouchable:
+        @property
+        def started(self):
+            raise AssertionError("expiry scanned past the first live id")
+
+    registry = CancelRegistry(ttl=60)
+    for i in range(3):
+        registry.create(f"old-{i}")
+    registry.create("old-0")  # re-created: moves behind the others
+    for rid in ("old-1", "old-2"):
+        registry.get(rid).started -= 120
+    registry.create("live")
+    registry._events["untouchable"] = Untouchable()
+    registry.create("new")
+    assert list(registry._events) == ["old-0", "live", "untouchable", "new"]
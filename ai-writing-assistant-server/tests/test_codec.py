@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from app.providers.openai_chat import STYLE_SYSTEM, _messages, _multi_messages
+from app.utils import codec
+
+
+def chunk_event(content):
+    payload = {"choices": [{"delta": {"content": content}}]}
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def test_sse_parser_handles_arbitrary_splits():
+    stream = (
+        b"".join(chunk_event(w) for w in ["Hel", "lo ", "wörld"]) + b"data: [DONE]\n\n"
+    )
+    for size in (1, 3, 7, len(stream)):
+        parser = codec.SSEParser()
+        events = []
+        for i in range(0, len(stream), size):
+            events.extend(parser.feed(stream[i : i + size]))
+        events.extend(parser.flush())
+        assert events[-1] == codec.DONE
+        assert [codec.chat_delta(e) for e in events[:-1]] == ["Hel", "lo ", "wörld"]
+
+
+def test_sse_parser_fields_and_flush():
+    parser = codec.SSEParser()
+    events = parser.feed(
+        b": keep-alive\r\nevent: x\r\ndata: a\r\ndata:b\r\n\r\ndata: tail"
+    )
+    assert events == [b"a\nb"]
+    assert parser.flush() == [b"tail"]
+    assert parser.flush() == []
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"not json", b"{}", b'{"choices": []}', b'{"choices": [{"delta": {}}]}'],
+)
+def test_chat_delta_ignores_other_payloads(data):
+    assert codec.chat_delta(data) is None
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_chat_body_matches_plain_payload(stream):
+    text = 'Quote "this", naïve \\ emoji 🙂\nnew line'
+    for style in STYLE_SYSTEM:
+        messages = _messages(style, text)
+        body = codec.chat_body("gpt-4o-mini", messages, 0.7, stream)
+        assert json.loads(body) == {
+            "model": "gpt-4o-mini",
+            "messages": messages,
+            "temperature": 0.7,
+            "stream": stream,
+        }
+    messages = _multi_messages(["casual", "polite"], text)
+    fmt = {"type": "json_object"}
+    body = codec.chat_body("m", messages, 0.2, stream, response_format=fmt)
+    assert json.loads(body)["response_format"] == fmt
@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from app.main import app
+from app.providers.openai_chat import OpenAIChatProvider
+from app.routes.agent import get_agent_service
+from app.routes.rephrase import get_service
+from app.services.rephrase_service import RephraseService
+from app.utils import deadline, http
+from app.utils.stats import collect_stats
+from httpx._transports.asgi import ASGITransport
+from sse_starlette.sse import AppStatus
+
+
+class StalledStream(httpx.AsyncByteStream):
+    """SSE body that sends `first` deltas and then stops producing."""
+
+    def __init__(self, first: int, delay: float = 0.0):
+        self.first = first
+        self.delay = delay
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.delay)
+        for i in range(self.first):
+            payload = {"choices": [{"delta": {"content": f"w{i} "}}]}
+            yield f"data: {json.dumps(payload)}\n\n".encode()
+        await asyncio.sleep(10)
+
+
+def use_transport(monkeypatch, handler):
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+
+
+@pytest.mark.asyncio
+async def test_within_counts_stage():
+    before = collect_stats()["deadlines"]["queue"]
+    deadline.set_deadline(0.02)
+    try:
+        with pytest.raises(deadline.DeadlineExceeded) as info:
+            await deadline.within(asyncio.sleep(1), "queue")
+        assert info.value.stage == "queue"
+        # already expired: fails without awaiting
+        with pytest.raises(deadline.DeadlineExceeded):
+            await deadline.within(asyncio.sleep(1), "queue")
+    finally:
+        deadline.set_deadline(None)
+    assert collect_stats()["deadlines"]["queue"] == before + 2
+
+
+@pytest.mark.asyncio
+async def test_within_without_deadline_uses_cap():
+    assert await deadline.within(asyncio.sleep(0, "ok"), "upstream") == "ok"
+    with pytest.raises(deadline.DeadlineExceeded):
+        await deadline.within(asyncio.sleep(1), "upstream", cap=0.01)
+
+
+def test_streams_get_the_larger_overall_budget(monkeypatch):
+    monkeypatch.setattr(deadline, "REQUEST_TIMEOUT_SECONDS", 60.0)
+    monkeypatch.setattr(deadline, "REQUEST_TIMEOUT_MAX", 300.0)
+    monkeypatch.setattr(deadline, "STREAM_TIMEOUT_SECONDS", 900.0)
+    try:
+        deadline.start_deadline()
+        assert 59 < deadline.remaining() <= 60
+        deadline.start_deadline(stream=True)
+        assert 899 < deadline.remaining() <= 900
+        deadline.start_deadline(5000, stream=True)
+        assert 899 < deadline.remaining() <= 900
+        deadline.start_deadline(0.5, stream=True)
+        assert deadline.remaining() <= 0.5
+        monkeypatch.setattr(deadline, "STREAM_TIMEOUT_SECONDS", 0.0)
+        deadline.start_deadline(stream=True)
+        assert deadline.remaining() is None
+    finally:
+        deadline.set_deadline(None)
+
+
+@pytest.mark.asyncio
+async def test_guard_stream_stages():
+    async def source(gaps):
+        for gap in gaps:
+            await asyncio.sleep(gap)
+            yield gap
+
+    with pytest.raises(deadline.DeadlineExceeded) as info:
+        [x async for x in deadline.guard_stream(source([1]), first=0.01, idle=1)]
+    assert info.value.stage == "ttft"
+
+    out = []
+    with pytest.raises(deadline.DeadlineExceeded) as info:
+        async for x in deadline.guard_stream(source([0, 0, 1]), first=1, idle=0.01):
+            out.append(x)
+    assert out == [0, 0]
+    assert info.value.stage == "inter_token"
+
+
+@pytest.mark.asyncio
+async def test_provider_stream_aborts_stalled_upstream(monkeypatch):
+    use_transport(monkeypatch, lambda r: httpx.Response(200, stream=StalledStream(2)))
+    deadline.set_deadline(0.2)
+    try:
+        out = []
+        with pytest.raises(deadline.DeadlineExceeded) as info:
+            async for delta in OpenAIChatProvider(limiter=None).rephrase_stream(
+                "casual", "hi"
+            ):
+                out.append(delta)
+        assert out == ["w0 ", "w1 "]
+        assert info.value.stage == "inter_token"
+    finally:
+        deadline.set_deadline(None)
+        await http.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_routes_report_deadline(monkeypatch):
+    async def slow(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "x"}}]})
+
+    use_transport(monkeypatch, slow)
+    app.dependency_overrides[get_service] = lambda: RephraseService(
+        OpenAIChatProvider(limiter=None)
+    )
+    try:
+        async with httpx.AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            r = await ac.post(
+                "/v1/rephrase?cache=false",
+                json={"input_text": "Deadline check", "styles": ["casual"]},
+                headers={"X-Request-Timeout": "0.05"},
+            )
+            assert r.status_code == 504
+            assert "upstream" in r.json()["detail"]
+
+            AppStatus.should_exit_event = asyncio.Event()
+            use_transport(
+                monkeypatch,
+                lambda r: httpx.Response(200, stream=StalledStream(0)),
+            )
+            r = await ac.post(
+                "/v1/rephrase/stream?cache=false",
+                json={"input_text": "Deadline check", "styles": ["casual"]},
+                headers={"X-Request-Timeout": "0.1"},
+            )
+            assert "event: error" in r.text
+            assert '"stage": "ttft"' in r.text
+            assert "event: done" in r.text
+    finally:
+        app.dependency_overrides.clear()
+        await http.close_http_client()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/v1/rephrase/stream",
+        "/v1/rephrase/stream?example_format=true",
+        "/v1/agent/stream?example_format=false",
+    ],
+)
+async def test_sequential_stream_stops_at_the_deadline(monkeypatch, path):
+    use_transport(monkeypatch, lambda r: httpx.Response(200, stream=StalledStream(0)))
+    svc = RephraseService(OpenAIChatProvider(limiter=None))
+    app.dependency_overrides[get_service] = lambda: svc
+    app.dependency_overrides[get_agent_service] = lambda: svc
+    AppStatus.should_exit_event = asyncio.Event()
+    try:
+        async with httpx.AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            sep = "&" if "?" in path else "?"
+            r = await ac.post(
+                f"{path}{sep}cache=false",
+                json={"input_text": "Deadline check", "styles": ["casual", "polite"]},
+                headers={"X-Request-Timeout": "0.1"},
+            )
+        # one error for the style that ran out of time; later styles are skipped
+        assert r.text.count("event: error") == 1
+        assert "olite" not in r.text.split("event: error", 1)[1]
+        assert "event: done" in r.text
+    finally:
+        app.dependency_overrides.clear()
+        await http.close_http_client()
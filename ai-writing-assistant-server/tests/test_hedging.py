@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from app.providers.hedged_provider import HedgedProvider
+from app.providers.mock_provider import MockProvider
+from app.utils.hedging import HedgeBudget, Hedger, LatencyTracker
+
+
+class FirstCallSlowProvider(MockProvider):
+    def __init__(self, slow: float = 0.5):
+        self.slow = slow
+        self.calls = 0
+        self.cancelled = 0
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        self.calls += 1
+        call = self.calls
+        try:
+            await asyncio.sleep(self.slow if call == 1 else 0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"call {call}"
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_loser_cancelled():
+    inner = FirstCallSlowProvider()
+    hedger = Hedger(delay=0.02, max_ratio=1.0)
+    provider = HedgedProvider(inner, hedger)
+
+    assert await provider.rephrase_full("casual", "Hi") == "call 2"
+    await asyncio.sleep(0)
+    assert inner.calls == 2
+    assert inner.cancelled == 1
+    assert hedger.stats()["hedge_wins"] == 1
+    # the cancelled primary still counts, with the time it had run (~30 ms)
+    samples = sorted(hedger.latency._samples)
+    assert len(samples) == 2
+    assert samples[0] < 0.02 < samples[1]
+
+
+@pytest.mark.asyncio
+async def test_fast_call_is_not_hedged():
+    inner = FirstCallSlowProvider(slow=0.001)
+    hedger = Hedger(delay=0.05, max_ratio=1.0)
+    assert await HedgedProvider(inner, hedger).rephrase_full("casual", "Hi") == "call 1"
+    assert inner.calls == 1
+    assert hedger.hedged == 0
+
+
+@pytest.mark.asyncio
+async def test_budget_limits_hedges():
+    inner = FirstCallSlowProvider(slow=0.05)
+    # zero budget: the slow call is waited out instead of duplicated
+    hedger = Hedger(delay=0.01, max_ratio=0.0)
+    assert await HedgedProvider(inner, hedger).rephrase_full("casual", "Hi") == "call 1"
+    assert inner.calls == 1
+    assert hedger.budget_denied == 1
+
+
+def test_budget_ratio_and_percentile_delay():
+    budget = HedgeBudget(max_ratio=0.1)
+    for _ in range(20):
+        budget.record_call()
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    tracker = LatencyTracker()
+    for ms in range(1, 101):
+        tracker.record(ms / 1000)
+    assert tracker.percentile(0.95) == pytest.approx(0.096)
+
+    hedger = Hedger(percentile=0.5, min_samples=10)
+    assert hedger.hedge_delay() == hedger.fallback_delay
+    hedger.latency = tracker
+    assert hedger.hedge_delay() == pytest.approx(0.051)
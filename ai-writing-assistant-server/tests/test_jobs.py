@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from app.main import app
+from app.providers.mock_provider import MockProvider
+from app.services.jobs import JobQueue, JobStore
+from app.services.rephrase_service import RephraseService
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+
+
+class CountingProvider(MockProvider):
+    def __init__(self):
+        self.calls = []
+
+    async def rephrase_full(self, style, input_text):
+        self.calls.append(style)
+        if input_text == "fail":
+            raise RuntimeError("upstream down")
+        return await super().rephrase_full(style, input_text)
+
+
+async def wait_for(store, job_id, status="done"):
+    for _ in range(200):
+        job = store.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_claim_order_and_expired_leases(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    low = store.submit("a", ["casual"], priority=0)
+    high = store.submit("b", ["casual"], priority=5)
+    later = store.submit("c", ["casual"], priority=0)
+    claimed = store.claim(lease=60, max_attempts=3)
+    assert claimed["id"] == high
+    # the claimed job as it is now, not as it was before the claim
+    assert claimed["status"] == "running" and claimed["attempts"] == 1
+    assert claimed["lease_until"] is not None
+    assert store.claim(lease=60, max_attempts=3)["id"] == low
+    # a worker that died: its lease ran out, so the job is claimable again
+    dead = store.claim(lease=-1, max_attempts=3)
+    assert dead["id"] == later
+    assert store.claim(lease=60, max_attempts=3)["id"] == later
+    assert store.get(later)["attempts"] == 2
+    assert store.claim(lease=60, max_attempts=3) is None
+    assert store.stats()["running"] == 3
+    store.close()
+
+
+def test_jobs_out_of_attempts_fail(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit("a", ["casual", "polite"])
+    store.claim(lease=-1, max_attempts=1)
+    store.save_style(job_id, "casual", "done", None)
+    store.save_style(job_id, "polite", None, "upstream down")
+    assert store.claim(lease=60, max_attempts=1) is None
+    job = store.get(job_id)
+    assert job["status"] == "failed" and job["results"] == {"casual": "done"}
+    assert job["errors"] == {"polite": "upstream down", "*": "too many attempts"}
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_restart_resumes_only_unfinished_styles(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    job_id = store.submit("hello", ["casual", "polite"])
+    # the previous process finished one style, then died mid-job
+    store.claim(lease=-1, max_attempts=3)
+    store.save_style(job_id, "casual", "[CASUAL] hello", None)
+    store.close()
+
+    provider = CountingProvider()
+    queue = JobQueue(JobStore(path), RephraseService(provider), workers=1, poll=0.01)
+    await queue.start()
+    try:
+        job = await wait_for(queue.store, job_id)
+    finally:
+        await queue.close()
+        queue.store.close()
+    assert provider.calls == ["polite"]
+    assert job["results"] == {"casual": "[CASUAL] hello", "polite": "[POLITE] hello"}
+
+
+@pytest.mark.asyncio
+async def test_jobs_api_submit_and_poll(tmp_path):
+    provider = CountingProvider()
+    queue = JobQueue(
+        JobStore(str(tmp_path / "jobs.sqlite3")), RephraseService(provider), poll=0.01
+    )
+    await queue.start()
+    app.state.jobs = queue
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://t"
+        ) as ac:
+            r = await ac.post(
+                "/v1/jobs", json={"input_text": "hi", "styles": ["casual"]}
+            )
+            assert r.status_code == 202
+            job_id = r.json()["id"]
+            bad = (
+                await ac.post("/v1/jobs", json={"input_text": "fail", "styles": []})
+            ).json()["id"]
+            await wait_for(queue.store, job_id)
+            await wait_for(queue.store, bad, "failed")
+            job = (await ac.get(f"/v1/jobs/{job_id}")).json()
+            assert job["status"] == "done"
+            assert job["results"] == {"casual": "[CASUAL] hi"}
+            failed = (await ac.get(f"/v1/jobs/{bad}")).json()
+            assert set(failed["errors"]) == set(failed["styles"])
+            assert (await ac.get("/v1/jobs/nope")).status_code == 404
+            stats = (await ac.get("/stats")).json()["jobs"]
+            assert stats["done"] == 1 and stats["failed"] == 1
+            assert stats["queued"] == 0 and stats["oldest_queued_seconds"] == 0.0
+    finally:
+        app.state.jobs = None
+        await queue.close()
+        queue.store.close()
+
+
+@pytest.mark.asyncio
+async def test_close_requeues_running_jobs(tmp_path):
+    class SlowProvider(MockProvider):
+        def __init__(self):
+            self.started = asyncio.Event()
+
+        async def rephrase_full(self, style, input_text):
+            self.started.set()
+            await asyncio.sleep(60)
+
+    provider = SlowProvider()
+    queue = JobQueue(
+        JobStore(str(tmp_path / "jobs.sqlite3")),
+        RephraseService(provider),
+        workers=1,
+        poll=0.01,
+    )
+    await queue.start()
+    job_id = await queue.submit("hi", ["casual"])
+    try:
+        await asyncio.wait_for(provider.started.wait(), 2)
+        assert queue.store.get(job_id)["attempts"] == 1
+        await queue.close()
+        job = queue.store.get(job_id)
+        assert job["status"] == "queued"
+        assert job["attempts"] == 0 and job["lease_until"] is None
+    finally:
+        queue.store.close()
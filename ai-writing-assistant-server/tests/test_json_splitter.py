@@ -0,0 +1,39 @@
+import json
+
+import pytest
+from app.utils.json_splitter import JsonObjectSplitter
+
+
+def _collect(chunks):
+    splitter = JsonObjectSplitter()
+    out = {}
+    for chunk in chunks:
+        for key, fragment in splitter.feed(chunk):
+            out[key] = out.get(key, "") + fragment
+    return splitter, out
+
+
+def test_splitter_streams_fragments_per_key():
+    splitter = JsonObjectSplitter()
+    assert splitter.feed('{"casual": "Hey th') == [("casual", "Hey th")]
+    assert splitter.feed('ere", "pol') == [("casual", "ere")]
+    assert splitter.feed('ite": "Hello"}') == [("polite", "Hello")]
+    assert splitter.done
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_splitter_handles_escapes_split_across_chunks(size):
+    expected = {
+        "professional": 'Line one\nLine "two" \\ done',
+        "social-media": "Launch day \U0001f680 café \t!",
+    }
+    raw = json.dumps(expected)  # ascii escapes, incl. a surrogate pair
+    chunks = [raw[i : i + size] for i in range(0, len(raw), size)]
+    splitter, out = _collect(chunks)
+    assert out == expected
+    assert splitter.done
+
+
+def test_splitter_rejects_non_string_values():
+    with pytest.raises(ValueError):
+        JsonObjectSplitter().feed('{"casual": 3}')
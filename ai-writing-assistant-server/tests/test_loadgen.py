@@ -0,0 +1,53 @@
+import copy
+
+import pytest
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+
+from benchmarks.fake_upstream import create_app
+from benchmarks.loadgen import compare
+
+STEP = {
+    "requests": 100,
+    "errors": 0,
+    "error_rate": 0.0,
+    "rps": 50.0,
+    "p50_ms": 100.0,
+    "p95_ms": 150.0,
+    "p99_ms": 200.0,
+    "ttft_p50_ms": 40.0,
+    "ttft_p95_ms": 60.0,
+    "cpu_percent": 20.0,
+    "cpu_ms_per_request": 4.0,
+    "rss_mb": 80.0,
+}
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"config": {}, "results": {"stream": {"8": dict(STEP)}}}
+    current = copy.deepcopy(baseline)
+    step = current["results"]["stream"]["8"]
+    step.update(rps=45.0, p95_ms=170.0, rss_mb=85.0)  # within 15% (+ floors)
+    assert compare(baseline, current) == []
+
+    step.update(rps=40.0, ttft_p95_ms=80.0, cpu_ms_per_request=5.0, error_rate=0.05)
+    problems = compare(baseline, current)
+    assert len(problems) == 4
+    assert problems[0] == "stream c=8: rps 50.0 -> 40.0"
+    # steps missing from the baseline are not compared
+    current["results"]["rephrase"] = {"1": dict(STEP, rps=1.0)}
+    assert len(compare(baseline, current)) == 4
+
+
+@pytest.mark.asyncio
+async def test_fake_upstream_injects_rate_limits_and_errors():
+    app = create_app(error_rate=0.5, rate_limit_rate=0.5, retry_after_ms=250, seed=1)
+    body = {"model": "fake", "messages": []}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        responses = [
+            await ac.post("/v1/chat/completions", json=body) for _ in range(20)
+        ]
+    statuses = {r.status_code for r in responses}
+    assert statuses == {429, 500}
+    limited = next(r for r in responses if r.status_code == 429)
+    assert limited.headers["retry-after-ms"] == "250"
@@ -0,0 +1,101 @@
+import json
+
+import httpx
+import pytest
+from app.main import app
+from app.providers import openai_chat
+from app.providers.openai_chat import OpenAIChatProvider
+from app.utils import http, metrics
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("test_seconds", "test", ("route",), buckets=(0.1, 1))
+    metrics._registry.remove(hist)
+    child = hist.labels('/v1/"x"')
+    for value in (0.05, 0.1, 0.5, 3):
+        child.observe(value)
+    lines = hist.render()
+    assert lines[1] == "# TYPE test_seconds histogram"
+    assert 'test_seconds_bucket{route="/v1/\\"x\\"",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{route="/v1/\\"x\\"",le="1"} 3' in lines
+    assert 'test_seconds_bucket{route="/v1/\\"x\\"",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{route="/v1/\\"x\\""} 4' in lines
+
+
+@pytest.mark.asyncio
+async def test_stream_records_ttft_gaps_and_errors(monkeypatch):
+    def handler(request):
+        if json.loads(request.content)["messages"][1]["content"] == "bad":
+            return httpx.Response(400, json={"error": "no"})
+        body = "".join(
+            f'data: {json.dumps({"choices": [{"delta": {"content": w}}]})}\n\n'
+            for w in ["a", " b", " c"]
+        )
+        return httpx.Response(200, text=body + "data: [DONE]\n\n")
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    provider = OpenAIChatProvider(None, model="metrics-test")
+    labels = ("other", "casual", "metrics-test")
+    ttft = metrics.TTFT.labels(*labels)
+    gaps = metrics.INTER_TOKEN.labels(*labels)
+    before = (sum(ttft.counts), sum(gaps.counts))
+    assert [d async for d in provider.rephrase_stream("casual", "hi")] == [
+        "a",
+        " b",
+        " c",
+    ]
+    assert (sum(ttft.counts), sum(gaps.counts)) == (before[0] + 1, before[1] + 2)
+    assert metrics.DELTAS.labels(*labels).value >= 3
+
+    errors = metrics.UPSTREAM_ERRORS.labels("400", "metrics-test")
+    with pytest.raises(httpx.HTTPStatusError):
+        await provider.rephrase_full("casual", "bad")
+    assert errors.value == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_labels_requests_by_route():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        await ac.get("/health")
+        r = await ac.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    assert (
+        'http_request_duration_seconds_count{route="/health",method="GET",status="200"}'
+        in text
+    )
+    assert "# TYPE streams_in_flight gauge" in text
+    assert "# TYPE cancellations_total counter" in text
+
+
+def test_unknown_styles_and_extra_models_share_other_label():
+    style = openai_chat._style_label
+    assert style("casual") == "casual" and style("combined") == "combined"
+    assert style("no such style 123") == "other"
+
+    models = metrics.BoundedLabel(limit=2)
+    assert [models(m) for m in ("a", "b", "c", "a")] == ["a", "b", "other", "a"]
+
+
+@pytest.mark.asyncio
+async def test_request_styles_do_not_add_metric_children(monkeypatch):
+    def handler(request):
+        return httpx.Response(200, json={"choices": [{"message": {"content": "x"}}]})
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    provider = OpenAIChatProvider(None, model="label-test")
+    for i in range(5):
+        await provider.rephrase_full(f"style {i}", "hi")
+    styles = {
+        values[1]
+        for values in metrics.UPSTREAM_LATENCY._children
+        if values[2] == "label-test"
+    }
+    assert styles == {"other"}
@@ -63,10 +63,11 @@ async def test_openai_provider_stream(mocker):
         def __init__(self):
             pass
 
-        async def aiter_lines(self):
-            yield 'data: {"choices":[{"delta":{"content":"Hello"}}]}\n'
-            yield 'data: {"choices":[{"delta":{"content":" team"}}]}\n'
-            yield "data: [DONE]\n"
+        async def aiter_bytes(self):
+            # events may be split anywhere across network chunks
+            yield b'data: {"choices":[{"delta":{"content":"Hello"}}]}\n\ndata: {"cho'
+            yield b'ices":[{"delta":{"content":" team"}}]}\r\n\r\n'
+            yield b"data: [DONE]\n\n"
 
         def raise_for_status(self):
             return None
@@ -145,3 +146,68 @@ async def test_agent_provider():
 
         result = await provider.rephrase_full("professional", "Hi")
         assert result == "Hello from agent!"
+
+
+@pytest.mark.asyncio
+async def test_openai_provider_uses_shared_client(monkeypatch):
+    """Provider calls go through the process-wide pooled client when started"""
+    import httpx
+    from app.utils import http
+
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.path)
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": "Pooled!"}}]}
+        )
+
+    shared = http.build_http_client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http, "_client", shared)
+    try:
+        provider = OpenAIChatProvider()
+        assert await provider.rephrase_full("professional", "Hi") == "Pooled!"
+        assert await provider.rephrase_full("casual", "Hi") == "Pooled!"
+        assert len(seen) == 2
+        assert http.get_http_client() is shared
+    finally:
+        await http.close_http_client()
+    assert http.get_http_client() is None
+
+
+@pytest.mark.asyncio
+async def test_openai_provider_multi_stream_single_call(monkeypatch):
+    """Combined mode makes one upstream call and splits it into per-style deltas"""
+    import json
+
+    import httpx
+    from app.utils import http
+
+    calls = []
+    content = json.dumps({"professional": "Good day.", "casual": "Hey!"})
+    pieces = [content[i : i + 5] for i in range(0, len(content), 5)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        body = "".join(
+            f'data: {json.dumps({"choices": [{"delta": {"content": p}}]})}\n\n'
+            for p in pieces
+        )
+        return httpx.Response(200, text=body + "data: [DONE]\n\n")
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    try:
+        provider = OpenAIChatProvider()
+        out = {}
+        async for style, delta in provider.rephrase_multi_stream(
+            ["professional", "casual"], "Hi"
+        ):
+            out[style] = out.get(style, "") + delta
+    finally:
+        await http.close_http_client()
+
+    assert out == {"professional": "Good day.", "casual": "Hey!"}
+    assert len(calls) == 1
+    assert calls[0]["response_format"] == {"type": "json_object"}
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from app.providers.openai_chat import OpenAIChatProvider
+from app.utils import http
+from app.utils.ratelimit import RateLimiter, parse_duration, parse_retry_after
+
+
+def test_parse_duration_and_retry_after():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("") is None
+    assert parse_retry_after({"retry-after": "2"}) == 2
+    assert parse_retry_after({"retry-after-ms": "150", "retry-after": "9"}) == 0.15
+    assert parse_retry_after({}) is None
+
+
+@pytest.mark.asyncio
+async def test_limiter_spaces_requests_without_blocking_loop():
+    # 1200 req/min = one every 50ms once the burst capacity is spent
+    limiter = RateLimiter(requests_per_minute=1200, tokens_per_minute=10**6)
+    limiter.requests.level = 0
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    t = asyncio.create_task(ticker())
+    start = time.monotonic()
+    await asyncio.gather(limiter.acquire(), limiter.acquire())
+    elapsed = time.monotonic() - start
+    t.cancel()
+
+    assert elapsed >= 0.09
+    assert ticks > 5  # the event loop kept running while callers waited
+    assert limiter.stats()["waited"] == 2
+    assert limiter.stats()["max_queue_depth"] == 2
+
+
+def test_limiter_adjusts_from_headers():
+    limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=100000)
+    limiter.update_from_headers(
+        {
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "2s",
+            "x-ratelimit-remaining-tokens": "1000",
+        }
+    )
+    assert limiter.requests.capacity == 60
+    assert limiter.requests.level < 1
+    assert limiter.tokens.level <= 1000
+    assert limiter.blocked_until > time.monotonic() + 1.5
+
+
+@pytest.mark.asyncio
+async def test_provider_retries_429_honouring_retry_after(monkeypatch):
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "50"})
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": "Done."}}]}
+        )
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6)
+    try:
+        provider = OpenAIChatProvider(limiter=limiter)
+        assert await provider.rephrase_full("casual", "Hi") == "Done."
+    finally:
+        await http.close_http_client()
+
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.045
+    assert limiter.stats()["throttled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_does_not_retry_client_errors(monkeypatch):
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(1)
+        return httpx.Response(401, json={"error": "bad key"})
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await OpenAIChatProvider(limiter=None).rephrase_full("casual", "Hi")
+    finally:
+        await http.close_http_client()
+    assert len(attempts) == 1
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+from app.providers.base import LLMProvider
+from app.providers.replay_provider import (Corpus, CorpusWriter,
+                                           RecordingProvider, ReplayProvider)
+
+
+class TimedProvider(LLMProvider):
+    """Streams three words 20 ms apart."""
+
+    async def rephrase_full(self, style, input_text):
+        await asyncio.sleep(0.02)
+        return f"{style} reply"
+
+    async def rephrase_stream(self, style, input_text):
+        for word in ["Hi", " there", f" {style}"]:
+            await asyncio.sleep(0.02)
+            yield word
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    return str(tmp_path / "corpus.jsonl")
+
+
+async def record(path):
+    writer = CorpusWriter(path)
+    provider = RecordingProvider(TimedProvider(), writer)
+    deltas = [d async for d in provider.rephrase_stream("casual", "hello  world")]
+    await provider.rephrase_full("polite", "hello")
+    # a stream closed early is not recorded
+    stream = provider.rephrase_stream("casual", "cut short")
+    await stream.__anext__()
+    await stream.aclose()
+    assert writer.written == 2
+    return deltas
+
+
+@pytest.mark.asyncio
+async def test_replay_serves_recorded_deltas_with_scaled_timing(corpus_path):
+    deltas = await record(corpus_path)
+    corpus = Corpus.load(corpus_path)
+    rec = corpus.by_style["casual"][0]
+    assert rec.pieces == deltas == ["Hi", " there", " casual"]
+    assert 0.05 < rec.duration < 0.2
+
+    replay = ReplayProvider(corpus, speed=2.0)
+    started = time.perf_counter()
+    # whitespace-normalized input matches the recording
+    out = [d async for d in replay.rephrase_stream("casual", "hello world")]
+    elapsed = time.perf_counter() - started
+    assert out == deltas
+    assert rec.duration / 2 - 0.01 < elapsed < rec.duration
+    assert (
+        await ReplayProvider(corpus, speed=0).rephrase_full("polite", "hello")
+        == "polite reply"
+    )
+    assert replay.stats() == {"recordings": 2, "matched": 1, "picked": 0}
+
+
+@pytest.mark.asyncio
+async def test_replay_picks_by_input_hash_unless_exact(corpus_path):
+    await record(corpus_path)
+    with open(corpus_path, "ab") as f:
+        f.write(b'{"style": "casual", "inp')  # cut short by a crash
+    corpus = Corpus.load(corpus_path)
+    assert len(corpus.recordings) == 2
+
+    replay = ReplayProvider(corpus, speed=0)
+    first = await replay.rephrase_full("casual", "never recorded")
+    assert first == "Hi there casual"
+    assert await replay.rephrase_full("casual", "never recorded") == first
+    # unknown styles draw from the whole corpus
+    assert await replay.rephrase_full("formal", "x") in (
+        "Hi there casual",
+        "polite reply",
+    )
+
+    with pytest.raises(LookupError):
+        await ReplayProvider(corpus, exact=True).rephrase_full("casual", "nope")
@@ -0,0 +1,163 @@
+import asyncio
+
+import httpx
+import pytest
+from app.providers.base import LLMProvider
+from app.providers.openai_chat import OpenAIChatProvider
+from app.providers import router_provider
+from app.providers.router_provider import Backend, RoutingProvider, backends_from_config
+from app.utils import http
+from app.utils.deadline import DeadlineExceeded
+
+
+class FakeProvider(LLMProvider):
+    """`fail` is an exception to raise, or True for a connection error."""
+
+    def __init__(self, name, delay=0.0, fail=None):
+        self.name = name
+        self.delay = delay
+        self.fail = httpx.ConnectError(f"{name} down") if fail is True else fail
+        self.calls = 0
+
+    async def rephrase_full(self, style, input_text):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise self.fail
+        return f"{self.name}:{input_text}"
+
+    async def rephrase_stream(self, style, input_text):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise self.fail
+        for word in input_text.split():
+            yield word
+
+
+@pytest.mark.asyncio
+async def test_router_prefers_faster_backend():
+    fast, slow = FakeProvider("fast", 0.001), FakeProvider("slow", 0.03)
+    router = RoutingProvider([Backend("fast", fast), Backend("slow", slow)])
+    for _ in range(30):
+        await router.rephrase_full("casual", "hi")
+    assert fast.calls > slow.calls * 3
+
+
+@pytest.mark.asyncio
+async def test_router_fails_over_and_ejects():
+    bad, good = FakeProvider("bad", fail=True), FakeProvider("good")
+    router = RoutingProvider(
+        [Backend("bad", bad), Backend("good", good)], eject_after=1, eject_seconds=60
+    )
+    for _ in range(10):
+        assert await router.rephrase_full("casual", "hi") == "good:hi"
+    assert bad.calls == 1
+    stats = router.stats()
+    assert stats["bad"]["ejected"] is True
+    assert stats["bad"]["ejections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_router_stream_fails_over_before_first_delta():
+    bad, good = FakeProvider("bad", fail=True), FakeProvider("good")
+    router = RoutingProvider([Backend("bad", bad), Backend("good", good)])
+    router.backends[1].ewma_latency = 10.0  # make the failing backend look best
+    out = [d async for d in router.rephrase_stream("casual", "a b c")]
+    assert out == ["a", "b", "c"]
+    assert bad.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_router_raises_when_all_backends_fail():
+    router = RoutingProvider(
+        [
+            Backend("a", FakeProvider("a", fail=True)),
+            Backend("b", FakeProvider("b", fail=True)),
+        ]
+    )
+    with pytest.raises(httpx.ConnectError):
+        await router.rephrase_full("casual", "hi")
+
+
+def status_error(status):
+    request = httpx.Request("POST", "http://up.test/v1/chat/completions")
+    response = httpx.Response(status, request=request)
+    return httpx.HTTPStatusError(str(status), request=request, response=response)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error", [status_error(400), status_error(401), DeadlineExceeded("upstream")]
+)
+async def test_request_errors_neither_fail_over_nor_eject(error):
+    bad, good = FakeProvider("bad", fail=error), FakeProvider("good")
+    router = RoutingProvider(
+        [Backend("bad", bad), Backend("good", good)], eject_after=1
+    )
+    router.backends[1].ewma_latency = 10.0  # route to "bad" first
+    for _ in range(3):
+        with pytest.raises(type(error)):
+            await router.rephrase_full("casual", "hi")
+        with pytest.raises(type(error)):
+            [d async for d in router.rephrase_stream("casual", "a b")]
+    assert good.calls == 0
+    assert router.stats()["bad"]["ejections"] == 0
+    assert router.stats()["bad"]["error_rate"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_backend_fails_over():
+    bad, good = FakeProvider("bad", fail=status_error(429)), FakeProvider("good")
+    router = RoutingProvider([Backend("bad", bad), Backend("good", good)])
+    router.backends[1].ewma_latency = 10.0
+    assert await router.rephrase_full("casual", "hi") == "good:hi"
+    assert router.stats()["bad"]["error_rate"] > 0
+
+
+@pytest.mark.asyncio
+async def test_backends_from_config_targets_each_base_url(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.host, request.headers["authorization"]))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    backends = backends_from_config(
+        '[{"name": "one", "base_url": "http://one.test/v1", "api_key": "k1", "model": "m1"}]'
+    )
+    assert isinstance(backends[0].provider, OpenAIChatProvider)
+    assert backends[0].provider.model == "m1"
+    router = RoutingProvider(backends)
+    assert await router.rephrase_full("casual", "hi") == "ok"
+    assert seen == [("one.test", "Bearer k1")]
+
+
+def test_backends_without_limits_get_the_global_ones(monkeypatch):
+    monkeypatch.setattr(router_provider, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(router_provider, "OPENAI_REQUESTS_PER_MINUTE", 60.0)
+    plain, own = backends_from_config(
+        '[{"name": "plain"}, {"name": "own", "requests_per_minute": 120}]'
+    )
+    assert plain.provider.limiter.requests.capacity == 60
+    assert own.provider.limiter.requests.capacity == 120
+    assert plain.provider.limiter is not own.provider.limiter
+
+    monkeypatch.setattr(router_provider, "RATE_LIMIT_ENABLED", False)
+    (plain,) = backends_from_config('[{"name": "plain"}]')
+    assert plain.provider.limiter is None
+
+
+def test_router_cache_key_is_not_shared_with_its_first_backend():
+    one = OpenAIChatProvider(None, model="gpt-4o-mini")
+    two = OpenAIChatProvider(None, model="llama")
+    router = RoutingProvider([Backend("one", one), Backend("two", two)])
+    key = router.cache_key("casual", "hi")
+    assert key != one.cache_key("casual", "hi")
+    # same backends in another order share entries; another set does not
+    swapped = RoutingProvider([Backend("two", two), Backend("one", one)])
+    assert swapped.cache_key("casual", "hi") == key
+    assert RoutingProvider([Backend("one", one)]).cache_key("casual", "hi") != key
@@ -72,3 +72,188 @@ async def test_rephrase_service_with_mock_provider():
         assert isinstance(chunk, str)
         chunks.append(chunk)
     assert len(chunks) > 0
+
+
+@pytest.mark.asyncio
+async def test_rephrase_all_runs_styles_concurrently():
+    """Styles run in parallel up to the cap and come back in requested order"""
+    import asyncio
+
+    active = 0
+    peak = 0
+
+    class SlowProvider:
+        async def rephrase_full(self, style: str, input_text: str) -> str:
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            # later styles finish first to check ordering
+            await asyncio.sleep(0.01 * (5 - len(style) % 5))
+            active -= 1
+            return style.upper()
+
+    styles = ["professional", "casual", "polite", "social-media"]
+    service = RephraseService(SlowProvider(), max_concurrency=2)
+    results, errors = await service.rephrase_all(styles, "Hi")
+
+    assert list(results) == styles
+    assert results["casual"] == "CASUAL"
+    assert errors == {}
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_rephrase_all_isolates_style_errors():
+    """One failing style does not fail the others"""
+
+    class FlakyProvider:
+        async def rephrase_full(self, style: str, input_text: str) -> str:
+            if style == "casual":
+                raise ValueError("upstream 500")
+            return style
+
+    service = RephraseService(FlakyProvider())
+    results, errors = await service.rephrase_all(["professional", "casual"], "Hi")
+    assert results == {"professional": "professional"}
+    assert str(errors["casual"]) == "upstream 500"
+
+    with pytest.raises(ValueError):
+        await service.rephrase_all_full(["casual"], "Hi")
+
+
+@pytest.mark.asyncio
+async def test_stream_styles_interleaved_merges_deltas():
+    """All styles stream at once and every style gets start/end markers"""
+    import asyncio
+
+    class TickProvider:
+        async def rephrase_stream(self, style: str, input_text: str):
+            for i in range(3):
+                await asyncio.sleep(0.001)
+                yield f"{style}{i}"
+
+    service = RephraseService(TickProvider())
+    events = [e async for e in service.stream_styles_interleaved(["a", "b"], "Hi")]
+    kinds = [(style, kind) for style, kind, _ in events]
+
+    assert kinds[:2] == [("a", "start"), ("b", "start")]
+    # deltas from both styles are interleaved rather than one style after another
+    deltas = [value for _, kind, value in events if kind == "item"]
+    assert deltas[:2] == ["a0", "b0"]
+    assert sorted(deltas) == ["a0", "a1", "a2", "b0", "b1", "b2"]
+    assert ("a", "end") in kinds and ("b", "end") in kinds
+
+
+@pytest.mark.asyncio
+async def test_stream_styles_interleaved_close_tears_down_sources():
+    """Closing the merged stream closes every upstream generator"""
+    import asyncio
+
+    closed = []
+
+    class EndlessProvider:
+        async def rephrase_stream(self, style: str, input_text: str):
+            try:
+                while True:
+                    await asyncio.sleep(0.001)
+                    yield style
+            finally:
+                closed.append(style)
+
+    service = RephraseService(EndlessProvider())
+    merged = service.stream_styles_interleaved(["a", "b", "c"], "Hi")
+    seen = 0
+    async for _style, kind, _value in merged:
+        seen += kind == "item"
+        if seen >= 5:
+            break
+    await merged.aclose()
+    assert sorted(closed) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_stream_styles_combined_reports_missing_styles():
+    """Combined streams map back to per-style events; missing styles are errors"""
+
+    class PartialProvider(MockProvider):
+        async def rephrase_multi_stream(self, styles, input_text):
+            yield "professional", "Good "
+            yield "professional", "day."
+
+    service = RephraseService(PartialProvider())
+    events = [
+        (style, kind, value)
+        async for style, kind, value in service.stream_styles_combined(
+            ["professional", "casual"], "Hi"
+        )
+    ]
+    assert [(s, k) for s, k, _ in events] == [
+        ("professional", "start"),
+        ("professional", "item"),
+        ("professional", "item"),
+        ("professional", "end"),
+        ("casual", "error"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rephrase_all_incremental_only_regenerates_changed_segments():
+    """Resubmitting an edited text reuses unchanged sentences"""
+    from app.services.incremental import segment_cache
+
+    segment_cache._data.clear()
+    calls = []
+
+    class UpperProvider(MockProvider):
+        async def rephrase_full(self, style: str, input_text: str) -> str:
+            calls.append(input_text)
+            return input_text.upper()
+
+    service = RephraseService(UpperProvider())
+    text = "The first sentence is here. The second one follows.\n\nA new paragraph."
+    results, errors, segments = await service.rephrase_all_incremental(["casual"], text)
+    assert results["casual"] == text.upper()
+    assert segments == {"casual": {"reused": 0, "regenerated": 3}}
+
+    edited = text.replace("second one", "second sentence")
+    calls.clear()
+    results, errors, segments = await service.rephrase_all_incremental(
+        ["casual"], edited
+    )
+    assert results["casual"] == edited.upper()
+    assert segments == {"casual": {"reused": 2, "regenerated": 1}}
+    assert calls == ["The second sentence follows."]
+
+
+@pytest.mark.asyncio
+async def test_chunked_stream_emits_chunks_in_original_order(monkeypatch):
+    """Long inputs stream as parallel chunks, flushed in order"""
+    import asyncio
+
+    from app.services import rephrase_service
+
+    monkeypatch.setattr(rephrase_service, "CHUNK_MAX_TOKENS", 8)
+    started = []
+
+    class ReverseSpeedProvider(MockProvider):
+        async def rephrase_full(self, style: str, input_text: str) -> str:
+            return input_text.upper()
+
+        async def rephrase_stream(self, style: str, input_text: str):
+            started.append(input_text)
+            # the first chunk is the slowest
+            delay = 0.03 if input_text.startswith("First") else 0.001
+            for word in input_text.upper().split(" "):
+                await asyncio.sleep(delay)
+                yield word + " "
+
+    text = "First paragraph here.\n\nSecond paragraph here.\n\nThird one here."
+    service = RephraseService(ReverseSpeedProvider())
+    out = "".join([d async for d in service.stream_style("casual", text, chunked=True)])
+
+    assert len(started) == 3
+    assert out.split() == text.upper().split()
+    assert out.index("FIRST") < out.index("SECOND") < out.index("THIRD")
+
+    results, errors = await service.rephrase_all_chunked(["casual"], text)
+    assert results["casual"] == text.upper()
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from app.providers.mock_provider import MockProvider
+from app.providers.singleflight_provider import SingleFlightProvider
+from app.utils import deadline
+from app.utils.cache import bypass_cache
+from app.utils.singleflight import SingleFlight
+
+
+class SlowProvider(MockProvider):
+    def __init__(self):
+        self.full_calls = 0
+        self.stream_calls = 0
+        self.stream_closed = 0
+        self.budgets = []
+
+    async def rephrase_full(self, style: str, input_text: str) -> str:
+        self.full_calls += 1
+        self.budgets.append(deadline.remaining())
+        await asyncio.sleep(0.02)
+        return f"{style}: {input_text}"
+
+    async def rephrase_stream(self, style: str, input_text: str):
+        self.stream_calls += 1
+        try:
+            for word in ["one", " two", " three", " four"]:
+                await asyncio.sleep(0.01)
+                yield word
+        finally:
+            self.stream_closed += 1
+
+
+@pytest.mark.asyncio
+async def test_identical_full_calls_share_one_upstream_call():
+    inner = SlowProvider()
+    provider = SingleFlightProvider(inner, SingleFlight())
+    results = await asyncio.gather(
+        *(provider.rephrase_full("casual", "Hi") for _ in range(5)),
+        provider.rephrase_full("polite", "Hi"),
+    )
+    assert results[:5] == ["casual: Hi"] * 5
+    assert inner.full_calls == 2
+    assert provider.group.stats()["joined"] == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    inner = SlowProvider()
+    provider = SingleFlightProvider(inner, SingleFlight())
+    first = asyncio.create_task(provider.rephrase_full("casual", "Hi"))
+    second = asyncio.create_task(provider.rephrase_full("casual", "Hi"))
+    await asyncio.sleep(0.005)
+    first.cancel()
+    assert await second == "casual: Hi"
+    assert inner.full_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_late_stream_subscriber_gets_replay_then_live_deltas():
+    inner = SlowProvider()
+    provider = SingleFlightProvider(inner, SingleFlight())
+
+    async def collect(delay: float, stop_after: int = 0):
+        await asyncio.sleep(delay)
+        out = []
+        stream = provider.rephrase_stream("casual", "Hi")
+        async for delta in stream:
+            out.append(delta)
+            if stop_after and len(out) == stop_after:
+                await stream.aclose()
+                break
+        return out
+
+    leader, follower, quitter = await asyncio.gather(
+        collect(0), collect(0.025), collect(0, stop_after=1)
+    )
+    assert leader == follower == ["one", " two", " three", " four"]
+    assert quitter == ["one"]
+    assert inner.stream_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_cancelled_when_last_subscriber_leaves():
+    inner = SlowProvider()
+    provider = SingleFlightProvider(inner, SingleFlight())
+    stream = provider.rephrase_stream("casual", "Hi")
+    assert await stream.__anext__() == "one"
+    await stream.aclose()
+    await asyncio.sleep(0.02)
+    assert inner.stream_closed == 1
+    assert provider.group.stats()["in_flight_streams"] == 0
+
+
+@pytest.mark.asyncio
+async def test_each_caller_waits_within_its_own_deadline():
+    inner = SlowProvider()
+    provider = SingleFlightProvider(inner, SingleFlight())
+
+    async def call(timeout):
+        deadline.set_deadline(timeout)
+        return await provider.rephrase_full("casual", "Hi")
+
+    leader, joiner = await asyncio.gather(
+        call(0.005), call(None), return_exceptions=True
+    )
+    assert isinstance(leader, deadline.DeadlineExceeded)
+    assert joiner == "casual: Hi"
+    # the shared call does not run on the leader's budget
+    assert inner.budgets == [None]
+
+
+@pytest.mark.asyncio
+async def test_cache_bypass_skips_coalescing():
+    inner = SlowProvider()
+    provider = SingleFlightProvider(inner, SingleFlight())
+
+    async def call(fresh):
+        bypass_cache(fresh)
+        return await provider.rephrase_full("casual", "Hi")
+
+    async def stream(fresh):
+        bypass_cache(fresh)
+        return [d async for d in provider.rephrase_stream("casual", "Hi")]
+
+    await asyncio.gather(call(False), call(True), stream(False), stream(True))
+    assert inner.full_calls == 2
+    assert inner.stream_calls == 2
+    assert provider.group.stats()["joined"] == 0
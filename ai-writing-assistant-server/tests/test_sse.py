@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+from app.utils import sse
+
+
+async def source(events, gap=0.0):
+    for event in events:
+        if gap:
+            await asyncio.sleep(gap)
+        yield event
+
+
+def decode(events):
+    out = []
+    for e in events:
+        if e["event"] == "delta":
+            d = json.loads(e["data"])
+            out.append(("delta", d["style"], d["delta"]))
+        else:
+            out.append((e["event"], e["data"]))
+    return out
+
+
+async def collect(gen, delay=0.0):
+    out = []
+    async for e in gen:
+        out.append(e)
+        if delay:
+            await asyncio.sleep(delay)
+    return out
+
+
+@pytest.mark.asyncio
+async def test_deltas_merge_per_style_and_keep_order():
+    events = [{"event": "style_start", "data": "a"}]
+    events += [sse.delta("a", c) for c in "hello"]
+    events += [sse.delta("b", c) for c in "xy"]
+    events += [{"event": "style_end", "data": "a"}, sse.delta("a", "!")]
+    out = decode(await collect(sse.coalesce(source(events), flush_ms=50)))
+    assert out == [
+        ("style_start", "a"),
+        ("delta", "a", "hello"),
+        ("delta", "b", "xy"),
+        ("style_end", "a"),
+        ("delta", "a", "!"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flush_by_size_and_time():
+    events = [sse.delta("a", "x" * 10) for _ in range(10)]
+    out = decode(
+        await collect(
+            sse.coalesce(source(events, gap=0.001), flush_ms=1000, flush_bytes=30)
+        )
+    )
+    # the first delta is sent alone, later ones merge up to the size
+    assert out[0] == ("delta", "a", "x" * 10)
+    assert all(len(text) >= 30 for _, _, text in out[1:-1])
+    assert "".join(text for _, _, text in out) == "x" * 100
+
+    # a lone delta still goes out once the window passes
+    out = await asyncio.wait_for(
+        collect(sse.coalesce(source([sse.delta("a", "hi")]), flush_ms=10)), 1
+    )
+    assert decode(out) == [("delta", "a", "hi")]
+
+
+@pytest.mark.asyncio
+async def test_first_delta_of_each_style_skips_the_window():
+    events = [sse.delta("a", "a1"), sse.delta("a", "a2")]
+    events += [sse.delta("b", "b1"), sse.delta("a", "a3")]
+    gen = sse.coalesce(source(events, gap=0.05), flush_ms=10_000)
+    started = asyncio.get_running_loop().time()
+    first = await asyncio.wait_for(gen.__anext__(), 1)
+    assert decode([first]) == [("delta", "a", "a1")]
+    # b's first delta goes out at once too, taking a's pending text along
+    out = decode([await asyncio.wait_for(gen.__anext__(), 1) for _ in range(2)])
+    assert out == [("delta", "a", "a2"), ("delta", "b", "b1")]
+    assert asyncio.get_running_loop().time() - started < 1
+    assert decode(await collect(gen)) == [("delta", "a", "a3")]
+
+
+@pytest.mark.asyncio
+async def test_slow_client_gets_fewer_bigger_events():
+    events = [sse.delta("a", "t") for _ in range(2000)]
+    before = sse.totals.snapshot()["deltas_in"]
+    out = await collect(
+        sse.coalesce(source(events), flush_ms=0, flush_bytes=1, max_bytes=100),
+        delay=0.001,
+    )
+    assert "".join(d for _, _, d in decode(out)) == "t" * 2000
+    assert len(out) < 200
+    assert sse.totals.high_water_bytes >= 100
+    assert sse.totals.snapshot()["deltas_in"] - before == 2000
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_stops_reading_upstream():
+    produced = 0
+
+    async def upstream():
+        nonlocal produced
+        for _ in range(1000):
+            produced += 1
+            yield sse.delta("a", "x" * 10)
+
+    gen = sse.coalesce(upstream(), flush_ms=1000, max_bytes=50, max_events=4)
+    first = await gen.__anext__()
+    await asyncio.sleep(0.01)  # client stalls
+    assert produced < 20
+    await gen.aclose()
+    assert json.loads(first["data"])["delta"].startswith("x")
+
+
+@pytest.mark.asyncio
+async def test_errors_surface_after_pending_events():
+    async def failing():
+        yield sse.delta("a", "partial")
+        raise RuntimeError("boom")
+
+    out = []
+    with pytest.raises(RuntimeError):
+        async for e in sse.coalesce(failing()):
+            out.append(e)
+    assert decode(out) == [("delta", "a", "partial")]
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import pytest
+from app.main import app
+from app.providers.base import LLMProvider
+from app.routes.agent import get_agent_service
+from app.routes.rephrase import get_service
+from app.services.rephrase_service import RephraseService
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+from sse_starlette.sse import AppStatus
+
+
+class WordProvider(LLMProvider):
+    """Streams a fixed sentence word by word; the full call must not be used."""
+
+    async def rephrase_full(self, style, input_text):
+        raise AssertionError("staged formats should use the token stream")
+
+    async def rephrase_stream(self, style, input_text):
+        for word in [" Hello", " there", ",", " friend"]:
+            await asyncio.sleep(0.005)
+            yield word
+
+
+async def stream_events(path):
+    AppStatus.should_exit_event = asyncio.Event()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        r = await ac.post(path, json={"input_text": "hi", "styles": ["casual"]})
+    events = []
+    for block in r.text.split("\r\n\r\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in lines:
+            events.append((lines["event"], lines.get("data")))
+    return events
+
+
+@pytest.fixture
+def word_provider():
+    svc = RephraseService(WordProvider())
+    app.dependency_overrides[get_service] = lambda: svc
+    app.dependency_overrides[get_agent_service] = lambda: svc
+    yield
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path", ["/v1/rephrase/stream?example_format=true", "/v1/agent/stream"]
+)
+async def test_staged_format_is_cumulative_by_default(word_provider, path):
+    events = await stream_events(path)
+    deltas = [json.loads(d)["delta"] for e, d in events if e == "delta"]
+    assert deltas[0] == "[wait] Casual:"
+    assert deltas[-1] == "[wait] Casual: Hello there, friend"
+    assert all(d.startswith("[wait] Casual: ") for d in deltas[1:])
+    end = [json.loads(d) for e, d in events if e == "style_end"]
+    assert end == [{"style": "Casual", "final": "Hello there, friend"}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/v1/rephrase/stream?example_format=true&cumulative=false",
+        "/v1/agent/stream?cumulative=false",
+    ],
+)
+async def test_staged_format_increments(word_provider, path):
+    events = await stream_events(path)
+    deltas = [json.loads(d)["delta"] for e, d in events if e == "delta"]
+    assert deltas[0] == "[wait] Casual:"
+    assert "".join(deltas[1:]) == "Hello there, friend"
+    assert events[-1] == ("done", "[DONE]")
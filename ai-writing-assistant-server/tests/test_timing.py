@@ -0,0 +1,105 @@
+import asyncio
+import json
+import re
+
+import httpx
+import pytest
+from app.main import app
+from app.providers.openai_chat import OpenAIChatProvider
+from app.routes.rephrase import get_service
+from app.services.rephrase_service import RephraseService
+from app.utils import http, timing
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+from sse_starlette.sse import AppStatus
+
+
+def upstream(request):
+    if json.loads(request.content).get("stream"):
+        body = "".join(
+            f'data: {json.dumps({"choices": [{"delta": {"content": w}}]})}\n\n'
+            for w in ["a", " b"]
+        )
+        return httpx.Response(200, text=body + "data: [DONE]\n\n")
+    return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+
+@pytest.fixture
+def traced(monkeypatch, tmp_path):
+    monkeypatch.setattr(timing, "TIMING_ENABLED", True)
+    path = tmp_path / "timing.jsonl"
+    monkeypatch.setattr(timing, "_exporter", timing._Exporter(str(path), 1.0))
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(upstream))
+    )
+    svc = RephraseService(OpenAIChatProvider(None, model="timing-test"))
+    app.dependency_overrides[get_service] = lambda: svc
+    yield path
+    app.dependency_overrides.clear()
+
+
+def spans_of(header):
+    return dict(part.split(";dur=") for part in header.split(", "))
+
+
+@pytest.mark.asyncio
+async def test_full_response_has_server_timing_and_is_exported(traced):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        r = await ac.post(
+            "/v1/rephrase?cache=false",
+            json={"input_text": "hi", "styles": ["casual"], "request_id": "t-1"},
+        )
+    assert r.status_code == 200
+    spans = spans_of(r.headers["Server-Timing"])
+    for name in ("parse", "service", "style.casual", "upstream.casual", "total"):
+        assert name in spans
+    assert float(spans["upstream.casual"]) <= float(spans["total"])
+
+    (line,) = traced.read_text().splitlines()
+    record = json.loads(line)
+    assert record["request_id"] == "t-1"
+    assert record["route"] == "/v1/rephrase"
+    assert {"service", "serialize"} <= {s["name"] for s in record["spans"]}
+
+
+@pytest.mark.asyncio
+async def test_untrusted_style_names_stay_inside_server_timing(traced):
+    styles = ["café", 'a;dur=9, evil"']
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        r = await ac.post(
+            "/v1/rephrase?cache=false", json={"input_text": "hi", "styles": styles}
+        )
+    assert r.status_code == 200
+    header = r.headers["Server-Timing"]
+    assert header.isascii()
+    assert 'desc="style.caf\\xe9"' in header
+    assert 'desc="style.a;dur=9, evil\\""' in header
+    names = re.findall(r'(?:^|, )([^;,"]+);dur=', header)
+    assert {"parse", "service", "total"} <= set(names)
+    assert all(re.fullmatch(r"[A-Za-z0-9._-]+", name) for name in names)
+    assert not any("evil" in name for name in names)
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_with_timing_event(traced):
+    AppStatus.should_exit_event = asyncio.Event()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as ac:
+        r = await ac.post(
+            "/v1/rephrase/stream?cache=false",
+            json={"input_text": "hi", "styles": ["casual"]},
+        )
+    events = [
+        dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        for block in r.text.split("\r\n\r\n")
+        if "event: " in block
+    ]
+    names = [e["event"] for e in events]
+    assert names[-2:] == ["timing", "done"]
+    summary = json.loads(events[names.index("timing")]["data"])
+    for name in ("connect.casual", "ttft.casual", "stream.casual", "total"):
+        assert name in summary["spans"]
+
+
+def test_spans_are_free_when_disabled():
+    assert timing.start_trace("off") is None
+    assert timing.span("anything") is timing._NO_SPAN
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from app.main import app
+from app.providers.openai_chat import OpenAIChatProvider
+from app.routes.rephrase import get_service
+from app.utils import http
+from app.utils.cache import LRUCache, ResponseCache, SQLiteCache
+from app.utils.warmup import Readiness
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+
+
+@pytest.mark.asyncio
+async def test_readiness_waits_for_warmup_steps():
+    async def ok():
+        return 3
+
+    async def broken():
+        raise RuntimeError("no route to host")
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    r = Readiness()
+    r.start({"ok": ok, "broken": broken, "slow": slow}, timeout=0.05)
+    assert not r.ready
+    await asyncio.sleep(0.2)
+    assert r.ready  # a cold instance still serves
+    steps = r.snapshot()["warmup"]
+    assert steps["ok"]["status"] == "ok" and steps["ok"]["result"] == 3
+    assert steps["broken"] == {
+        "status": "failed",
+        "error": "no route to host",
+        "seconds": steps["broken"]["seconds"],
+    }
+    assert steps["slow"]["status"] == "timeout"
+    await r.stop()
+
+
+@pytest.mark.asyncio
+async def test_openai_warmup_opens_pooled_connections(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        return httpx.Response(401)  # any answer means the connection is up
+
+    monkeypatch.setattr(
+        http, "_client", http.build_http_client(transport=httpx.MockTransport(handler))
+    )
+    provider = OpenAIChatProvider(None, base_url="http://localhost:9/v1", api_key="k")
+    await provider.warmup()
+    assert seen == ["/v1/models", "/v1/models"]
+
+
+@pytest.mark.asyncio
+async def test_cache_preload_fills_memory_from_sqlite(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl=60)
+    for i in range(3):
+        disk.set(f"k{i}", f"v{i}")
+    cache = ResponseCache(LRUCache(max_entries=2, ttl=60), disk)
+    assert await cache.preload() == 2
+    assert cache.memory.get("k2") == "v2" and cache.memory.get("k0") is None
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_lifespan_builds_services_once_and_reports_ready():
+    app.dependency_overrides.clear()
+    async with app.router.lifespan_context(app):
+        svc = app.state.rephrase_service
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://t"
+        ) as ac:
+            r = await ac.get("/readyz")
+        assert r.status_code == 200 and r.json()["ready"] is True
+
+        req = SimpleNamespace(app=app)
+        assert get_service(req) is svc and get_service(req) is svc